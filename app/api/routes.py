@@ -1,51 +1,80 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+import json
 import logging
-from sqlalchemy import text
-import pika
+import uuid
+from pydantic import ValidationError
 
 from app.config import get_settings
-from app.db.session import engine
-from app.queue.rabbitmq import RabbitMQClient
-from app.schemas import IngestRequest, IngestResponse
+from app.health import check_db, check_rabbitmq, get_health_prober
+from app.idempotency import get_idempotency_cache, payload_digest
+from app.queue.buffer import PublishBufferFull, get_publish_buffer
+from app.queue.rabbitmq import get_publisher_pool
+from app.schemas import (
+    IngestBatchItemResponse,
+    IngestBatchResponse,
+    IngestRequest,
+    IngestResponse,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-def check_db() -> bool:
-    try:
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
-        return True
-    except Exception:
-        return False
-
-
-def check_rabbitmq() -> bool:
-    settings = get_settings()
-    credentials = pika.PlainCredentials(settings.rabbitmq_user, settings.rabbitmq_password)
-    parameters = pika.ConnectionParameters(
-        host=settings.rabbitmq_host,
-        port=settings.rabbitmq_port,
-        credentials=credentials,
-        connection_attempts=1,
-        retry_delay=0,
-        socket_timeout=2,
-        blocked_connection_timeout=2,
-    )
-    try:
-        connection = pika.BlockingConnection(parameters)
-        connection.close()
-        return True
-    except Exception:
-        return False
+def _dump_with_digest(
+    payload: IngestRequest, idempotency_key: str | None = None
+) -> tuple[dict, str]:
+    # Large wafer maps take hundreds of milliseconds to dump and hash; keep that off the loop.
+    data = payload.model_dump()
+    return data, payload_digest(data, idempotency_key)
 
 
 @router.post("/ingest", response_model=IngestResponse)
-def ingest(payload: IngestRequest) -> IngestResponse:
+async def ingest(
+    payload: IngestRequest, idempotency_key: str | None = Header(default=None)
+) -> IngestResponse:
+    data, digest = await run_in_threadpool(_dump_with_digest, payload, idempotency_key)
+    idempotency_cache = get_idempotency_cache()
+    duplicate_id = idempotency_cache.get(digest)
+    if duplicate_id is not None:
+        logger.info(
+            "Duplicate ingest request",
+            extra={
+                "event": "ingest_duplicate",
+                "file_path": payload.file_path,
+                "message_id": duplicate_id,
+            },
+        )
+        return IngestResponse(status="duplicate", id=duplicate_id)
+
+    buffer = get_publish_buffer()
+    if buffer is not None:
+        try:
+            message_id = await buffer.submit(data, digest)
+        except PublishBufferFull as exc:
+            logger.warning(
+                "Ingest buffer full",
+                extra={"event": "ingest_rejected", "file_path": payload.file_path},
+            )
+            raise HTTPException(
+                status_code=429,
+                detail="Ingest buffer full",
+                headers={"Retry-After": str(buffer.retry_after)},
+            ) from exc
+        logger.info(
+            "Buffered ingest request",
+            extra={
+                "event": "ingest_buffered",
+                "file_path": payload.file_path,
+                "message_id": message_id,
+            },
+        )
+        idempotency_cache.put(digest, message_id)
+        return IngestResponse(status="accepted", id=message_id)
+
     try:
-        with RabbitMQClient() as client:
-            message_id = client.publish(payload.model_dump())
+        message_id = await run_in_threadpool(get_publisher_pool().publish, data, digest=digest)
         logger.info(
             "Queued ingest request",
             extra={
@@ -60,18 +89,138 @@ def ingest(payload: IngestRequest) -> IngestResponse:
             extra={"event": "ingest_error", "file_path": payload.file_path},
         )
         raise HTTPException(status_code=503, detail="Queue unavailable") from exc
+    idempotency_cache.put(digest, message_id)
     return IngestResponse(status="queued", id=message_id)
 
 
+def _validation_error_message(exc: ValidationError) -> str:
+    error = exc.errors()[0]
+    location = ".".join(str(part) for part in error.get("loc", ()))
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+async def _iter_ndjson_lines(request: Request):
+    # Only new chunks are split; a long line is buffered in pieces and joined once.
+    partial: list[bytes] = []
+    async for chunk in request.stream():
+        *lines, tail = chunk.split(b"\n")
+        for line in lines:
+            partial.append(line)
+            yield b"".join(partial)
+            partial = []
+        if tail:
+            partial.append(tail)
+    yield b"".join(partial)
+
+
+def _prepare_batch_items(raw_items: list, parse) -> list[IngestBatchItemResponse | tuple]:
+    items: list[IngestBatchItemResponse | tuple] = []
+    for index, raw in enumerate(raw_items):
+        try:
+            items.append(_dump_with_digest(parse(raw)))
+        except ValidationError as exc:
+            items.append(
+                IngestBatchItemResponse(
+                    index=index,
+                    status="rejected",
+                    error=_validation_error_message(exc),
+                )
+            )
+    return items
+
+
+async def _read_batch_items(request: Request) -> list[IngestBatchItemResponse | tuple]:
+    max_items = get_settings().ingest_batch_max_items
+    too_large = HTTPException(status_code=413, detail=f"Batch exceeds {max_items} items")
+
+    if "ndjson" in request.headers.get("content-type", ""):
+        lines = []
+        async for line in _iter_ndjson_lines(request):
+            if line.strip():
+                if len(lines) >= max_items:
+                    raise too_large
+                lines.append(line)
+        return await run_in_threadpool(
+            _prepare_batch_items, lines, IngestRequest.model_validate_json
+        )
+
+    try:
+        entries = await run_in_threadpool(json.loads, await request.body())
+    except json.JSONDecodeError as exc:
+        raise HTTPException(status_code=400, detail="Invalid JSON body") from exc
+    if not isinstance(entries, list):
+        raise HTTPException(status_code=422, detail="Batch body must be a JSON array")
+    if len(entries) > max_items:
+        raise too_large
+    return await run_in_threadpool(_prepare_batch_items, entries, IngestRequest.model_validate)
+
+
+@router.post("/ingest/batch", response_model=IngestBatchResponse)
+async def ingest_batch(request: Request) -> IngestBatchResponse:
+    items = await _read_batch_items(request)
+    idempotency_cache = get_idempotency_cache()
+    results: list[IngestBatchItemResponse] = []
+    to_publish: list[tuple[dict, str, str]] = []
+    seen: dict[str, str] = {}
+    duplicates = 0
+    for index, item in enumerate(items):
+        if isinstance(item, IngestBatchItemResponse):
+            results.append(item)
+            continue
+        data, digest = item
+        duplicate_id = seen.get(digest) or idempotency_cache.get(digest)
+        if duplicate_id is not None:
+            duplicates += 1
+            results.append(
+                IngestBatchItemResponse(index=index, status="duplicate", id=duplicate_id)
+            )
+            continue
+        message_id = str(uuid.uuid4())
+        seen[digest] = message_id
+        to_publish.append((data, message_id, digest))
+        results.append(IngestBatchItemResponse(index=index, status="queued", id=message_id))
+
+    if to_publish:
+        try:
+            await run_in_threadpool(get_publisher_pool().publish_batch, to_publish)
+        except Exception as exc:
+            logger.exception(
+                "Queue unavailable",
+                extra={"event": "ingest_error", "queued_count": len(to_publish)},
+            )
+            raise HTTPException(status_code=503, detail="Queue unavailable") from exc
+        for digest, message_id in seen.items():
+            idempotency_cache.put(digest, message_id)
+
+    rejected = len(results) - len(to_publish) - duplicates
+    logger.info(
+        "Queued ingest batch",
+        extra={
+            "event": "ingest_batch_queued",
+            "queued_count": len(to_publish),
+            "rejected_count": rejected,
+        },
+    )
+    return IngestBatchResponse(
+        queued=len(to_publish), rejected=rejected, duplicates=duplicates, items=results
+    )
+
+
 @router.get("/health")
 def health() -> dict:
     return {"status": "ok"}
 
 
 @router.get("/ready")
-def ready() -> tuple[dict, int]:
-    db_ok = check_db()
-    mq_ok = check_rabbitmq()
-    if db_ok and mq_ok:
-        return {"status": "ready"}, 200
-    return {"status": "not_ready", "details": {"db": db_ok, "rabbitmq": mq_ok}}, 503
+def ready() -> JSONResponse:
+    prober = get_health_prober()
+    if prober is None:
+        status = {"db": check_db(), "rabbitmq": check_rabbitmq()}
+        stale = False
+    else:
+        status, age = prober.snapshot()
+        stale = prober.is_stale(age)
+    if not stale and status and all(status.values()):
+        return JSONResponse({"status": "ready"}, status_code=200)
+    details = {**status, "stale": True} if stale else status
+    return JSONResponse({"status": "not_ready", "details": details}, status_code=503)
@@ -0,0 +1,18 @@
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+ON_CONFLICT_INSERTS = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+def dialect_name(session) -> str:
+    return session.bind.dialect.name
+
+
+def on_conflict_insert(session, model):
+    insert_factory = ON_CONFLICT_INSERTS.get(dialect_name(session))
+    if insert_factory is None:
+        return None
+    return insert_factory(model)
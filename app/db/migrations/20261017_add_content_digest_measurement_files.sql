@@ -0,0 +1,4 @@
+-- Remember the digest of the last ingested payload per file so the worker can
+-- acknowledge repeated deliveries without touching the raw-data tables.
+ALTER TABLE measurement_files
+  ADD COLUMN content_digest CHAR(64) NULL AFTER recipe_id;
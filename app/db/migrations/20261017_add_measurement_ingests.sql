@@ -0,0 +1,30 @@
+-- Track chunked ingests so partially ingested files are detectable.
+-- A row in measurement_ingests with completed_at IS NULL means some chunks are still missing.
+
+CREATE TABLE IF NOT EXISTS measurement_ingests (
+  message_id   VARCHAR(64) NOT NULL PRIMARY KEY,
+  file_id      BIGINT NOT NULL,
+  chunk_count  INT NOT NULL,
+  started_at   DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+  completed_at DATETIME(6) NULL,
+
+  CONSTRAINT fk_ingests_file
+    FOREIGN KEY (file_id) REFERENCES measurement_files(id)
+    ON DELETE CASCADE ON UPDATE CASCADE,
+
+  KEY idx_ingests_file (file_id),
+  KEY idx_ingests_incomplete (completed_at, started_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS measurement_ingest_chunks (
+  message_id  VARCHAR(64) NOT NULL,
+  chunk_index INT NOT NULL,
+  row_count   INT NOT NULL,
+  ingested_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+
+  PRIMARY KEY (message_id, chunk_index),
+
+  CONSTRAINT fk_ingest_chunks_ingest
+    FOREIGN KEY (message_id) REFERENCES measurement_ingests(message_id)
+    ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,17 @@
+-- Packed per-file history: one row per (file, ingest) instead of one row per point.
+-- Used when RAW_HISTORY_STORE=snapshot; payload layout is defined in app/db/snapshots.py.
+
+CREATE TABLE IF NOT EXISTS measurement_raw_data_snapshot (
+  id          BIGINT AUTO_INCREMENT PRIMARY KEY,
+  file_id     BIGINT NOT NULL,
+  point_count INT NOT NULL,
+  encoding    VARCHAR(16) NOT NULL,
+  payload     LONGBLOB NOT NULL,
+  ingested_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+
+  CONSTRAINT fk_snapshot_file
+    FOREIGN KEY (file_id) REFERENCES measurement_files(id)
+    ON DELETE CASCADE ON UPDATE CASCADE,
+
+  KEY idx_snapshot_file_ingested (file_id, ingested_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,20 @@
+-- Range-partition measurement_raw_data_history by ingested_at so retention can drop whole
+-- partitions instead of running the daily DELETE in the purge_raw_data_history event.
+--
+-- Partitioned InnoDB tables cannot have foreign keys, and every unique key must include the
+-- partitioning column. After this migration runs, create the partitions from the existing data:
+--
+--   python -m app.db.partitions migrate --dry-run   # review the PARTITION BY statement
+--   python -m app.db.partitions migrate
+--
+-- Both ALTERs below rebuild the table, so run them in a maintenance window.
+
+DROP EVENT IF EXISTS purge_raw_data_history;
+
+ALTER TABLE measurement_raw_data_history
+  DROP FOREIGN KEY fk_history_file,
+  DROP FOREIGN KEY fk_history_item;
+
+ALTER TABLE measurement_raw_data_history
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (id, ingested_at);
@@ -6,14 +6,20 @@ from sqlalchemy import (
     Float,
     ForeignKey,
     Integer,
+    LargeBinary,
     String,
     UniqueConstraint,
     func,
 )
+from sqlalchemy.dialects.mysql import LONGBLOB
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
 
+# SQLite only autoincrements INTEGER PRIMARY KEY columns.
+BigIntegerId = BigInteger().with_variant(Integer, "sqlite")
+SnapshotPayload = LargeBinary().with_variant(LONGBLOB, "mysql")
+
 
 class LotWf(Base):
     __tablename__ = "lot_wf"
@@ -72,7 +78,7 @@ class ProductName(Base):
 class SpasReference(Base):
     __tablename__ = "spas_references"
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigIntegerId, primary_key=True, autoincrement=True)
     product_id = Column(Integer, ForeignKey("product_names.id"), nullable=False)
     site_id = Column(Integer, ForeignKey("spas_sites.id"), nullable=False)
     node_id = Column(Integer, ForeignKey("spas_nodes.id"), nullable=False)
@@ -93,12 +99,13 @@ class SpasReference(Base):
 class MeasurementFile(Base):
     __tablename__ = "measurement_files"
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigIntegerId, primary_key=True, autoincrement=True)
     file_path = Column(String(2048), nullable=False)
     file_name = Column(String(255), nullable=False)
     reference_id = Column(BigInteger, ForeignKey("spas_references.id"), nullable=False)
     lot_wf_id = Column(Integer, ForeignKey("lot_wf.id"), nullable=True)
     recipe_id = Column(Integer, ForeignKey("measurement_recipe.id"), nullable=False)
+    content_digest = Column(String(64), nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
 
@@ -117,7 +124,7 @@ class MetricType(Base):
 class MeasurementItem(Base):
     __tablename__ = "measurement_items"
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigIntegerId, primary_key=True, autoincrement=True)
     class_name = Column(String(64), nullable=False)
     measure_item = Column(String(64), nullable=False)
     metric_type_id = Column(Integer, ForeignKey("metric_types.id"), nullable=False)
@@ -136,7 +143,7 @@ class MeasurementItem(Base):
 class MeasurementRawData(Base):
     __tablename__ = "measurement_raw_data"
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigIntegerId, primary_key=True, autoincrement=True)
     file_id = Column(BigInteger, ForeignKey("measurement_files.id"), nullable=False)
     item_id = Column(BigInteger, ForeignKey("measurement_items.id"), nullable=False)
     measurable = Column(Boolean, nullable=False, server_default="1")
@@ -174,7 +181,7 @@ class MeasurementRawDataCurrent(Base):
 class MeasurementRawDataHistory(Base):
     __tablename__ = "measurement_raw_data_history"
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigIntegerId, primary_key=True, autoincrement=True)
     file_id = Column(BigInteger, ForeignKey("measurement_files.id"), nullable=False)
     item_id = Column(BigInteger, ForeignKey("measurement_items.id"), nullable=False)
     measurable = Column(Boolean, nullable=False, server_default="1")
@@ -186,3 +193,35 @@ class MeasurementRawDataHistory(Base):
     y_1 = Column(Float, nullable=False)
     value = Column(Float, nullable=False)
     ingested_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class MeasurementRawDataSnapshot(Base):
+    __tablename__ = "measurement_raw_data_snapshot"
+
+    id = Column(BigIntegerId, primary_key=True, autoincrement=True)
+    file_id = Column(BigInteger, ForeignKey("measurement_files.id"), nullable=False)
+    point_count = Column(Integer, nullable=False)
+    encoding = Column(String(16), nullable=False)
+    payload = Column(SnapshotPayload, nullable=False)
+    ingested_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class MeasurementIngest(Base):
+    __tablename__ = "measurement_ingests"
+
+    message_id = Column(String(64), primary_key=True)
+    file_id = Column(BigInteger, ForeignKey("measurement_files.id"), nullable=False)
+    chunk_count = Column(Integer, nullable=False)
+    started_at = Column(DateTime, server_default=func.now(), nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+
+
+class MeasurementIngestChunk(Base):
+    __tablename__ = "measurement_ingest_chunks"
+
+    message_id = Column(
+        String(64), ForeignKey("measurement_ingests.message_id"), primary_key=True
+    )
+    chunk_index = Column(Integer, primary_key=True)
+    row_count = Column(Integer, nullable=False)
+    ingested_at = Column(DateTime, server_default=func.now(), nullable=False)
@@ -0,0 +1,231 @@
+import argparse
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+from app.config import Settings, get_settings
+from app.db.session import engine
+from app.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TABLE = "measurement_raw_data_history"
+PARTITION_COLUMN = "ingested_at"
+MAXVALUE_PARTITION = "pmax"
+
+
+@dataclass
+class PartitionInfo:
+    name: str
+    upper_bound: date | None
+    rows: int = 0
+    data_bytes: int = 0
+    index_bytes: int = 0
+
+
+@dataclass
+class PartitionPlan:
+    create: list[date] = field(default_factory=list)
+    retire: list[PartitionInfo] = field(default_factory=list)
+
+
+def partition_name(day: date) -> str:
+    return f"p{day:%Y%m%d}"
+
+
+def partition_clause(day: date) -> str:
+    upper = day + timedelta(days=1)
+    return f"PARTITION {partition_name(day)} VALUES LESS THAN ('{upper:%Y-%m-%d}')"
+
+
+def parse_upper_bound(description: str | None) -> date | None:
+    if description is None or description.upper() == "MAXVALUE":
+        return None
+    return datetime.fromisoformat(description.strip("'")[:10]).date()
+
+
+def list_partitions(connection, table: str = HISTORY_TABLE) -> list[PartitionInfo]:
+    rows = connection.execute(
+        text(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH "
+            "FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+            "AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ),
+        {"table": table},
+    )
+    return [
+        PartitionInfo(
+            name=name,
+            upper_bound=parse_upper_bound(description),
+            rows=table_rows or 0,
+            data_bytes=data_length or 0,
+            index_bytes=index_length or 0,
+        )
+        for name, description, table_rows, data_length, index_length in rows
+    ]
+
+
+def plan_partitions(
+    partitions: list[PartitionInfo], today: date, retention_days: int, precreate_days: int
+) -> PartitionPlan:
+    plan = PartitionPlan()
+    bounded = [partition for partition in partitions if partition.upper_bound is not None]
+    day = bounded[-1].upper_bound if bounded else today
+    while day <= today + timedelta(days=precreate_days):
+        plan.create.append(day)
+        day += timedelta(days=1)
+
+    cutoff = today - timedelta(days=retention_days)
+    # A partition only holds rows older than its upper bound, so it is safe to
+    # retire once that bound is at or before the retention cutoff.
+    plan.retire = [partition for partition in bounded[:-1] if partition.upper_bound <= cutoff]
+    return plan
+
+
+def partition_by_statement(
+    first_day: date, today: date, precreate_days: int, table: str = HISTORY_TABLE
+) -> str:
+    days = []
+    day = min(first_day, today)
+    while day <= today + timedelta(days=precreate_days):
+        days.append(partition_clause(day))
+        day += timedelta(days=1)
+    days.append(f"PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return (
+        f"ALTER TABLE {table} PARTITION BY RANGE COLUMNS ({PARTITION_COLUMN}) (\n  "
+        + ",\n  ".join(days)
+        + "\n)"
+    )
+
+
+def create_statement(days: list[date], table: str = HISTORY_TABLE) -> str:
+    clauses = [partition_clause(day) for day in days]
+    clauses.append(f"PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return (
+        f"ALTER TABLE {table} REORGANIZE PARTITION {MAXVALUE_PARTITION} INTO (\n  "
+        + ",\n  ".join(clauses)
+        + "\n)"
+    )
+
+
+def retire_statements(
+    partitions: list[PartitionInfo], mode: str, table: str = HISTORY_TABLE
+) -> list[str]:
+    if not partitions:
+        return []
+    statements = []
+    if mode == "archive":
+        for partition in partitions:
+            archive = f"{table}_{partition.name}"
+            statements.extend(
+                [
+                    f"CREATE TABLE {archive} LIKE {table}",
+                    f"ALTER TABLE {archive} REMOVE PARTITIONING",
+                    f"ALTER TABLE {table} EXCHANGE PARTITION {partition.name} WITH TABLE {archive}",
+                ]
+            )
+    names = ", ".join(partition.name for partition in partitions)
+    statements.append(f"ALTER TABLE {table} DROP PARTITION {names}")
+    return statements
+
+
+class PartitionManager:
+    def __init__(self, engine, settings: Settings | None = None) -> None:
+        settings = settings or get_settings()
+        self.engine = engine
+        self.retention_days = settings.history_retention_days
+        self.precreate_days = settings.history_partition_precreate_days
+        self.retention_mode = settings.history_retention_mode
+
+    def _execute(self, statements: list[str], dry_run: bool) -> list[str]:
+        for statement in statements:
+            if dry_run:
+                print(f"{statement};")
+                continue
+            with self.engine.begin() as connection:
+                connection.execute(text(statement))
+        return statements
+
+    def migrate(self, today: date, dry_run: bool = False) -> list[str]:
+        with self.engine.connect() as connection:
+            if list_partitions(connection):
+                logger.info(
+                    "History table is already partitioned",
+                    extra={"event": "partition_migrate_skipped", "table": HISTORY_TABLE},
+                )
+                return []
+            first = connection.execute(
+                text(f"SELECT MIN({PARTITION_COLUMN}) FROM {HISTORY_TABLE}")
+            ).scalar()
+        first_day = first.date() if first is not None else today
+        statement = partition_by_statement(first_day, today, self.precreate_days)
+        return self._execute([statement], dry_run)
+
+    def maintain(self, today: date, dry_run: bool = False) -> list[str]:
+        with self.engine.connect() as connection:
+            partitions = list_partitions(connection)
+        if not partitions:
+            raise RuntimeError(f"{HISTORY_TABLE} is not partitioned; run the migrate command")
+        plan = plan_partitions(partitions, today, self.retention_days, self.precreate_days)
+        statements = []
+        if plan.create:
+            statements.append(create_statement(plan.create))
+        statements.extend(retire_statements(plan.retire, self.retention_mode))
+        self._execute(statements, dry_run)
+        logger.info(
+            "History partitions maintained",
+            extra={
+                "event": "partition_maintain",
+                "table": HISTORY_TABLE,
+                "created_count": len(plan.create),
+                "retired_count": len(plan.retire),
+                "retired_rows": sum(partition.rows for partition in plan.retire),
+                "dry_run": dry_run,
+            },
+        )
+        return statements
+
+    def database_today(self) -> date:
+        with self.engine.connect() as connection:
+            return connection.execute(text("SELECT CURRENT_DATE")).scalar()
+
+    def report(self) -> list[PartitionInfo]:
+        with self.engine.connect() as connection:
+            return list_partitions(connection)
+
+
+def print_report(partitions: list[PartitionInfo]) -> None:
+    print(f"{'partition':<12} {'less than':<12} {'rows':>12} {'data MiB':>10} {'index MiB':>10}")
+    for partition in partitions:
+        bound = f"{partition.upper_bound:%Y-%m-%d}" if partition.upper_bound else "MAXVALUE"
+        print(
+            f"{partition.name:<12} {bound:<12} {partition.rows:>12} "
+            f"{partition.data_bytes / 1024 / 1024:>10.1f} "
+            f"{partition.index_bytes / 1024 / 1024:>10.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage measurement_raw_data_history partitions.")
+    parser.add_argument("command", choices=["migrate", "maintain", "report"])
+    parser.add_argument("--dry-run", action="store_true", help="Print DDL without running it")
+    parser.add_argument("--today", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    setup_logging()
+    manager = PartitionManager(engine)
+    # Bounds are compared with ingested_at, which the database fills in its own time zone.
+    today = args.today or manager.database_today()
+    if args.command == "migrate":
+        manager.migrate(today, args.dry_run)
+    elif args.command == "maintain":
+        manager.maintain(today, args.dry_run)
+    print_report(manager.report())
+
+
+if __name__ == "__main__":
+    main()
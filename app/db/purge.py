@@ -0,0 +1,315 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from prometheus_client import start_http_server
+from sqlalchemy import create_engine, delete, func, select, text
+from sqlalchemy.exc import DBAPIError
+
+from app.config import Settings, get_settings
+from app.db.models import MeasurementRawDataHistory, MeasurementRawDataSnapshot
+from app.db.session import engine
+from app.logging_config import setup_logging
+from app.metrics import (
+    history_purge_chunk_duration,
+    history_purge_last_id,
+    history_purge_rows,
+    history_purge_throttle,
+)
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+PURGE_TABLES = {
+    "history": MeasurementRawDataHistory,
+    "snapshot": MeasurementRawDataSnapshot,
+}
+ARCHIVE_EXTENSIONS = {"parquet": "parquet", "npz": "npz"}
+MAX_BACKOFF_SECONDS = 30.0
+
+
+class PurgeCheckpoint:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(self) -> dict | None:
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state: dict) -> None:
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(state, handle)
+        os.replace(temp_path, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def write_parquet(columns: dict, handle) -> None:
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is required for parquet history archives")
+    pyarrow.parquet.write_table(pyarrow.table(columns), handle, compression="zstd")
+
+
+def write_npz(columns: dict, handle) -> None:
+    if numpy is None:
+        raise RuntimeError("numpy is required for npz history archives")
+    arrays = {name: numpy.asarray(values) for name, values in columns.items()}
+    arrays["ingested_at"] = numpy.asarray(columns["ingested_at"], dtype="datetime64[us]")
+    numpy.savez_compressed(handle, **arrays)
+
+
+ARCHIVE_WRITERS = {"parquet": write_parquet, "npz": write_npz}
+
+
+class HistoryPurger:
+    def __init__(
+        self,
+        engine,
+        settings: Settings | None = None,
+        replica_engine=None,
+        sleep=time.sleep,
+        model=MeasurementRawDataHistory,
+    ) -> None:
+        settings = settings or get_settings()
+        self.engine = engine
+        self.model = model
+        self.archive_columns = tuple(column.name for column in model.__table__.columns)
+        self.replica_engine = replica_engine
+        self.sleep = sleep
+        self.retention_days = settings.history_retention_days
+        self.chunk_rows = max(1, settings.history_purge_chunk_rows)
+        self.min_chunk_rows = max(1, self.chunk_rows // 10)
+        self.max_chunk_rows = self.chunk_rows * 4
+        self.target_seconds = settings.history_purge_target_chunk_seconds
+        self.sleep_ratio = settings.history_purge_sleep_ratio
+        self.max_replica_lag = settings.history_purge_max_replica_lag
+        self.max_lock_waits = settings.history_purge_max_lock_waits
+        self.archive_dir = settings.history_purge_archive_dir or None
+        self.archive_format = settings.history_purge_archive_format
+        checkpoint_path = settings.history_purge_checkpoint_path
+        if model is not MeasurementRawDataHistory:
+            root, extension = os.path.splitext(checkpoint_path)
+            checkpoint_path = f"{root}.{model.__tablename__}{extension}"
+        self.checkpoint = PurgeCheckpoint(checkpoint_path)
+        if self.archive_dir and self.archive_format not in ARCHIVE_WRITERS:
+            raise ValueError(f"Unsupported archive format: {self.archive_format}")
+        # numpy byte-string arrays drop trailing NUL bytes, which would corrupt packed payloads.
+        if self.archive_dir and self.archive_format == "npz" and "payload" in self.archive_columns:
+            raise ValueError(f"npz archives cannot hold {model.__tablename__}; use parquet")
+
+    def database_cutoff(self) -> datetime:
+        with self.engine.connect() as connection:
+            now = connection.execute(select(func.now())).scalar()
+        return now - timedelta(days=self.retention_days)
+
+    def next_chunk(self, connection, last_id: int) -> tuple[int | None, datetime | None, int]:
+        # Walk the primary key: each probe reads at most chunk_rows index entries.
+        chunk = (
+            select(self.model.id, self.model.ingested_at)
+            .where(self.model.id > last_id)
+            .order_by(self.model.id)
+            .limit(self.chunk_rows)
+            .subquery()
+        )
+        stmt = select(func.max(chunk.c.id), func.min(chunk.c.ingested_at), func.count())
+        return connection.execute(stmt.select_from(chunk)).one()
+
+    def chunk_filter(self, last_id: int, end_id: int, cutoff: datetime) -> tuple:
+        model = self.model
+        return (model.id > last_id, model.id <= end_id, model.ingested_at < cutoff)
+
+    def archive(self, connection, last_id: int, end_id: int, cutoff: datetime) -> int:
+        rows = connection.execute(
+            select(*(self.model.__table__.c[name] for name in self.archive_columns))
+            .where(*self.chunk_filter(last_id, end_id, cutoff))
+            .order_by(self.model.id)
+        ).all()
+        if not rows:
+            return 0
+        columns = {
+            name: [row[index] for row in rows] for index, name in enumerate(self.archive_columns)
+        }
+        extension = ARCHIVE_EXTENSIONS[self.archive_format]
+        # Named by the first archived id so a chunk redone after a crash overwrites its own file.
+        path = os.path.join(
+            self.archive_dir, f"{self.model.__tablename__}_{columns['id'][0]:015d}.{extension}"
+        )
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as handle:
+            ARCHIVE_WRITERS[self.archive_format](columns, handle)
+        os.replace(temp_path, path)
+        return len(rows)
+
+    def replica_lag(self) -> float | None:
+        if self.replica_engine is None:
+            return None
+        with self.replica_engine.connect() as connection:
+            try:
+                status = connection.execute(text("SHOW REPLICA STATUS")).mappings().first()
+            except DBAPIError:
+                status = connection.execute(text("SHOW SLAVE STATUS")).mappings().first()
+        if status is None:
+            return None
+        lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+        # NULL means replication is stopped; treat it as unbounded lag.
+        return float("inf") if lag is None else float(lag)
+
+    def lock_waits(self) -> int:
+        if self.engine.dialect.name != "mysql":
+            return 0
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                text("SHOW GLOBAL STATUS LIKE 'Innodb_row_lock_current_waits'")
+            ).first()
+        return int(row[1]) if row is not None else 0
+
+    def adapt(self, duration: float) -> None:
+        if duration > self.target_seconds:
+            self.chunk_rows = max(self.min_chunk_rows, self.chunk_rows // 2)
+        elif duration < self.target_seconds / 2:
+            self.chunk_rows = min(self.max_chunk_rows, self.chunk_rows + self.chunk_rows // 2 + 1)
+
+    def pause(self, seconds: float, reason: str) -> None:
+        if seconds <= 0:
+            return
+        history_purge_throttle.labels(reason=reason).inc(seconds)
+        self.sleep(seconds)
+
+    def throttle(self, duration: float) -> None:
+        self.adapt(duration)
+        self.pause(duration * self.sleep_ratio, "pace")
+        backoff = max(self.target_seconds, 0.1)
+        while True:
+            lag = self.replica_lag()
+            waits = self.lock_waits()
+            if lag is not None and lag > self.max_replica_lag:
+                reason = "replica_lag"
+            elif waits > self.max_lock_waits:
+                reason = "lock_wait"
+            else:
+                return
+            logger.info(
+                "History purge throttled",
+                extra={
+                    "event": "history_purge_throttled",
+                    "reason": reason,
+                    "replica_lag": lag,
+                    "lock_waits": waits,
+                },
+            )
+            self.pause(backoff, reason)
+            backoff = min(MAX_BACKOFF_SECONDS, backoff * 2)
+
+    def run(self, cutoff: datetime | None = None, dry_run: bool = False) -> dict:
+        state = None if dry_run else self.checkpoint.load()
+        if state is None:
+            cutoff = cutoff or self.database_cutoff()
+            state = {"cutoff": cutoff.isoformat(), "last_id": 0, "deleted": 0, "archived": 0}
+        else:
+            logger.info(
+                "Resuming history purge from checkpoint",
+                extra={"event": "history_purge_resume", "last_id": state["last_id"]},
+            )
+        cutoff = datetime.fromisoformat(state["cutoff"])
+
+        while True:
+            started_at = time.perf_counter()
+            with self.engine.begin() as connection:
+                end_id, oldest, count = self.next_chunk(connection, state["last_id"])
+                if not count or oldest >= cutoff:
+                    break
+                if dry_run:
+                    deleted = connection.execute(
+                        select(func.count())
+                        .select_from(self.model)
+                        .where(*self.chunk_filter(state["last_id"], end_id, cutoff))
+                    ).scalar_one()
+                else:
+                    if self.archive_dir:
+                        archived = self.archive(connection, state["last_id"], end_id, cutoff)
+                        state["archived"] += archived
+                        history_purge_rows.labels(action="archived").inc(archived)
+                    chunk_filter = self.chunk_filter(state["last_id"], end_id, cutoff)
+                    deleted = connection.execute(delete(self.model).where(*chunk_filter)).rowcount
+            duration = time.perf_counter() - started_at
+            state["last_id"] = end_id
+            state["deleted"] += deleted
+            if not dry_run:
+                self.checkpoint.save(state)
+                history_purge_rows.labels(action="deleted").inc(deleted)
+                history_purge_last_id.set(end_id)
+                history_purge_chunk_duration.observe(duration)
+            logger.info(
+                "History purge chunk",
+                extra={
+                    "event": "history_purge_chunk",
+                    "table": self.model.__tablename__,
+                    "last_id": end_id,
+                    "deleted_count": deleted,
+                    "chunk_rows": count,
+                    "rows_per_sec": round(count / duration) if duration > 0 else None,
+                    "dry_run": dry_run,
+                },
+            )
+            if not dry_run:
+                self.throttle(duration)
+
+        if not dry_run:
+            self.checkpoint.clear()
+        logger.info(
+            "History purge finished",
+            extra={
+                "event": "history_purge_done",
+                "table": self.model.__tablename__,
+                "last_id": state["last_id"],
+                "deleted_count": state["deleted"],
+                "archived_count": state["archived"],
+                "dry_run": dry_run,
+            },
+        )
+        return state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Delete expired raw-data history rows in throttled chunks."
+    )
+    parser.add_argument("--table", choices=sorted(PURGE_TABLES), default="history")
+    parser.add_argument("--dry-run", action="store_true", help="Count expired rows only")
+    parser.add_argument("--metrics-port", type=int, default=None)
+    args = parser.parse_args()
+
+    setup_logging()
+    settings = get_settings()
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    replica_engine = None
+    if settings.history_purge_replica_url:
+        replica_engine = create_engine(settings.history_purge_replica_url, pool_pre_ping=True)
+    purger = HistoryPurger(engine, settings, replica_engine, model=PURGE_TABLES[args.table])
+    purger.run(dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -156,6 +156,8 @@ CREATE TABLE measurement_files (
 
   recipe_id    INT NOT NULL,
 
+  content_digest CHAR(64) NULL,                    -- 마지막 적재 payload의 sha256 (중복 ingest skip 판단)
+
   created_at   DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
   updated_at   DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
 
@@ -209,7 +211,8 @@ CREATE TABLE measurement_items (
 
 
 -- =========================================================
--- 5) Latest/History tables: measurement_raw_data_current, measurement_raw_data_history
+-- 5) Latest/History tables: measurement_raw_data_current, measurement_raw_data_history,
+--    measurement_raw_data_snapshot
 -- =========================================================
 CREATE TABLE measurement_raw_data_current (
   file_id    BIGINT NOT NULL,
@@ -242,8 +245,11 @@ CREATE TABLE measurement_raw_data_current (
   KEY idx_current_item (item_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- ingested_at 기준 일 단위 RANGE 파티션. 보존 기간은 app/db/partitions.py (maintain) 가
+-- 미래 파티션을 미리 만들고 만료 파티션을 DROP/EXCHANGE PARTITION 으로 정리한다.
+-- 파티션 테이블은 FK를 가질 수 없으므로 file/item 참조는 애플리케이션에서 보장한다.
 CREATE TABLE measurement_raw_data_history (
-  id         BIGINT AUTO_INCREMENT PRIMARY KEY,
+  id         BIGINT AUTO_INCREMENT,
   file_id    BIGINT NOT NULL,
   item_id    BIGINT NOT NULL,
 
@@ -261,25 +267,70 @@ CREATE TABLE measurement_raw_data_history (
 
   ingested_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
 
-  CONSTRAINT fk_history_file
-    FOREIGN KEY (file_id) REFERENCES measurement_files(id)
-    ON DELETE CASCADE ON UPDATE CASCADE,
-
-  CONSTRAINT fk_history_item
-    FOREIGN KEY (item_id) REFERENCES measurement_items(id)
-    ON DELETE RESTRICT ON UPDATE CASCADE,
+  PRIMARY KEY (id, ingested_at),
 
   KEY idx_history_ingested_at (ingested_at),
   KEY idx_history_file_ingested (file_id, ingested_at),
   KEY idx_history_item (item_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE COLUMNS (ingested_at) (
+  PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
+
+-- RAW_HISTORY_STORE=snapshot 일 때 history 대신 쓰는 packed 저장소.
+-- 적재 1회(file, ingest)당 1 row, payload 는 item/x/y/measurable/x_0..value 를 열 단위
+-- 배열로 묶어 압축한 것 (형식: app/db/snapshots.py, encoding = zlib | zstd).
+CREATE TABLE measurement_raw_data_snapshot (
+  id          BIGINT AUTO_INCREMENT PRIMARY KEY,
+  file_id     BIGINT NOT NULL,
+  point_count INT NOT NULL,
+  encoding    VARCHAR(16) NOT NULL,
+  payload     LONGBLOB NOT NULL,
+  ingested_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+
+  CONSTRAINT fk_snapshot_file
+    FOREIGN KEY (file_id) REFERENCES measurement_files(id)
+    ON DELETE CASCADE ON UPDATE CASCADE,
+
+  KEY idx_snapshot_file_ingested (file_id, ingested_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- =========================================================
+-- 6) Chunked ingest tracking: measurement_ingests, measurement_ingest_chunks
+-- =========================================================
+-- 역할: 큰 파일을 여러 메시지(chunk)로 나눠 publish 할 때 파일 단위 적재 진행 상태를 기록.
+-- completed_at IS NULL 이면 일부 chunk만 적재된 파일(partial ingest)로 판단.
+CREATE TABLE measurement_ingests (
+  message_id   VARCHAR(64) NOT NULL PRIMARY KEY,   -- 파일 단위 message id (모든 chunk 공통)
+  file_id      BIGINT NOT NULL,
+  chunk_count  INT NOT NULL,
+  started_at   DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+  completed_at DATETIME(6) NULL,                   -- 모든 chunk commit 완료 시각 (완료 marker)
+
+  CONSTRAINT fk_ingests_file
+    FOREIGN KEY (file_id) REFERENCES measurement_files(id)
+    ON DELETE CASCADE ON UPDATE CASCADE,
+
+  KEY idx_ingests_file (file_id),
+  KEY idx_ingests_incomplete (completed_at, started_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- chunk별 commit 기록. 재전달된 chunk는 PK 충돌로 감지하여 중복 적재를 막는다.
+CREATE TABLE measurement_ingest_chunks (
+  message_id  VARCHAR(64) NOT NULL,
+  chunk_index INT NOT NULL,
+  row_count   INT NOT NULL,
+  ingested_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+
+  PRIMARY KEY (message_id, chunk_index),
+
+  CONSTRAINT fk_ingest_chunks_ingest
+    FOREIGN KEY (message_id) REFERENCES measurement_ingests(message_id)
+    ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- =========================================================
--- 7) Purge event: keep history for 1 month
+-- 7) History retention
 -- =========================================================
-CREATE EVENT IF NOT EXISTS purge_raw_data_history
-ON SCHEDULE EVERY 1 DAY
-STARTS CURRENT_TIMESTAMP + INTERVAL 1 HOUR
-DO
-  DELETE FROM measurement_raw_data_history
-  WHERE ingested_at < NOW() - INTERVAL 1 MONTH;
+-- 예전 purge_raw_data_history EVENT(대량 DELETE)는 사용하지 않는다.
+-- 매일 `python -m app.db.partitions maintain` 을 실행해 파티션을 만들고 만료 파티션을 정리한다.
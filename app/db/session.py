@@ -1,3 +1,5 @@
+from datetime import timedelta, timezone
+
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
@@ -5,14 +7,34 @@ from app.config import get_settings
 
 settings = get_settings()
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+connect_args = {}
+if settings.raw_history_load_data and settings.database_url.startswith("mysql"):
+    connect_args["local_infile"] = True
+
+engine = create_engine(settings.database_url, pool_pre_ping=True, connect_args=connect_args)
+
+
+SESSION_TIME_ZONE = timezone(timedelta(hours=9))
+# A bare '+09:00' string is a POSIX zone spec on PostgreSQL, where positive means west of UTC.
+TIME_ZONE_STATEMENTS = {
+    "mysql": "SET time_zone = '+09:00'",
+    "postgresql": "SET TIME ZONE INTERVAL '+09:00' HOUR TO MINUTE",
+}
+
+
+def register_session_time_zone(target_engine) -> None:
+    statement = TIME_ZONE_STATEMENTS.get(target_engine.dialect.name)
+    if statement is None:
+        return
+
+    @event.listens_for(target_engine, "connect")
+    def set_session_time_zone(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(statement)
+        cursor.close()
 
 
-@event.listens_for(engine, "connect")
-def set_session_time_zone(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("SET time_zone = '+09:00'")
-    cursor.close()
+register_session_time_zone(engine)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 
@@ -0,0 +1,178 @@
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.db.models import MeasurementRawDataSnapshot
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+SNAPSHOT = MeasurementRawDataSnapshot
+SNAPSHOT_MAGIC = b"MRS1"
+HEADER = struct.Struct("<4sI")
+# Column order and little-endian element types of the packed payload.
+SNAPSHOT_COLUMNS = (
+    ("item_id", "q", "<i8"),
+    ("x_index", "i", "<i4"),
+    ("y_index", "i", "<i4"),
+    ("measurable", "B", "u1"),
+    ("x_0", "d", "<f8"),
+    ("x_1", "d", "<f8"),
+    ("y_0", "d", "<f8"),
+    ("y_1", "d", "<f8"),
+    ("value", "d", "<f8"),
+)
+SNAPSHOT_ENCODINGS = ("zlib", "zstd")
+
+
+class SnapshotDecodeError(ValueError):
+    pass
+
+
+@dataclass
+class SnapshotInfo:
+    id: int
+    file_id: int
+    point_count: int
+    encoding: str
+    ingested_at: datetime
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "zlib":
+        return zlib.compress(data, 6)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required for zstd history snapshots")
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unsupported snapshot encoding: {encoding}")
+
+
+def _decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "zlib":
+        try:
+            return zlib.decompress(data)
+        except zlib.error as exc:
+            raise SnapshotDecodeError("Invalid zlib snapshot payload") from exc
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required for zstd history snapshots")
+        try:
+            return zstandard.ZstdDecompressor().decompress(data)
+        except zstandard.ZstdError as exc:
+            raise SnapshotDecodeError("Invalid zstd snapshot payload") from exc
+    raise SnapshotDecodeError(f"Unsupported snapshot encoding: {encoding}")
+
+
+def pack_snapshot(rows: list[dict], encoding: str = "zlib") -> bytes:
+    # Sorting by key keeps the index columns in long runs, which compress well.
+    rows = sorted(rows, key=lambda row: (row["item_id"], row["y_index"], row["x_index"]))
+    parts = [HEADER.pack(SNAPSHOT_MAGIC, len(rows))]
+    for name, code, _ in SNAPSHOT_COLUMNS:
+        values = array(code, (row[name] for row in rows))
+        if sys.byteorder == "big":
+            values.byteswap()
+        parts.append(values.tobytes())
+    return _compress(b"".join(parts), encoding)
+
+
+def _columns(payload: bytes, encoding: str) -> tuple[bytes, int]:
+    data = _decompress(payload, encoding)
+    if len(data) < HEADER.size:
+        raise SnapshotDecodeError("Snapshot payload is truncated")
+    magic, count = HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotDecodeError("Snapshot payload has an unknown format")
+    size = sum(array(code).itemsize for _, code, _ in SNAPSHOT_COLUMNS)
+    if len(data) != HEADER.size + size * count:
+        raise SnapshotDecodeError("Snapshot payload length does not match its point count")
+    return data, count
+
+
+def unpack_columns(payload: bytes, encoding: str = "zlib") -> dict[str, list]:
+    data, count = _columns(payload, encoding)
+    columns = {}
+    offset = HEADER.size
+    for name, code, _ in SNAPSHOT_COLUMNS:
+        values = array(code)
+        end = offset + values.itemsize * count
+        values.frombytes(data[offset:end])
+        if sys.byteorder == "big":
+            values.byteswap()
+        columns[name] = values.tolist()
+        offset = end
+    columns["measurable"] = [bool(flag) for flag in columns["measurable"]]
+    return columns
+
+
+def unpack_arrays(payload: bytes, encoding: str = "zlib") -> dict:
+    if numpy is None:
+        raise RuntimeError("numpy is required to read history snapshots as arrays")
+    data, count = _columns(payload, encoding)
+    arrays = {}
+    offset = HEADER.size
+    for name, _, dtype in SNAPSHOT_COLUMNS:
+        arrays[name] = numpy.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += arrays[name].itemsize * count
+    arrays["measurable"] = arrays["measurable"].astype(bool)
+    return arrays
+
+
+def snapshot_rows(file_id: int, columns: dict[str, list]) -> list[dict]:
+    names = [name for name, _, _ in SNAPSHOT_COLUMNS]
+    return [
+        {"file_id": file_id, **dict(zip(names, values))}
+        for values in zip(*(columns[name] for name in names))
+    ]
+
+
+class SnapshotReader:
+    def __init__(self, session) -> None:
+        self.session = session
+
+    def snapshots(
+        self, file_id: int, since: datetime | None = None, until: datetime | None = None
+    ) -> list[SnapshotInfo]:
+        stmt = select(
+            SNAPSHOT.id,
+            SNAPSHOT.file_id,
+            SNAPSHOT.point_count,
+            SNAPSHOT.encoding,
+            SNAPSHOT.ingested_at,
+        ).where(SNAPSHOT.file_id == file_id)
+        if since is not None:
+            stmt = stmt.where(SNAPSHOT.ingested_at >= since)
+        if until is not None:
+            stmt = stmt.where(SNAPSHOT.ingested_at < until)
+        result = self.session.execute(stmt.order_by(SNAPSHOT.ingested_at, SNAPSHOT.id))
+        return [SnapshotInfo(**row) for row in result.mappings()]
+
+    def _payload(self, snapshot_id: int) -> tuple[int, bytes, str]:
+        row = self.session.execute(
+            select(SNAPSHOT.file_id, SNAPSHOT.payload, SNAPSHOT.encoding).where(
+                SNAPSHOT.id == snapshot_id
+            )
+        ).one_or_none()
+        if row is None:
+            raise LookupError(f"History snapshot {snapshot_id} does not exist")
+        return row
+
+    def arrays(self, snapshot_id: int) -> dict:
+        _, payload, encoding = self._payload(snapshot_id)
+        return unpack_arrays(payload, encoding)
+
+    def rows(self, snapshot_id: int) -> list[dict]:
+        file_id, payload, encoding = self._payload(snapshot_id)
+        return snapshot_rows(file_id, unpack_columns(payload, encoding))
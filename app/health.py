@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+import pika
+from sqlalchemy import text
+
+from app.config import Settings, get_settings
+from app.db.session import engine
+from app.metrics import dependency_probe_duration, dependency_up
+from app.queue.rabbitmq import build_connection_parameters
+
+logger = logging.getLogger(__name__)
+
+
+def check_db() -> bool:
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+
+def check_rabbitmq() -> bool:
+    settings = get_settings()
+    parameters = build_connection_parameters(
+        settings,
+        connection_attempts=1,
+        retry_delay=0,
+        socket_timeout=2,
+        blocked_connection_timeout=2,
+    )
+    try:
+        connection = pika.BlockingConnection(parameters)
+        connection.close()
+        return True
+    except Exception:
+        return False
+
+
+class HealthProber:
+    def __init__(
+        self, checks: dict[str, Callable[[], bool]], settings: Settings | None = None
+    ) -> None:
+        settings = settings or get_settings()
+        self.checks = checks
+        self.interval = settings.health_probe_interval
+        self.max_age = settings.health_probe_max_age
+        self._status: dict[str, bool] = {}
+        self._checked_at: float | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def refresh(self) -> dict[str, bool]:
+        status = {}
+        for name, check in self.checks.items():
+            started_at = time.perf_counter()
+            try:
+                ok = bool(check())
+            except Exception:
+                ok = False
+            duration = time.perf_counter() - started_at
+            dependency_probe_duration.labels(dependency=name).observe(duration)
+            dependency_up.labels(dependency=name).set(1 if ok else 0)
+            status[name] = ok
+
+            previous = self._status.get(name)
+            if previous != ok:
+                log = logger.info if ok else logger.warning
+                log(
+                    "Dependency state changed",
+                    extra={
+                        "event": "dependency_state_change",
+                        "dependency": name,
+                        "healthy": ok,
+                        "previous_healthy": previous,
+                    },
+                )
+        with self._lock:
+            self._status = status
+            self._checked_at = time.monotonic()
+        return status
+
+    def snapshot(self) -> tuple[dict[str, bool], float | None]:
+        with self._lock:
+            if self._checked_at is None:
+                return dict(self._status), None
+            return dict(self._status), time.monotonic() - self._checked_at
+
+    def is_stale(self, age: float | None) -> bool:
+        return age is None or age > self.max_age
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+
+
+_health_prober: HealthProber | None = None
+
+
+def get_health_prober() -> HealthProber | None:
+    return _health_prober
+
+
+def start_health_prober() -> HealthProber:
+    global _health_prober
+    if _health_prober is None:
+        _health_prober = HealthProber({"db": check_db, "rabbitmq": check_rabbitmq})
+        _health_prober.refresh()
+        _health_prober.start()
+    return _health_prober
+
+
+def stop_health_prober() -> None:
+    global _health_prober
+    if _health_prober is not None:
+        _health_prober.stop()
+        _health_prober = None
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import Settings, get_settings
+
+
+def payload_digest(payload: dict, idempotency_key: str | None = None) -> str:
+    if idempotency_key:
+        source = f"key:{idempotency_key}".encode("utf-8")
+    else:
+        source = json.dumps(
+            payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        ).encode("utf-8")
+    return hashlib.sha256(source).hexdigest()
+
+
+class IdempotencyCache:
+    def __init__(self, max_size: int, window_seconds: float) -> None:
+        self.max_size = max_size
+        self.window_seconds = window_seconds
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.window_seconds > 0
+
+    def get(self, digest: str) -> str | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            message_id, seen_at = entry
+            if time.monotonic() - seen_at > self.window_seconds:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return message_id
+
+    def put(self, digest: str, message_id: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[digest] = (message_id, time.monotonic())
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest: str, message_id: str) -> None:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[0] == message_id:
+                del self._entries[digest]
+
+
+_idempotency_cache: IdempotencyCache | None = None
+_idempotency_cache_lock = threading.Lock()
+
+
+def get_idempotency_cache(settings: Settings | None = None) -> IdempotencyCache:
+    global _idempotency_cache
+    with _idempotency_cache_lock:
+        if _idempotency_cache is None:
+            settings = settings or get_settings()
+            _idempotency_cache = IdempotencyCache(
+                settings.idempotency_cache_size, settings.idempotency_window_seconds
+            )
+        return _idempotency_cache
@@ -18,10 +18,49 @@ class JsonFormatter(logging.Formatter):
             "file_path",
             "measurement_count",
             "inserted_count",
+            "changed_count",
+            "unchanged_count",
+            "coalesced_count",
+            "duration_ms",
+            "latency_ms",
+            "stage_ms",
+            "profile_path",
+            "peak_bytes",
             "db",
             "rabbitmq",
             "message_id",
             "worker_id",
+            "connected",
+            "queued_count",
+            "rejected_count",
+            "dropped_count",
+            "chunk_index",
+            "batch_size",
+            "cached_count",
+            "table",
+            "rows_per_sec",
+            "queue_depth",
+            "worker_count",
+            "consumer_count",
+            "exit_code",
+            "restart_delay",
+            "attempt",
+            "queue",
+            "error_type",
+            "created_count",
+            "retired_count",
+            "retired_rows",
+            "dry_run",
+            "reason",
+            "last_id",
+            "deleted_count",
+            "archived_count",
+            "replica_lag",
+            "lock_waits",
+            "chunk_rows",
+            "dependency",
+            "healthy",
+            "previous_healthy",
         ):
             if hasattr(record, key):
                 payload[key] = getattr(record, key)
@@ -2,9 +2,13 @@ import logging
 
 from fastapi import FastAPI
 
-from app.api.routes import check_db, check_rabbitmq, router as api_router
+from app.api.routes import router as api_router
+from app.config import get_settings
+from app.health import start_health_prober, stop_health_prober
 from app.logging_config import setup_logging
 from app.metrics import MetricsMiddleware, metrics_app
+from app.queue.buffer import start_publish_buffer, stop_publish_buffer
+from app.queue.rabbitmq import close_publisher_pool, get_publisher_pool
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -18,9 +22,32 @@ app.mount("/metrics", metrics_app())
 @app.on_event("startup")
 def startup_log() -> None:
     logger.info("Server starting", extra={"event": "server_start"})
-    db_ok = check_db()
-    mq_ok = check_rabbitmq()
+    status, _ = start_health_prober().snapshot()
+    db_ok = status["db"]
+    mq_ok = status["rabbitmq"]
     logger.info(
         "Server dependencies",
         extra={"event": "server_deps", "db": db_ok, "rabbitmq": mq_ok},
     )
+    if not mq_ok:
+        return
+    connected = get_publisher_pool().warm()
+    logger.info(
+        "Publisher pool ready",
+        extra={"event": "publisher_pool_ready", "connected": connected},
+    )
+
+
+@app.on_event("startup")
+async def startup_publish_buffer() -> None:
+    if get_settings().ingest_mode != "async":
+        return
+    start_publish_buffer(get_publisher_pool())
+    logger.info("Publish buffer started", extra={"event": "ingest_buffer_start"})
+
+
+@app.on_event("shutdown")
+async def shutdown_publisher_pool() -> None:
+    await stop_publish_buffer()
+    close_publisher_pool()
+    stop_health_prober()
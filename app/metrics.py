@@ -1,6 +1,16 @@
+import os
 import time
 
-from prometheus_client import Counter, Histogram, make_asgi_app
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    make_asgi_app,
+    multiprocess,
+    start_http_server,
+)
 from starlette.middleware.base import BaseHTTPMiddleware
 
 http_requests = Counter(
@@ -13,6 +23,121 @@ http_duration = Histogram(
     "HTTP request duration",
     ["method", "endpoint"],
 )
+publisher_channels_in_use = Gauge(
+    "rabbitmq_publisher_channels_in_use",
+    "Pooled RabbitMQ publisher channels currently checked out",
+)
+publisher_channels_idle = Gauge(
+    "rabbitmq_publisher_channels_idle",
+    "Pooled RabbitMQ publisher channels waiting in the pool",
+)
+dependency_up = Gauge(
+    "dependency_up",
+    "Last background probe result per dependency (1 = reachable)",
+    ["dependency"],
+)
+dependency_probe_duration = Histogram(
+    "dependency_probe_duration_seconds",
+    "Background dependency probe latency",
+    ["dependency"],
+)
+ingest_buffer_depth = Gauge(
+    "ingest_buffer_depth",
+    "Ingest payloads waiting in the in-process publish buffer",
+)
+ingest_buffer_enqueue_wait = Histogram(
+    "ingest_buffer_enqueue_wait_seconds",
+    "Time spent waiting for a free publish buffer slot",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+ingest_buffer_dropped = Counter(
+    "ingest_buffer_dropped_total",
+    "Ingest payloads rejected or lost by the publish buffer",
+    ["reason"],
+)
+dimension_cache_hits = Counter(
+    "worker_dimension_cache_hits_total",
+    "Dimension ID lookups answered from the worker cache",
+    ["dimension"],
+)
+dimension_cache_misses = Counter(
+    "worker_dimension_cache_misses_total",
+    "Dimension ID lookups that had to go to the database",
+    ["dimension"],
+)
+raw_rows_written = Counter(
+    "worker_raw_rows_written_total",
+    "Raw measurement rows written by the worker",
+    ["table"],
+)
+raw_rows_unchanged = Counter(
+    "worker_raw_rows_unchanged_total",
+    "Raw measurement rows skipped by change-only writes because the current value matched",
+)
+raw_write_duration = Histogram(
+    "worker_raw_write_duration_seconds",
+    "Time spent writing raw measurement rows per message",
+    ["table"],
+)
+pipeline_queue_depth = Gauge(
+    "worker_pipeline_queue_depth",
+    "Messages waiting in front of each worker pipeline stage",
+    ["stage"],
+    multiprocess_mode="livesum",
+)
+pipeline_queue_wait = Histogram(
+    "worker_pipeline_queue_wait_seconds",
+    "Time messages spend queued in front of each worker pipeline stage",
+    ["stage"],
+)
+pipeline_stage_duration = Histogram(
+    "worker_pipeline_stage_duration_seconds",
+    "Time spent processing a message in each worker pipeline stage",
+    ["stage"],
+)
+history_purge_rows = Counter(
+    "history_purge_rows_total",
+    "measurement_raw_data_history rows removed by the purge job",
+    ["action"],
+)
+history_purge_last_id = Gauge(
+    "history_purge_last_id",
+    "Highest measurement_raw_data_history id the purge job has walked past",
+)
+history_purge_chunk_duration = Histogram(
+    "history_purge_chunk_duration_seconds",
+    "Time spent archiving and deleting one purge chunk",
+)
+history_purge_throttle = Counter(
+    "history_purge_throttle_seconds_total",
+    "Time the purge job spent paused",
+    ["reason"],
+)
+messages_rejected = Counter(
+    "worker_messages_rejected_total",
+    "Failed messages routed to a delay queue (retry) or the parking queue (parked)",
+    ["outcome"],
+)
+messages_processed = Counter(
+    "worker_messages_processed_total",
+    "Messages committed by the worker (duplicate = skipped by the content digest check)",
+    ["status"],
+)
+end_to_end_latency = Histogram(
+    "worker_end_to_end_latency_seconds",
+    "Time from API publish to worker commit, including retry delays",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+process_stage_duration = Histogram(
+    "worker_process_stage_duration_seconds",
+    "Time spent in each stage of processing a message",
+    ["stage"],
+)
+worker_batch_size = Histogram(
+    "worker_batch_size",
+    "Messages committed together in one worker batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
 
 
 class MetricsMiddleware(BaseHTTPMiddleware):
@@ -35,3 +160,15 @@ class MetricsMiddleware(BaseHTTPMiddleware):
 
 def metrics_app():
     return make_asgi_app()
+
+
+def metrics_registry():
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_metrics_server(port: int) -> None:
+    start_http_server(port, registry=metrics_registry())
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+
+from app.config import Settings, get_settings
+from app.idempotency import IdempotencyCache, get_idempotency_cache
+from app.metrics import ingest_buffer_depth, ingest_buffer_dropped, ingest_buffer_enqueue_wait
+from app.queue.rabbitmq import PublisherPool
+
+logger = logging.getLogger(__name__)
+
+
+class PublishBufferFull(Exception):
+    pass
+
+
+class PublishBuffer:
+    def __init__(
+        self,
+        pool: PublisherPool,
+        settings: Settings | None = None,
+        idempotency_cache: IdempotencyCache | None = None,
+    ) -> None:
+        settings = settings or get_settings()
+        self.pool = pool
+        self.idempotency_cache = idempotency_cache or get_idempotency_cache(settings)
+        self.enqueue_timeout = settings.ingest_buffer_enqueue_timeout
+        self.retry_after = settings.ingest_buffer_retry_after
+        self.max_batch = max(1, settings.ingest_buffer_max_batch)
+        self.publish_retries = settings.ingest_buffer_publish_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.ingest_buffer_size))
+        self._task: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            dropped = self.depth
+            ingest_buffer_dropped.labels(reason="shutdown").inc(dropped)
+            while not self._queue.empty():
+                _, message_id, digest = self._queue.get_nowait()
+                self._forget(digest, message_id)
+            logger.error(
+                "Publish buffer not drained before shutdown",
+                extra={"event": "ingest_buffer_shutdown", "dropped_count": dropped},
+            )
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, payload: dict, digest: str | None = None) -> str:
+        message_id = str(uuid.uuid4())
+        item = (payload, message_id, digest)
+        started_at = time.perf_counter()
+        try:
+            if not self._queue.full():
+                self._queue.put_nowait(item)
+            else:
+                await asyncio.wait_for(self._queue.put(item), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError as exc:
+            ingest_buffer_dropped.labels(reason="full").inc()
+            raise PublishBufferFull("Ingest buffer full") from exc
+        finally:
+            ingest_buffer_enqueue_wait.observe(time.perf_counter() - started_at)
+        ingest_buffer_depth.set(self.depth)
+        return message_id
+
+    def _forget(self, digest: str | None, message_id: str) -> None:
+        # The request was answered as accepted, so a client retry must not be reported as a
+        # duplicate of a payload that never reached the broker.
+        if digest is not None:
+            self.idempotency_cache.discard(digest, message_id)
+
+    def _publish_pending(self, pending: deque) -> None:
+        with self.pool.acquire() as client:
+            while pending:
+                payload, message_id, digest = pending[0]
+                client.publish(payload, message_id, digest)
+                pending.popleft()
+
+    async def _run(self) -> None:
+        while True:
+            pending = deque([await self._queue.get()])
+            while len(pending) < self.max_batch and not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            taken = len(pending)
+            ingest_buffer_depth.set(self.depth)
+            attempt = 0
+            while pending:
+                try:
+                    await asyncio.to_thread(self._publish_pending, pending)
+                except Exception:
+                    attempt += 1
+                    if attempt <= self.publish_retries:
+                        await asyncio.sleep(min(0.1 * 2**attempt, 5.0))
+                        continue
+                    _, message_id, digest = pending.popleft()
+                    attempt = 0
+                    self._forget(digest, message_id)
+                    ingest_buffer_dropped.labels(reason="publish_failed").inc()
+                    logger.exception(
+                        "Buffered ingest publish failed",
+                        extra={"event": "ingest_error", "message_id": message_id},
+                    )
+            for _ in range(taken):
+                self._queue.task_done()
+
+
+_publish_buffer: PublishBuffer | None = None
+
+
+def get_publish_buffer() -> PublishBuffer | None:
+    return _publish_buffer
+
+
+def start_publish_buffer(pool: PublisherPool) -> PublishBuffer:
+    global _publish_buffer
+    if _publish_buffer is None:
+        _publish_buffer = PublishBuffer(pool)
+        _publish_buffer.start()
+    return _publish_buffer
+
+
+async def stop_publish_buffer() -> None:
+    global _publish_buffer
+    if _publish_buffer is not None:
+        await _publish_buffer.stop()
+        _publish_buffer = None
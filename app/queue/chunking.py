@@ -0,0 +1,49 @@
+COLUMN_ARRAYS = (
+    "item_code",
+    "measurable",
+    "x_index",
+    "y_index",
+    "x_0",
+    "x_1",
+    "y_0",
+    "y_1",
+    "value",
+)
+
+
+def point_count(payload: dict) -> int:
+    columns = payload.get("columns")
+    if columns is not None:
+        return len(columns["item_code"])
+    return len(payload.get("measurements") or [])
+
+
+def _slice_payload(payload: dict, start: int, stop: int) -> dict:
+    columns = payload.get("columns")
+    if columns is None:
+        return {**payload, "measurements": payload["measurements"][start:stop]}
+    sliced = dict(columns)
+    for name in COLUMN_ARRAYS:
+        if sliced.get(name) is not None:
+            sliced[name] = sliced[name][start:stop]
+    return {**payload, "columns": sliced}
+
+
+def build_messages(
+    payload: dict, message_id: str, max_points: int, digest: str | None = None
+) -> list[dict]:
+    envelope = {"id": message_id}
+    if digest is not None:
+        envelope["digest"] = digest
+    total = point_count(payload)
+    if max_points <= 0 or total <= max_points:
+        return [{**envelope, "payload": payload}]
+    count = -(-total // max_points)
+    return [
+        {
+            **envelope,
+            "chunk": {"index": index, "count": count},
+            "payload": _slice_payload(payload, index * max_points, (index + 1) * max_points),
+        }
+        for index in range(count)
+    ]
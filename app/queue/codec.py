@@ -0,0 +1,159 @@
+import gzip
+import json
+import sys
+import zlib
+from array import array
+
+from app.config import Settings, get_settings
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+# msgpack ext type codes for packed little-endian column arrays.
+FLOAT64_ARRAY = 1
+INT64_ARRAY = 2
+BOOL_ARRAY = 3
+
+FLOAT_COLUMNS = ("x_0", "x_1", "y_0", "y_1", "value")
+INT_COLUMNS = ("item_code", "x_index", "y_index")
+
+
+class MessageDecodeError(ValueError):
+    pass
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode: str, data: bytes) -> list:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
+
+
+def _pack_columns(columns: dict) -> dict:
+    packed = dict(columns)
+    for name in FLOAT_COLUMNS:
+        data = _to_little_endian(array("d", columns[name]))
+        packed[name] = msgpack.ExtType(FLOAT64_ARRAY, data)
+    for name in INT_COLUMNS:
+        data = _to_little_endian(array("q", columns[name]))
+        packed[name] = msgpack.ExtType(INT64_ARRAY, data)
+    if columns.get("measurable") is not None:
+        packed["measurable"] = msgpack.ExtType(BOOL_ARRAY, bytes(columns["measurable"]))
+    return packed
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == FLOAT64_ARRAY:
+        return _from_little_endian("d", data)
+    if code == INT64_ARRAY:
+        return _from_little_endian("q", data)
+    if code == BOOL_ARRAY:
+        return [bool(flag) for flag in data]
+    return msgpack.ExtType(code, data)
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=5)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def _decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise MessageDecodeError("zstandard is required to decode zstd messages")
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise MessageDecodeError(f"Unsupported content encoding: {encoding}")
+
+
+class MessageCodec:
+    def __init__(
+        self,
+        content_type: str = JSON_CONTENT_TYPE,
+        compression: str | None = None,
+        compression_min_bytes: int = 0,
+    ) -> None:
+        if content_type not in (JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE):
+            raise ValueError(f"Unsupported content type: {content_type}")
+        if content_type == MSGPACK_CONTENT_TYPE and msgpack is None:
+            raise RuntimeError("msgpack is required for the msgpack message codec")
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Unsupported content encoding: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstandard is required for zstd message compression")
+        self.content_type = content_type
+        self.compression = compression
+        self.compression_min_bytes = compression_min_bytes
+
+    @classmethod
+    def from_settings(cls, settings: Settings | None = None) -> "MessageCodec":
+        settings = settings or get_settings()
+        content_type = {
+            "json": JSON_CONTENT_TYPE,
+            "msgpack": MSGPACK_CONTENT_TYPE,
+        }.get(settings.queue_message_codec, settings.queue_message_codec)
+        compression = settings.queue_message_compression
+        return cls(
+            content_type=content_type,
+            compression=None if compression in ("", "none") else compression,
+            compression_min_bytes=settings.queue_message_compression_min_bytes,
+        )
+
+    def encode(self, message: dict) -> tuple[bytes, str, str | None]:
+        if self.content_type == MSGPACK_CONTENT_TYPE:
+            payload = message.get("payload")
+            if isinstance(payload, dict) and payload.get("columns") is not None:
+                payload = {**payload, "columns": _pack_columns(payload["columns"])}
+                message = {**message, "payload": payload}
+            body = msgpack.packb(message, use_bin_type=True)
+        else:
+            body = json.dumps(message).encode("utf-8")
+        if self.compression and len(body) >= self.compression_min_bytes:
+            return _compress(body, self.compression), self.content_type, self.compression
+        return body, self.content_type, None
+
+
+def decode_message(
+    body: bytes, content_type: str | None = None, content_encoding: str | None = None
+) -> dict:
+    try:
+        if content_encoding:
+            body = _decompress(body, content_encoding)
+        if content_type == MSGPACK_CONTENT_TYPE:
+            if msgpack is None:
+                raise MessageDecodeError("msgpack is required to decode msgpack messages")
+            message = msgpack.unpackb(body, ext_hook=_ext_hook, raw=False)
+        else:
+            message = json.loads(body)
+        if not isinstance(message, dict):
+            raise MessageDecodeError(f"Message must be an object, not {type(message).__name__}")
+        return message
+    except MessageDecodeError:
+        raise
+    except (ValueError, TypeError, OSError, zlib.error, EOFError) as exc:
+        raise MessageDecodeError(str(exc)) from exc
+    except Exception as exc:
+        if zstandard is not None and isinstance(exc, zstandard.ZstdError):
+            raise MessageDecodeError(str(exc)) from exc
+        raise
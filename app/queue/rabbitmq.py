@@ -1,37 +1,98 @@
-import json
+import logging
+import queue
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 
 import pika
+from pika.exceptions import AMQPChannelError, AMQPConnectionError
 
-from app.config import get_settings
+from app.config import Settings, get_settings
+from app.metrics import publisher_channels_idle, publisher_channels_in_use
+from app.queue.chunking import build_messages
+from app.queue.codec import MessageCodec
+
+logger = logging.getLogger(__name__)
+
+# Epoch milliseconds; AMQP header tables cannot carry floats.
+PUBLISHED_AT_HEADER = "x-published-at"
+
+
+def build_connection_parameters(settings: Settings, **overrides) -> pika.ConnectionParameters:
+    credentials = pika.PlainCredentials(settings.rabbitmq_user, settings.rabbitmq_password)
+    return pika.ConnectionParameters(
+        host=settings.rabbitmq_host,
+        port=settings.rabbitmq_port,
+        credentials=credentials,
+        **overrides,
+    )
 
 
 class RabbitMQClient:
-    def __init__(self) -> None:
-        settings = get_settings()
-        credentials = pika.PlainCredentials(settings.rabbitmq_user, settings.rabbitmq_password)
-        parameters = pika.ConnectionParameters(
-            host=settings.rabbitmq_host,
-            port=settings.rabbitmq_port,
-            credentials=credentials,
-        )
+    def __init__(self, settings: Settings | None = None, confirm_delivery: bool = False) -> None:
+        settings = settings or get_settings()
+        parameters = build_connection_parameters(settings)
         self.queue_name = settings.rabbitmq_queue_name
+        self.codec = MessageCodec.from_settings(settings)
+        self.chunk_max_points = settings.queue_chunk_max_points
         self.connection = pika.BlockingConnection(parameters)
         self.channel = self.connection.channel()
         self.channel.queue_declare(queue=self.queue_name, durable=True)
+        if confirm_delivery:
+            self.channel.confirm_delivery()
+        self.tx_channel = None
 
-    def publish(self, payload: dict) -> str:
-        message_id = str(uuid.uuid4())
-        body = json.dumps({"id": message_id, "payload": payload})
-        properties = pika.BasicProperties(delivery_mode=2, content_type="application/json")
-        self.channel.basic_publish(
+    def _publish_on(self, channel, message: dict) -> None:
+        body, content_type, content_encoding = self.codec.encode(message)
+        properties = pika.BasicProperties(
+            delivery_mode=2,
+            content_type=content_type,
+            content_encoding=content_encoding,
+            headers={PUBLISHED_AT_HEADER: int(time.time() * 1000)},
+        )
+        channel.basic_publish(
             exchange="",
             routing_key=self.queue_name,
             body=body,
             properties=properties,
         )
+
+    def _publish_transaction(self, messages: list[dict]) -> None:
+        if self.tx_channel is None or not self.tx_channel.is_open:
+            self.tx_channel = self.connection.channel()
+            self.tx_channel.tx_select()
+        try:
+            for message in messages:
+                self._publish_on(self.tx_channel, message)
+            self.tx_channel.tx_commit()
+        except Exception:
+            if self.tx_channel.is_open:
+                self.tx_channel.tx_rollback()
+            raise
+
+    def publish(
+        self, payload: dict, message_id: str | None = None, digest: str | None = None
+    ) -> str:
+        message_id = message_id or str(uuid.uuid4())
+        messages = build_messages(payload, message_id, self.chunk_max_points, digest)
+        if len(messages) == 1:
+            self._publish_on(self.channel, messages[0])
+        else:
+            self._publish_transaction(messages)
         return message_id
 
+    def publish_batch(self, items: list[tuple[dict, str, str | None]]) -> list[str]:
+        messages = []
+        for payload, message_id, digest in items:
+            messages.extend(build_messages(payload, message_id, self.chunk_max_points, digest))
+        self._publish_transaction(messages)
+        return [message_id for _, message_id, _ in items]
+
+    @property
+    def is_open(self) -> bool:
+        return bool(self.connection and self.connection.is_open and self.channel.is_open)
+
     def close(self) -> None:
         if self.connection and self.connection.is_open:
             self.connection.close()
@@ -41,3 +102,143 @@ class RabbitMQClient:
 
     def __exit__(self, exc_type, exc, tb):
         self.close()
+
+
+def close_quietly(client: RabbitMQClient | None) -> None:
+    if client is None:
+        return
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+class PublisherPool:
+    def __init__(self, settings: Settings | None = None) -> None:
+        self.settings = settings or get_settings()
+        self.size = max(1, self.settings.rabbitmq_publisher_pool_size)
+        self.acquire_timeout = self.settings.rabbitmq_publisher_acquire_timeout
+        self.confirm_delivery = self.settings.rabbitmq_publisher_confirms
+        self._slots: queue.LifoQueue = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._closed = False
+        for _ in range(self.size):
+            self._slots.put(None)
+        self._update_gauges()
+
+    def _connect(self) -> RabbitMQClient:
+        return RabbitMQClient(self.settings, confirm_delivery=self.confirm_delivery)
+
+    def _update_gauges(self) -> None:
+        publisher_channels_in_use.set(self._in_use)
+        publisher_channels_idle.set(self.size - self._in_use)
+
+    def warm(self) -> int:
+        connected = 0
+        for _ in range(self.size):
+            client = self._slots.get_nowait()
+            try:
+                if client is None or not client.is_open:
+                    client = self._connect()
+                connected += 1
+            except Exception:
+                logger.exception(
+                    "Publisher connection failed",
+                    extra={"event": "publisher_connect_error"},
+                )
+                client = None
+            finally:
+                self._slots.put_nowait(client)
+        return connected
+
+    @contextmanager
+    def acquire(self):
+        if self._closed:
+            raise RuntimeError("Publisher pool is closed")
+        try:
+            client = self._slots.get(timeout=self.acquire_timeout)
+        except queue.Empty as exc:
+            raise TimeoutError("No publisher channel available") from exc
+        with self._lock:
+            self._in_use += 1
+            self._update_gauges()
+        try:
+            if client is not None and not client.is_open:
+                client.close()
+                client = None
+            if client is None:
+                client = self._connect()
+            else:
+                client.connection.process_data_events(time_limit=0)
+            yield client
+        except Exception:
+            close_quietly(client)
+            client = None
+            raise
+        finally:
+            with self._lock:
+                # close() only reaches idle slots; a client checked out meanwhile closes here.
+                if self._closed:
+                    close_quietly(client)
+                    client = None
+                self._slots.put_nowait(client)
+                self._in_use -= 1
+                self._update_gauges()
+
+    def publish(
+        self, payload: dict, message_id: str | None = None, digest: str | None = None
+    ) -> str:
+        message_id = message_id or str(uuid.uuid4())
+        try:
+            with self.acquire() as client:
+                return client.publish(payload, message_id, digest)
+        except (AMQPConnectionError, AMQPChannelError):
+            logger.warning(
+                "Publisher channel lost, reconnecting",
+                extra={"event": "publisher_reconnect", "message_id": message_id},
+            )
+        with self.acquire() as client:
+            return client.publish(payload, message_id, digest)
+
+    def publish_batch(self, items: list[tuple[dict, str, str | None]]) -> list[str]:
+        try:
+            with self.acquire() as client:
+                return client.publish_batch(items)
+        except (AMQPConnectionError, AMQPChannelError):
+            logger.warning(
+                "Publisher channel lost, reconnecting",
+                extra={"event": "publisher_reconnect", "queued_count": len(items)},
+            )
+        with self.acquire() as client:
+            return client.publish_batch(items)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    client = self._slots.get_nowait()
+                except queue.Empty:
+                    break
+                close_quietly(client)
+
+
+_publisher_pool: PublisherPool | None = None
+_publisher_pool_lock = threading.Lock()
+
+
+def get_publisher_pool() -> PublisherPool:
+    global _publisher_pool
+    with _publisher_pool_lock:
+        if _publisher_pool is None:
+            _publisher_pool = PublisherPool()
+        return _publisher_pool
+
+
+def close_publisher_pool() -> None:
+    global _publisher_pool
+    with _publisher_pool_lock:
+        if _publisher_pool is not None:
+            _publisher_pool.close()
+            _publisher_pool = None
@@ -0,0 +1,113 @@
+import logging
+
+import pika
+
+from app.config import Settings
+from app.metrics import messages_rejected
+
+logger = logging.getLogger(__name__)
+
+ATTEMPT_HEADER = "x-retry-attempt"
+ERROR_HEADER = "x-retry-error"
+ERROR_TYPE_HEADER = "x-retry-error-type"
+MAX_ERROR_LENGTH = 1000
+
+
+class RetryPolicy:
+    def __init__(
+        self, queue_name: str, max_attempts: int, base_delay_ms: int, max_delay_ms: int
+    ) -> None:
+        self.queue_name = queue_name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay_ms = max(1, base_delay_ms)
+        self.max_delay_ms = max(self.base_delay_ms, max_delay_ms)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "RetryPolicy":
+        return cls(
+            settings.rabbitmq_queue_name,
+            settings.worker_retry_max_attempts,
+            settings.worker_retry_base_delay_ms,
+            settings.worker_retry_max_delay_ms,
+        )
+
+    @property
+    def parking_queue(self) -> str:
+        return f"{self.queue_name}.parking"
+
+    def retry_queue(self, attempt: int) -> str:
+        return f"{self.queue_name}.retry.{attempt}"
+
+    def delay_ms(self, attempt: int) -> int:
+        return min(self.max_delay_ms, self.base_delay_ms * 2 ** (attempt - 1))
+
+    def queues(self) -> list[tuple[str, dict]]:
+        # One queue per attempt so every message in a queue shares the same TTL;
+        # a single queue with per-message TTLs would hold short delays behind long ones.
+        queues = [
+            (
+                self.retry_queue(attempt),
+                {
+                    "x-message-ttl": self.delay_ms(attempt),
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self.queue_name,
+                },
+            )
+            for attempt in range(1, self.max_attempts)
+        ]
+        queues.append((self.parking_queue, {}))
+        return queues
+
+    def route(self, headers: dict | None, error: BaseException, retryable: bool):
+        attempt = int((headers or {}).get(ATTEMPT_HEADER, 0)) + 1
+        headers = {**(headers or {}), ATTEMPT_HEADER: attempt}
+        if retryable and attempt < self.max_attempts:
+            return self.retry_queue(attempt), headers, "retry"
+        headers[ERROR_HEADER] = str(error)[:MAX_ERROR_LENGTH]
+        headers[ERROR_TYPE_HEADER] = type(error).__name__
+        return self.parking_queue, headers, "parked"
+
+
+def declare_retry_topology(channel, policy: RetryPolicy) -> None:
+    for queue_name, arguments in policy.queues():
+        channel.queue_declare(queue=queue_name, durable=True, arguments=arguments or None)
+
+
+class RetryRouter:
+    def __init__(self, channel, policy: RetryPolicy) -> None:
+        self.channel = channel
+        self.policy = policy
+
+    def reject(
+        self, delivery_tag: int, properties, body: bytes, error: BaseException, retryable: bool
+    ) -> str:
+        routing_key, headers, outcome = self.policy.route(
+            getattr(properties, "headers", None), error, retryable
+        )
+        self.channel.basic_publish(
+            exchange="",
+            routing_key=routing_key,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+                content_type=properties.content_type,
+                content_encoding=properties.content_encoding,
+                headers=headers,
+            ),
+        )
+        self.channel.basic_ack(delivery_tag=delivery_tag)
+        log_rejected(outcome, routing_key, headers, error)
+        return outcome
+
+
+def log_rejected(outcome: str, routing_key: str, headers: dict, error: BaseException) -> None:
+    messages_rejected.labels(outcome=outcome).inc()
+    logger.warning(
+        "Message parked" if outcome == "parked" else "Message scheduled for retry",
+        extra={
+            "event": f"message_{outcome}",
+            "attempt": headers[ATTEMPT_HEADER],
+            "queue": routing_key,
+            "error_type": type(error).__name__,
+        },
+    )
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class MeasurementPoint(BaseModel):
@@ -16,6 +16,39 @@ class MeasurementPoint(BaseModel):
     value: float
 
 
+class ItemDescriptor(BaseModel):
+    metric_name: str = Field(..., min_length=1)
+    metric_unit: str | None = None
+    class_name: str = Field(..., min_length=1)
+    measure_item: str = Field(..., min_length=1)
+
+
+class ColumnarMeasurements(BaseModel):
+    items: list[ItemDescriptor] = Field(..., min_length=1)
+    item_code: list[int]
+    measurable: list[bool] | None = None
+    x_index: list[int]
+    y_index: list[int]
+    x_0: list[float]
+    x_1: list[float]
+    y_0: list[float]
+    y_1: list[float]
+    value: list[float]
+
+    @model_validator(mode="after")
+    def check_columns(self):
+        size = len(self.item_code)
+        names = ["x_index", "y_index", "x_0", "x_1", "y_0", "y_1", "value"]
+        if self.measurable is not None:
+            names.append("measurable")
+        for name in names:
+            if len(getattr(self, name)) != size:
+                raise ValueError(f"column {name} must have {size} values")
+        if size and (min(self.item_code) < 0 or max(self.item_code) >= len(self.items)):
+            raise ValueError("item_code references an unknown item descriptor")
+        return self
+
+
 class IngestRequest(BaseModel):
     product_name: str = Field(..., min_length=1)
     site_name: str = Field(..., min_length=1)
@@ -27,9 +60,29 @@ class IngestRequest(BaseModel):
     file_name: str = Field(..., min_length=1)
     lot_name: str | None = None
     wf_number: int | None = None
-    measurements: list[MeasurementPoint]
+    measurements: list[MeasurementPoint] | None = None
+    columns: ColumnarMeasurements | None = None
+
+    @model_validator(mode="after")
+    def check_measurements(self):
+        if (self.measurements is None) == (self.columns is None):
+            raise ValueError("exactly one of measurements or columns is required")
+        return self
 
 
 class IngestResponse(BaseModel):
     status: str
     id: str
+
+
+class IngestBatchItemResponse(IngestResponse):
+    index: int
+    id: str | None = None
+    error: str | None = None
+
+
+class IngestBatchResponse(BaseModel):
+    queued: int
+    rejected: int
+    duplicates: int = 0
+    items: list[IngestBatchItemResponse]
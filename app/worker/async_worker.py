@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import signal
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import Settings, get_settings
+from app.db.session import register_session_time_zone
+from app.metrics import start_metrics_server
+from app.queue.codec import MessageDecodeError
+from app.queue.retry import RetryPolicy, log_rejected
+from app.worker.worker import (
+    PROCESSING_ERRORS,
+    current_worker_id,
+    handle_message,
+    is_retryable,
+    log_processed,
+    prepare_message,
+)
+from app.worker.profiling import collect_timings, stage_ms, timed_stage
+
+try:
+    import aio_pika
+except ImportError:  # pragma: no cover - optional dependency
+    aio_pika = None
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def async_database_url(settings: Settings) -> str:
+    if settings.async_database_url:
+        return settings.async_database_url
+    url = make_url(settings.database_url)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def handle_message_timed(session, message: dict, idempotency_window: float, shaped) -> dict:
+    # run_sync executes in a greenlet that may not share the task's context, so the stages
+    # timed there need a collector of their own.
+    with collect_timings() as timings:
+        result = handle_message(session, message, idempotency_window, shaped)
+    result["stage_ms"] = stage_ms(timings)
+    return result
+
+
+class AsyncMessageProcessor:
+    def __init__(self, session_factory, settings: Settings, exchange) -> None:
+        self.session_factory = session_factory
+        self.exchange = exchange
+        self.retry = RetryPolicy.from_settings(settings)
+        self.idempotency_window = settings.idempotency_window_seconds
+        self.semaphore = asyncio.Semaphore(max(1, settings.worker_async_concurrency))
+        self.worker_id = current_worker_id()
+        self.tasks: set[asyncio.Task] = set()
+
+    async def process(
+        self,
+        body: bytes,
+        content_type: str | None,
+        content_encoding: str | None,
+        headers: dict | None = None,
+    ) -> Exception | None:
+        try:
+            message, shaped = await asyncio.to_thread(
+                prepare_message, body, content_type, content_encoding
+            )
+        except (MessageDecodeError, KeyError, TypeError, ValueError) as exc:
+            logger.exception("Failed to process message: %s", exc, extra={"event": "error"})
+            return exc
+        logger.info(
+            "Worker received message",
+            extra={
+                "event": "received",
+                "message_id": message.get("id"),
+                "worker_id": self.worker_id,
+            },
+        )
+
+        started_at = time.perf_counter()
+        async with self.session_factory() as session:
+            try:
+                with collect_timings() as timings:
+                    result = await session.run_sync(
+                        handle_message_timed, message, self.idempotency_window, shaped
+                    )
+                    with timed_stage("commit"):
+                        await session.commit()
+                result["stage_ms"] = {**result["stage_ms"], **stage_ms(timings)}
+            except PROCESSING_ERRORS as exc:
+                await session.rollback()
+                logger.exception(
+                    "Failed to process message: %s",
+                    exc,
+                    extra={"event": "error", "message_id": message.get("id")},
+                )
+                return exc
+        duration_ms = int((time.perf_counter() - started_at) * 1000)
+        log_processed(message, result, duration_ms, 1, self.worker_id, headers)
+        return None
+
+    async def reject(self, message, error: Exception) -> None:
+        routing_key, headers, outcome = self.retry.route(
+            message.headers, error, is_retryable(error)
+        )
+        await self.exchange.publish(
+            aio_pika.Message(
+                message.body,
+                headers=headers,
+                content_type=message.content_type,
+                content_encoding=message.content_encoding,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=routing_key,
+        )
+        await message.ack()
+        log_rejected(outcome, routing_key, headers, error)
+
+    async def on_message(self, message) -> None:
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            try:
+                async with self.semaphore:
+                    error = await self.process(
+                        message.body,
+                        message.content_type,
+                        message.content_encoding,
+                        message.headers,
+                    )
+            except Exception as exc:
+                logger.exception("Failed to process message: %s", exc, extra={"event": "error"})
+                error = exc
+            if error is None:
+                await message.ack()
+            else:
+                await self.reject(message, error)
+        finally:
+            self.tasks.discard(task)
+
+    async def drain(self) -> None:
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+async def consume(settings: Settings | None = None) -> None:
+    settings = settings or get_settings()
+    if aio_pika is None:
+        raise RuntimeError("aio-pika is required for the asyncio worker")
+
+    engine = create_async_engine(async_database_url(settings), pool_pre_ping=True)
+    register_session_time_zone(engine.sync_engine)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    logger.info("Worker starting", extra={"event": "worker_start"})
+    if settings.worker_metrics_port:
+        start_metrics_server(settings.worker_metrics_port)
+    connection = await aio_pika.connect_robust(
+        host=settings.rabbitmq_host,
+        port=settings.rabbitmq_port,
+        login=settings.rabbitmq_user,
+        password=settings.rabbitmq_password,
+    )
+    logger.info("RabbitMQ connected", extra={"event": "rabbitmq_connected"})
+    try:
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=max(1, settings.worker_async_concurrency))
+        queue = await channel.declare_queue(settings.rabbitmq_queue_name, durable=True)
+        retry = RetryPolicy.from_settings(settings)
+        for queue_name, arguments in retry.queues():
+            await channel.declare_queue(queue_name, durable=True, arguments=arguments or None)
+        processor = AsyncMessageProcessor(session_factory, settings, channel.default_exchange)
+        consumer_tag = await queue.consume(processor.on_message)
+        logger.info("Worker started. Waiting for messages...")
+        await stop.wait()
+        logger.info("Worker stopping...")
+        await queue.cancel(consumer_tag)
+        await processor.drain()
+    finally:
+        await connection.close()
+        await engine.dispose()
+
+
+def main() -> None:
+    try:
+        asyncio.run(consume())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+
+from app.config import Settings, get_settings
+from app.db.models import (
+    MeasurementItem,
+    MeasurementRecipe,
+    MetricType,
+    ProductName,
+    SpasModule,
+    SpasNode,
+    SpasReference,
+    SpasSite,
+)
+from app.metrics import dimension_cache_hits, dimension_cache_misses
+
+PENDING_KEY = "dimension_cache_pending"
+
+# (model, natural key columns, columns the worker upserts on every message)
+WARM_DIMENSIONS = (
+    (ProductName, ("name",), ("is_active",)),
+    (SpasSite, ("name",), ("is_active",)),
+    (SpasNode, ("name",), ("is_active",)),
+    (SpasModule, ("name",), ("is_active",)),
+    (MeasurementRecipe, ("name", "version"), ()),
+    (SpasReference, ("product_id", "site_id", "node_id", "module_id"), ()),
+    (MetricType, ("name",), ("unit", "is_active")),
+    (MeasurementItem, ("class_name", "measure_item", "metric_type_id"), ("is_active",)),
+)
+
+
+def dimension_key(model, lookup_filters: dict, update_fields: dict) -> tuple:
+    return (
+        model.__tablename__,
+        tuple(sorted(lookup_filters.items())),
+        tuple(sorted(update_fields.items())),
+    )
+
+
+class DimensionCache:
+    def __init__(self, max_size: int, ttl_seconds: float = 0) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple, tuple[int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple, session=None) -> int | None:
+        if not self.enabled:
+            return None
+        if session is not None:
+            pending = session.info.get(PENDING_KEY)
+            if pending and key in pending:
+                dimension_cache_hits.labels(dimension=key[0]).inc()
+                return pending[key]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds > 0:
+                if time.monotonic() - entry[1] > self.ttl_seconds:
+                    del self._entries[key]
+                    entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            dimension_cache_misses.labels(dimension=key[0]).inc()
+            return None
+        dimension_cache_hits.labels(dimension=key[0]).inc()
+        return entry[0]
+
+    def put(self, key: tuple, dimension_id: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (dimension_id, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stage(self, session, key: tuple, dimension_id: int) -> None:
+        if not self.enabled:
+            return
+        pending = session.info.get(PENDING_KEY)
+        if pending is None:
+            pending = session.info[PENDING_KEY] = {}
+            if not session.info.get("dimension_cache_listening"):
+                session.info["dimension_cache_listening"] = True
+                event.listen(session, "after_commit", self._on_commit)
+                event.listen(session, "after_soft_rollback", self._on_rollback)
+        pending[key] = dimension_id
+
+    def _on_commit(self, session) -> None:
+        pending = session.info.pop(PENDING_KEY, None)
+        for key, dimension_id in (pending or {}).items():
+            self.put(key, dimension_id)
+
+    def _on_rollback(self, session, previous_transaction) -> None:
+        session.info.pop(PENDING_KEY, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def warm(self, session) -> int:
+        if not self.enabled:
+            return 0
+        loaded = 0
+        for model, key_columns, update_columns in WARM_DIMENSIONS:
+            stmt = select(model)
+            if "is_active" in update_columns:
+                stmt = stmt.where(model.is_active.is_(True))
+            for row in session.execute(stmt.limit(self.max_size - loaded)).scalars():
+                lookup = {column: getattr(row, column) for column in key_columns}
+                updates = {column: getattr(row, column) for column in update_columns}
+                self.put(dimension_key(model, lookup, updates), row.id)
+                loaded += 1
+            if loaded >= self.max_size:
+                break
+        return loaded
+
+
+_dimension_cache: DimensionCache | None = None
+_dimension_cache_lock = threading.Lock()
+
+
+def get_dimension_cache(settings: Settings | None = None) -> DimensionCache:
+    global _dimension_cache
+    with _dimension_cache_lock:
+        if _dimension_cache is None:
+            settings = settings or get_settings()
+            _dimension_cache = DimensionCache(
+                settings.dimension_cache_size, settings.dimension_cache_ttl_seconds
+            )
+        return _dimension_cache
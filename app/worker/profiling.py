@@ -0,0 +1,161 @@
+import cProfile
+import logging
+import os
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.config import Settings
+from app.metrics import process_stage_duration
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("off", "cprofile", "tracemalloc")
+PROFILE_EXTENSIONS = {"cprofile": "prof", "tracemalloc": "tracemalloc"}
+TRACEMALLOC_FRAMES = 25
+
+_stage_timings: ContextVar[dict[str, float] | None] = ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def collect_timings():
+    # Nested collectors share the outer dict so a consumer sees the stages of every call it wraps.
+    timings = _stage_timings.get()
+    if timings is not None:
+        yield timings
+        return
+    timings = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started_at
+        process_stage_duration.labels(stage=stage).observe(duration)
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + duration
+
+
+def stage_ms(timings: dict[str, float]) -> dict[str, float]:
+    return {stage: round(duration * 1000, 3) for stage, duration in timings.items()}
+
+
+def safe_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", value)
+
+
+class MessageProfiler:
+    def __init__(self, mode: str, sample_every: int, directory: str, worker_id: str) -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unsupported profile mode: {mode}")
+        self.mode = mode
+        self.sample_every = max(1, sample_every)
+        self.directory = directory
+        self.worker_id = worker_id
+        self.seen = 0
+        self._count_lock = threading.Lock()
+        # cProfile and tracemalloc are process-wide hooks, so only one sample runs at a time.
+        self._profile_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings, worker_id: str) -> "MessageProfiler":
+        return cls(
+            settings.worker_profile_mode,
+            settings.worker_profile_sample_every,
+            settings.worker_profile_dir,
+            worker_id,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def should_sample(self) -> bool:
+        if not self.enabled:
+            return False
+        with self._count_lock:
+            self.seen += 1
+            return self.seen % self.sample_every == 0
+
+    def path(self, message_id: str | None) -> str:
+        name = f"{self.worker_id}-{time.strftime('%Y%m%dT%H%M%S')}-{message_id or 'batch'}"
+        return os.path.join(self.directory, f"{safe_name(name)}.{PROFILE_EXTENSIONS[self.mode]}")
+
+    @contextmanager
+    def profile(self, message_id: str | None = None):
+        if not self.should_sample() or not self._profile_lock.acquire(blocking=False):
+            yield None
+            return
+        path = self.path(message_id)
+        try:
+            if self.mode == "cprofile":
+                with self._cprofile(path):
+                    yield path
+            else:
+                with self._tracemalloc(path):
+                    yield path
+        finally:
+            self._profile_lock.release()
+
+    @contextmanager
+    def _cprofile(self, path: str):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._save(path, profiler.dump_stats)
+
+    @contextmanager
+    def _tracemalloc(self, path: str):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if started:
+                tracemalloc.stop()
+            self._save(path, snapshot.dump, peak)
+
+    def _save(self, path: str, dump, peak_bytes: int | None = None) -> None:
+        # Runs after the message is committed; a full or read-only disk must not fail it.
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            dump(path)
+        except Exception as exc:
+            logger.warning(
+                "Worker profile could not be saved: %s",
+                exc,
+                extra={
+                    "event": "profile_error",
+                    "worker_id": self.worker_id,
+                    "profile_path": path,
+                },
+            )
+            return
+        logger.info(
+            "Worker profile saved",
+            extra={
+                "event": "profile_saved",
+                "worker_id": self.worker_id,
+                "profile_path": path,
+                "peak_bytes": peak_bytes,
+            },
+        )
@@ -0,0 +1,266 @@
+import logging
+import math
+import tempfile
+import time
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import DBAPIError
+
+from app.config import get_settings
+from app.db.dialects import ON_CONFLICT_INSERTS, dialect_name, on_conflict_insert
+from app.db.models import (
+    MeasurementRawDataCurrent,
+    MeasurementRawDataHistory,
+    MeasurementRawDataSnapshot,
+)
+from app.db.snapshots import SNAPSHOT_ENCODINGS, pack_snapshot
+from app.metrics import raw_rows_unchanged, raw_rows_written, raw_write_duration
+
+logger = logging.getLogger(__name__)
+
+CURRENT_KEY_COLUMNS = ("file_id", "item_id", "x_index", "y_index")
+CURRENT_UPDATE_COLUMNS = ("measurable", "x_0", "x_1", "y_0", "y_1", "value")
+HISTORY_COLUMNS = (
+    "file_id",
+    "item_id",
+    "measurable",
+    "x_index",
+    "y_index",
+    "x_0",
+    "x_1",
+    "y_0",
+    "y_1",
+    "value",
+)
+CHANGE_COLUMNS = ("x_0", "x_1", "y_0", "y_1", "value")
+# ER_NOT_ALLOWED_COMMAND, ER_CLIENT_LOCAL_FILES_DISABLED, CR_LOAD_DATA_LOCAL_INFILE_REJECTED
+LOAD_DATA_DISABLED_ERRORS = {1148, 3948, 2068}
+HISTORY_STORES = ("rows", "snapshot")
+
+_load_data_disabled = False
+
+
+def tsv_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def write_history_tsv(rows: list[dict], stream) -> None:
+    for row in rows:
+        stream.write("\t".join(tsv_value(row[column]) for column in HISTORY_COLUMNS))
+        stream.write("\n")
+
+
+class RawDataWriter:
+    def __init__(self, session, chunk_rows: int | None = None, settings=None) -> None:
+        settings = settings or get_settings()
+        self.session = session
+        self.chunk_rows = max(1, chunk_rows or settings.raw_write_chunk_rows)
+        self.load_data = settings.raw_history_load_data
+        self.load_data_min_rows = settings.raw_history_load_data_min_rows
+        self.load_data_dir = settings.raw_history_load_data_dir or None
+        self.history_store = settings.raw_history_store
+        self.snapshot_encoding = settings.raw_history_snapshot_encoding
+        self.change_only = settings.raw_change_only
+        self.change_tolerance = settings.raw_change_tolerance
+        self.dialect = dialect_name(session)
+        self.stats: dict[str, tuple[int, float]] = {}
+        if self.history_store not in HISTORY_STORES:
+            raise ValueError(f"Unsupported history store: {self.history_store}")
+        if self.history_store == "snapshot" and self.snapshot_encoding not in SNAPSHOT_ENCODINGS:
+            raise ValueError(f"Unsupported snapshot encoding: {self.snapshot_encoding}")
+
+    def _chunks(self, rows: list[dict]):
+        for start in range(0, len(rows), self.chunk_rows):
+            yield rows[start : start + self.chunk_rows]
+
+    def _record(self, table: str, row_count: int, started_at: float) -> None:
+        duration = time.perf_counter() - started_at
+        raw_rows_written.labels(table=table).inc(row_count)
+        raw_write_duration.labels(table=table).observe(duration)
+        self.stats[table] = (row_count, duration)
+        logger.debug(
+            "Raw rows written",
+            extra={
+                "event": "raw_write",
+                "table": table,
+                "inserted_count": row_count,
+                "rows_per_sec": round(row_count / duration) if duration > 0 else None,
+            },
+        )
+
+    def _load_history(self, rows: list[dict]) -> bool:
+        global _load_data_disabled
+        table = MeasurementRawDataHistory.__tablename__
+        stmt = text(
+            f"LOAD DATA LOCAL INFILE :path INTO TABLE {table} "
+            "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+            f"({', '.join(HISTORY_COLUMNS)})"
+        )
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".tsv", dir=self.load_data_dir, encoding="utf-8"
+        ) as handle:
+            write_history_tsv(rows, handle)
+            handle.flush()
+            try:
+                with self.session.begin_nested():
+                    self.session.execute(stmt, {"path": handle.name})
+            except DBAPIError as exc:
+                code = exc.orig.args[0] if exc.orig is not None and exc.orig.args else None
+                if code in LOAD_DATA_DISABLED_ERRORS:
+                    _load_data_disabled = True
+                logger.warning(
+                    "LOAD DATA LOCAL INFILE failed, falling back to INSERT",
+                    exc_info=True,
+                    extra={"event": "load_data_fallback", "table": table},
+                )
+                return False
+        return True
+
+    def use_load_data(self, row_count: int) -> bool:
+        return (
+            self.load_data
+            and not _load_data_disabled
+            and self.dialect == "mysql"
+            and row_count >= self.load_data_min_rows
+        )
+
+    def write_snapshot(self, rows: list[dict]) -> int:
+        started_at = time.perf_counter()
+        by_file: dict[int, list[dict]] = {}
+        for row in rows:
+            by_file.setdefault(row["file_id"], []).append(row)
+        self.session.execute(
+            insert(MeasurementRawDataSnapshot),
+            [
+                {
+                    "file_id": file_id,
+                    "point_count": len(file_rows),
+                    "encoding": self.snapshot_encoding,
+                    "payload": pack_snapshot(file_rows, self.snapshot_encoding),
+                }
+                for file_id, file_rows in by_file.items()
+            ],
+        )
+        self._record(MeasurementRawDataSnapshot.__tablename__, len(rows), started_at)
+        return len(rows)
+
+    def write_history(self, rows: list[dict]) -> int:
+        if self.history_store == "snapshot":
+            return self.write_snapshot(rows)
+        started_at = time.perf_counter()
+        if self.use_load_data(len(rows)) and self._load_history(rows):
+            self._record(MeasurementRawDataHistory.__tablename__, len(rows), started_at)
+            return len(rows)
+        stmt = insert(MeasurementRawDataHistory)
+        for chunk in self._chunks(rows):
+            self.session.execute(stmt, chunk)
+        self._record(MeasurementRawDataHistory.__tablename__, len(rows), started_at)
+        return len(rows)
+
+    def write_history_batches(self, batches: list[list[dict]]) -> int:
+        # Each batch is one ingest, so snapshots keep revisions apart; row history doesn't need to.
+        if self.history_store == "snapshot":
+            return sum(self.write_snapshot(rows) for rows in batches if rows)
+        return self.write_history([row for rows in batches for row in rows])
+
+    def write_current(self, rows: list[dict]) -> int:
+        started_at = time.perf_counter()
+        # One upsert statement may not touch a row twice on PostgreSQL, so repeated points in a
+        # payload collapse to the last one, which is what row-by-row writes would have kept.
+        rows = list({tuple(row[key] for key in CURRENT_KEY_COLUMNS): row for row in rows}.values())
+        if self.dialect == "mysql":
+            stmt = mysql_insert(MeasurementRawDataCurrent)
+            stmt = stmt.on_duplicate_key_update(
+                **{column: stmt.inserted[column] for column in CURRENT_UPDATE_COLUMNS},
+                updated_at=func.now(),
+            )
+            for chunk in self._chunks(rows):
+                self.session.execute(stmt, chunk)
+        elif self.dialect in ON_CONFLICT_INSERTS:
+            stmt = on_conflict_insert(self.session, MeasurementRawDataCurrent)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(CURRENT_KEY_COLUMNS),
+                set_={
+                    **{column: stmt.excluded[column] for column in CURRENT_UPDATE_COLUMNS},
+                    "updated_at": func.now(),
+                },
+            )
+            for chunk in self._chunks(rows):
+                self.session.execute(stmt, chunk)
+        else:
+            for row in rows:
+                existing = self.session.execute(
+                    select(MeasurementRawDataCurrent).filter_by(
+                        file_id=row["file_id"],
+                        item_id=row["item_id"],
+                        x_index=row["x_index"],
+                        y_index=row["y_index"],
+                    )
+                ).scalar_one_or_none()
+                if existing:
+                    for key, value in row.items():
+                        setattr(existing, key, value)
+                    existing.updated_at = func.now()
+                else:
+                    self.session.add(MeasurementRawDataCurrent(**row))
+            self.session.flush()
+        self._record(MeasurementRawDataCurrent.__tablename__, len(rows), started_at)
+        return len(rows)
+
+    def is_unchanged(self, row: dict, existing: dict) -> bool:
+        if bool(row["measurable"]) != bool(existing["measurable"]):
+            return False
+        return all(
+            math.isclose(row[column], existing[column], abs_tol=self.change_tolerance)
+            for column in CHANGE_COLUMNS
+        )
+
+    def current_values(self, file_id: int, rows: list[dict]) -> dict[tuple, dict]:
+        if not rows:
+            return {}
+        item_ids = [row["item_id"] for row in rows]
+        # A single primary-key range scan: (file_id, item_id) is the key prefix.
+        result = self.session.execute(
+            select(
+                MeasurementRawDataCurrent.item_id,
+                MeasurementRawDataCurrent.x_index,
+                MeasurementRawDataCurrent.y_index,
+                MeasurementRawDataCurrent.measurable,
+                *(getattr(MeasurementRawDataCurrent, column) for column in CHANGE_COLUMNS),
+            ).where(
+                MeasurementRawDataCurrent.file_id == file_id,
+                MeasurementRawDataCurrent.item_id.between(min(item_ids), max(item_ids)),
+            )
+        )
+        return {
+            (current["item_id"], current["x_index"], current["y_index"]): dict(current)
+            for current in result.mappings()
+        }
+
+    def changed_rows(
+        self, file_id: int, rows: list[dict], current: dict[tuple, dict] | None = None
+    ) -> list[dict]:
+        if current is None:
+            current = self.current_values(file_id, rows)
+        changed = []
+        for row in rows:
+            key = (row["item_id"], row["x_index"], row["y_index"])
+            existing = current.get(key)
+            if existing is None or not self.is_unchanged(row, existing):
+                changed.append(row)
+                current[key] = row
+        raw_rows_unchanged.inc(len(rows) - len(changed))
+        return changed
+
+    def rows_per_sec(self, table: str) -> float | None:
+        row_count, duration = self.stats.get(table, (0, 0.0))
+        if duration <= 0:
+            return None
+        return row_count / duration
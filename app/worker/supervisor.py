@@ -0,0 +1,272 @@
+import logging
+import math
+import multiprocessing
+import signal
+import threading
+import time
+from dataclasses import dataclass
+
+import pika
+from pika.exceptions import AMQPError
+
+from app.config import Settings, get_settings
+from app.queue.rabbitmq import build_connection_parameters
+
+logger = logging.getLogger(__name__)
+
+HEALTHY_UPTIME = 60.0
+
+
+class QueueDepthProbe:
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.connection = None
+        self.channel = None
+
+    def __call__(self) -> tuple[int, int] | None:
+        try:
+            if self.connection is None or not self.connection.is_open:
+                parameters = build_connection_parameters(
+                    self.settings, connection_attempts=1, socket_timeout=5
+                )
+                self.connection = pika.BlockingConnection(parameters)
+                self.channel = self.connection.channel()
+            result = self.channel.queue_declare(
+                queue=self.settings.rabbitmq_queue_name, passive=True
+            )
+            return result.method.message_count, result.method.consumer_count
+        except AMQPError:
+            logger.warning(
+                "Queue depth probe failed",
+                exc_info=True,
+                extra={"event": "queue_probe_error"},
+            )
+            self.close()
+            return None
+
+    def close(self) -> None:
+        if self.connection is not None and self.connection.is_open:
+            try:
+                self.connection.close()
+            except AMQPError:
+                pass
+        self.connection = None
+        self.channel = None
+
+
+class ScalingPolicy:
+    def __init__(self, settings: Settings, min_workers: int, max_workers: int) -> None:
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.scale_up_backlog = settings.worker_scale_up_backlog
+        self.scale_down_backlog = settings.worker_scale_down_backlog
+        self.scale_up_polls = max(1, settings.worker_scale_up_polls)
+        self.scale_down_polls = max(1, settings.worker_scale_down_polls)
+        self.cooldown = settings.worker_scale_cooldown
+        self._up = 0
+        self._down = 0
+        self._changed_at: float | None = None
+
+    def decide(self, current: int, depth: int, now: float) -> int:
+        per_worker = depth / max(current, 1)
+        if per_worker > self.scale_up_backlog and current < self.max_workers:
+            self._up += 1
+            self._down = 0
+        elif per_worker < self.scale_down_backlog and current > self.min_workers:
+            self._down += 1
+            self._up = 0
+        else:
+            self._up = self._down = 0
+
+        if current < self.min_workers:
+            return self.min_workers
+        if self._changed_at is not None and now - self._changed_at < self.cooldown:
+            return current
+        target = current
+        if self._up >= self.scale_up_polls:
+            wanted = math.ceil(depth / self.scale_up_backlog) if self.scale_up_backlog else 0
+            target = min(self.max_workers, max(current + 1, wanted))
+        elif self._down >= self.scale_down_polls:
+            target = current - 1
+        if target != current:
+            self._up = self._down = 0
+            self._changed_at = now
+        return target
+
+
+@dataclass
+class WorkerSlot:
+    worker_id: str
+    process: multiprocessing.Process | None = None
+    started_at: float = 0.0
+    failures: int = 0
+    restart_at: float | None = None
+    draining_since: float | None = None
+
+
+class WorkerSupervisor:
+    def __init__(
+        self,
+        target,
+        min_workers: int,
+        max_workers: int,
+        settings: Settings | None = None,
+        probe=None,
+        args: tuple = (),
+        process_factory=multiprocessing.Process,
+        on_exit=None,
+    ) -> None:
+        settings = settings or get_settings()
+        self.target = target
+        self.args = args
+        self.process_factory = process_factory
+        self.on_exit = on_exit
+        self.policy = ScalingPolicy(settings, min_workers, max_workers)
+        self.probe = probe or QueueDepthProbe(settings)
+        self.poll_interval = settings.worker_poll_interval
+        self.backoff_max = settings.worker_respawn_backoff_max
+        self.drain_timeout = settings.worker_drain_timeout
+        self.slots: dict[str, WorkerSlot] = {}
+        self.draining: list[WorkerSlot] = []
+        self.stopping = threading.Event()
+
+    @property
+    def active_count(self) -> int:
+        return len(self.slots)
+
+    def _next_worker_id(self) -> str:
+        index = 1
+        while f"worker-{index}" in self.slots:
+            index += 1
+        return f"worker-{index}"
+
+    def _start(self, slot: WorkerSlot, now: float) -> None:
+        slot.process = self.process_factory(
+            target=self.target, args=(slot.worker_id, *self.args), name=slot.worker_id
+        )
+        slot.process.start()
+        slot.started_at = now
+        slot.restart_at = None
+
+    def scale_to(self, target: int, now: float, depth: int | None = None) -> None:
+        current = self.active_count
+        if target > current:
+            for _ in range(target - current):
+                slot = WorkerSlot(self._next_worker_id())
+                self.slots[slot.worker_id] = slot
+                self._start(slot, now)
+        elif target < current:
+            for worker_id in sorted(self.slots, reverse=True)[: current - target]:
+                self._drain(self.slots.pop(worker_id), now)
+        else:
+            return
+        logger.info(
+            "Worker pool scaled",
+            extra={
+                "event": "worker_scale_up" if target > current else "worker_scale_down",
+                "worker_count": target,
+                "queue_depth": depth,
+            },
+        )
+
+    def _drain(self, slot: WorkerSlot, now: float) -> None:
+        slot.draining_since = now
+        if slot.process is not None and slot.process.is_alive():
+            slot.process.terminate()
+            self.draining.append(slot)
+
+    def _exited(self, process) -> None:
+        if self.on_exit is not None:
+            self.on_exit(process.pid)
+
+    def reap(self, now: float) -> None:
+        for slot in self.slots.values():
+            process = slot.process
+            if process is not None and not process.is_alive():
+                process.join(timeout=0)
+                self._exited(process)
+                if now - slot.started_at >= HEALTHY_UPTIME:
+                    slot.failures = 0
+                slot.failures += 1
+                delay = min(self.backoff_max, 2 ** (slot.failures - 1))
+                slot.process = None
+                slot.restart_at = now + delay
+                logger.warning(
+                    "Worker process exited",
+                    extra={
+                        "event": "worker_exited",
+                        "worker_id": slot.worker_id,
+                        "exit_code": process.exitcode,
+                        "restart_delay": delay,
+                    },
+                )
+            if slot.process is None and slot.restart_at is not None and now >= slot.restart_at:
+                self._start(slot, now)
+                logger.info(
+                    "Worker process respawned",
+                    extra={"event": "worker_respawn", "worker_id": slot.worker_id},
+                )
+
+        for slot in list(self.draining):
+            process = slot.process
+            if not process.is_alive():
+                process.join(timeout=0)
+                self._exited(process)
+                self.draining.remove(slot)
+                logger.info(
+                    "Worker process drained",
+                    extra={
+                        "event": "worker_drained",
+                        "worker_id": slot.worker_id,
+                        "exit_code": process.exitcode,
+                    },
+                )
+            elif now - slot.draining_since > self.drain_timeout:
+                process.kill()
+                logger.warning(
+                    "Worker process killed after drain timeout",
+                    extra={"event": "worker_killed", "worker_id": slot.worker_id},
+                )
+
+    def tick(self, now: float) -> None:
+        self.reap(now)
+        observed = self.probe()
+        if observed is None:
+            return
+        depth, consumers = observed
+        target = self.policy.decide(self.active_count, depth, now)
+        logger.debug(
+            "Queue depth observed",
+            extra={
+                "event": "queue_depth",
+                "queue_depth": depth,
+                "consumer_count": consumers,
+                "worker_count": self.active_count,
+            },
+        )
+        self.scale_to(target, now, depth)
+
+    def shutdown(self) -> None:
+        now = time.monotonic()
+        for worker_id in list(self.slots):
+            self._drain(self.slots.pop(worker_id), now)
+        while self.draining:
+            self.reap(time.monotonic())
+            time.sleep(0.2)
+
+    def run(self) -> None:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: self.stopping.set())
+        logger.info(
+            "Worker supervisor started",
+            extra={"event": "supervisor_start", "worker_count": self.policy.min_workers},
+        )
+        self.scale_to(self.policy.min_workers, time.monotonic())
+        try:
+            while not self.stopping.wait(self.poll_interval):
+                self.tick(time.monotonic())
+        finally:
+            logger.info("Worker supervisor stopping", extra={"event": "supervisor_stop"})
+            self.shutdown()
+            if isinstance(self.probe, QueueDepthProbe):
+                self.probe.close()
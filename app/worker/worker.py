@@ -1,21 +1,26 @@
-import json
+import functools
 import logging
 import os
+import queue
+import signal
+import threading
 import time
 from datetime import datetime
+from itertools import repeat
 
 import pika
-from sqlalchemy import func, insert, select, text
+from sqlalchemy import func, insert, select, text, tuple_, update
 from sqlalchemy.dialects.mysql import insert as mysql_insert
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
 
 from app.config import get_settings
+from app.db.dialects import ON_CONFLICT_INSERTS, dialect_name, on_conflict_insert
 from app.db.models import (
     LotWf,
     MeasurementFile,
+    MeasurementIngest,
+    MeasurementIngestChunk,
     MeasurementItem,
-    MeasurementRawDataCurrent,
-    MeasurementRawDataHistory,
     MeasurementRecipe,
     MetricType,
     ProductName,
@@ -24,12 +29,31 @@ from app.db.models import (
     SpasReference,
     SpasSite,
 )
-from app.db.session import SessionLocal
+from app.db.session import SESSION_TIME_ZONE, SessionLocal
 from app.logging_config import setup_logging
+from app.metrics import (
+    end_to_end_latency,
+    messages_processed,
+    pipeline_queue_depth,
+    pipeline_queue_wait,
+    pipeline_stage_duration,
+    start_metrics_server,
+    worker_batch_size,
+)
+from app.queue.codec import MessageDecodeError, decode_message
+from app.queue.rabbitmq import PUBLISHED_AT_HEADER, build_connection_parameters
+from app.queue.retry import RetryPolicy, RetryRouter, declare_retry_topology
+from app.worker.dimension_cache import dimension_key, get_dimension_cache
+from app.worker.profiling import MessageProfiler, collect_timings, stage_ms, timed_stage
+from app.worker.raw_writer import RawDataWriter
 
 setup_logging()
 logger = logging.getLogger(__name__)
-WORKER_ID = os.getenv("WORKER_ID")
+STOP_POLL_INTERVAL = 1.0
+DIMENSION_KEY_BATCH = 500
+PROCESSING_ERRORS = (SQLAlchemyError, KeyError, TypeError, ValueError)
+# Retrying these cannot succeed: the message itself is malformed or violates the schema.
+NON_RETRYABLE_ERRORS = (MessageDecodeError, KeyError, TypeError, ValueError, DataError)
 
 
 def get_or_create(session, model, defaults=None, **filters):
@@ -53,7 +77,8 @@ def get_or_create(session, model, defaults=None, **filters):
 
 
 def upsert_and_get_id(session, model, values: dict, update_fields: dict, lookup_filters: dict):
-    if session.bind.dialect.name == "mysql":
+    dialect = dialect_name(session)
+    if dialect == "mysql":
         stmt = mysql_insert(model).values(**values)
         if update_fields:
             stmt = stmt.on_duplicate_key_update(**update_fields)
@@ -62,6 +87,21 @@ def upsert_and_get_id(session, model, values: dict, update_fields: dict, lookup_
         session.execute(stmt)
         return session.execute(select(model).filter_by(**lookup_filters)).scalar_one()
 
+    if dialect in ON_CONFLICT_INSERTS:
+        stmt = on_conflict_insert(session, model).values(**values)
+        if update_fields:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(lookup_filters), set_=update_fields
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(lookup_filters))
+        instance = session.scalars(
+            stmt.returning(model), execution_options={"populate_existing": True}
+        ).one_or_none()
+        if instance is None:
+            instance = session.execute(select(model).filter_by(**lookup_filters)).scalar_one()
+        return instance
+
     instance = session.execute(select(model).filter_by(**lookup_filters)).scalar_one_or_none()
     if instance:
         for key, value in update_fields.items():
@@ -73,36 +113,299 @@ def upsert_and_get_id(session, model, values: dict, update_fields: dict, lookup_
     return instance
 
 
-def process_message(session, payload: dict) -> dict:
-    product = upsert_and_get_id(
+def resolve_dimension_id(
+    session, model, values: dict, update_fields: dict, lookup_filters: dict
+) -> int:
+    cache = get_dimension_cache()
+    key = dimension_key(model, lookup_filters, update_fields)
+    dimension_id = cache.get(key, session)
+    if dimension_id is None:
+        dimension_id = upsert_and_get_id(session, model, values, update_fields, lookup_filters).id
+        cache.stage(session, key, dimension_id)
+    return dimension_id
+
+
+def key_condition(columns: list, keys: list[tuple]):
+    if len(columns) == 1:
+        return columns[0].in_([key[0] for key in keys])
+    return tuple_(*columns).in_(keys)
+
+
+def match_key(key: tuple) -> tuple:
+    return tuple(value.rstrip(" ").casefold() if isinstance(value, str) else value for value in key)
+
+
+def select_dimension_ids(session, model, key_columns: tuple, keys: list[tuple]) -> dict:
+    columns = [getattr(model, column) for column in key_columns]
+    found = {}
+    for start in range(0, len(keys), DIMENSION_KEY_BATCH):
+        condition = key_condition(columns, keys[start : start + DIMENSION_KEY_BATCH])
+        for row in session.execute(select(*columns, model.id).where(condition)):
+            found[tuple(row[:-1])] = row[-1]
+    return found
+
+
+def bulk_upsert(session, model, rows: list[dict], key_columns: tuple, update_columns: tuple):
+    dialect = dialect_name(session)
+    if dialect == "mysql":
+        for start in range(0, len(rows), DIMENSION_KEY_BATCH):
+            stmt = mysql_insert(model).values(rows[start : start + DIMENSION_KEY_BATCH])
+            stmt = stmt.on_duplicate_key_update(
+                **{column: stmt.inserted[column] for column in update_columns}
+            )
+            session.execute(stmt)
+        return
+
+    if dialect in ON_CONFLICT_INSERTS:
+        for start in range(0, len(rows), DIMENSION_KEY_BATCH):
+            stmt = on_conflict_insert(session, model).values(
+                rows[start : start + DIMENSION_KEY_BATCH]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={column: stmt.excluded[column] for column in update_columns},
+            )
+            session.execute(stmt)
+        return
+
+    keys = [tuple(row[column] for column in key_columns) for row in rows]
+    columns = [getattr(model, column) for column in key_columns]
+    existing = {}
+    for start in range(0, len(keys), DIMENSION_KEY_BATCH):
+        condition = key_condition(columns, keys[start : start + DIMENSION_KEY_BATCH])
+        for instance in session.execute(select(model).where(condition)).scalars():
+            existing[tuple(getattr(instance, column) for column in key_columns)] = instance
+    missing = []
+    for key, row in zip(keys, rows):
+        instance = existing.get(key)
+        if instance is None:
+            missing.append(row)
+            continue
+        for column in update_columns:
+            setattr(instance, column, row[column])
+    if missing:
+        session.execute(insert(model), missing)
+    session.flush()
+
+
+def resolve_dimension_ids(
+    session, model, rows: list[dict], key_columns: tuple, update_columns: tuple
+) -> dict:
+    cache = get_dimension_cache()
+    ids = {}
+    missing = {}
+    for row in rows:
+        key = tuple(row[column] for column in key_columns)
+        cache_key = dimension_key(
+            model,
+            dict(zip(key_columns, key)),
+            {column: row[column] for column in update_columns},
+        )
+        dimension_id = cache.get(cache_key, session)
+        if dimension_id is None:
+            missing[key] = (row, cache_key)
+        else:
+            ids[key] = dimension_id
+    if not missing:
+        return ids
+
+    keys = sorted(missing)
+    bulk_upsert(session, model, [missing[key][0] for key in keys], key_columns, update_columns)
+    found = select_dimension_ids(session, model, key_columns, keys)
+    folded = None
+    for key in keys:
+        dimension_id = found.get(key)
+        if dimension_id is None and dialect_name(session) == "mysql":
+            # MySQL's default collations ignore case and trailing spaces, so the row an upsert
+            # landed on may not echo the incoming key byte for byte.
+            if folded is None:
+                folded = {match_key(row_key): row_id for row_key, row_id in found.items()}
+            dimension_id = folded.get(match_key(key))
+        if dimension_id is None:
+            dimension_id = session.execute(
+                select(model.id).filter_by(**dict(zip(key_columns, key)))
+            ).scalar_one()
+        ids[key] = dimension_id
+        cache.stage(session, missing[key][1], dimension_id)
+    return ids
+
+
+def item_spec(measurement: dict) -> tuple:
+    return (
+        measurement["metric_name"],
+        measurement.get("metric_unit"),
+        measurement["class_name"],
+        measurement["measure_item"],
+    )
+
+
+def resolve_items(session, specs) -> dict:
+    specs = list(dict.fromkeys(specs))
+    metric_units = {}
+    for metric_name, metric_unit, _, _ in specs:
+        # A measurement without a unit must not blank the unit another one reported.
+        if metric_unit is not None or metric_name not in metric_units:
+            metric_units[metric_name] = metric_unit
+    metric_ids = resolve_dimension_ids(
+        session,
+        MetricType,
+        [
+            {"name": metric_name, "unit": metric_unit, "is_active": True}
+            for metric_name, metric_unit in metric_units.items()
+        ],
+        key_columns=("name",),
+        update_columns=("unit", "is_active"),
+    )
+
+    item_rows = {}
+    for metric_name, _, class_name, measure_item in specs:
+        metric_type_id = metric_ids[(metric_name,)]
+        item_rows[(class_name, measure_item, metric_type_id)] = {
+            "class_name": class_name,
+            "measure_item": measure_item,
+            "metric_type_id": metric_type_id,
+            "is_active": True,
+        }
+    item_ids = resolve_dimension_ids(
+        session,
+        MeasurementItem,
+        list(item_rows.values()),
+        key_columns=("class_name", "measure_item", "metric_type_id"),
+        update_columns=("is_active",),
+    )
+    return {spec: item_ids[(spec[2], spec[3], metric_ids[(spec[0],)])] for spec in specs}
+
+
+def shape_point_rows(measurements: list[dict]) -> tuple[list[tuple], list[dict]]:
+    specs = []
+    rows = []
+    for measurement in measurements:
+        specs.append(item_spec(measurement))
+        rows.append(
+            {
+                "measurable": measurement.get("measurable", True),
+                "x_index": measurement["x_index"],
+                "y_index": measurement["y_index"],
+                "x_0": measurement["x_0"],
+                "x_1": measurement["x_1"],
+                "y_0": measurement["y_0"],
+                "y_1": measurement["y_1"],
+                "value": measurement["value"],
+            }
+        )
+    return specs, rows
+
+
+def shape_columnar_rows(columns: dict) -> tuple[list[tuple], list[dict]]:
+    item_specs = [item_spec(item) for item in columns["items"]]
+    item_code = columns["item_code"]
+    measurable = columns.get("measurable") or repeat(True, len(item_code))
+    specs = [item_specs[code] for code in item_code]
+    rows = [
+        {
+            "measurable": flag,
+            "x_index": x_index,
+            "y_index": y_index,
+            "x_0": x_0,
+            "x_1": x_1,
+            "y_0": y_0,
+            "y_1": y_1,
+            "value": value,
+        }
+        for flag, x_index, y_index, x_0, x_1, y_0, y_1, value in zip(
+            measurable,
+            columns["x_index"],
+            columns["y_index"],
+            columns["x_0"],
+            columns["x_1"],
+            columns["y_0"],
+            columns["y_1"],
+            columns["value"],
+        )
+    ]
+    return specs, rows
+
+
+def shape_rows(payload: dict) -> tuple[list[tuple], list[dict]]:
+    columns = payload.get("columns")
+    if columns is not None:
+        return shape_columnar_rows(columns)
+    return shape_point_rows(payload.get("measurements") or [])
+
+
+def attach_ids(specs: list[tuple], rows: list[dict], file_id: int, item_ids: dict) -> list[dict]:
+    for spec, row in zip(specs, rows):
+        row["file_id"] = file_id
+        row["item_id"] = item_ids[spec]
+    return rows
+
+
+def build_point_rows(measurements: list[dict], file_id: int, item_ids: dict) -> list[dict]:
+    return attach_ids(*shape_point_rows(measurements), file_id, item_ids)
+
+
+def build_columnar_rows(columns: dict, file_id: int, item_ids: dict) -> list[dict]:
+    return attach_ids(*shape_columnar_rows(columns), file_id, item_ids)
+
+
+def resolve_measurement_file(session, payload: dict):
+    with timed_stage("resolve_dimensions"):
+        product_id, site_id, node_id, module_id, recipe_id, reference_id, lot_wf_id = (
+            resolve_file_dimensions(session, payload)
+        )
+    with timed_stage("upsert_file"):
+        return upsert_and_get_id(
+            session,
+            MeasurementFile,
+            values={
+                "file_path": payload["file_path"],
+                "recipe_id": recipe_id,
+                "file_name": payload["file_name"],
+                "reference_id": reference_id,
+                "lot_wf_id": lot_wf_id,
+            },
+            update_fields={
+                "file_name": payload["file_name"],
+                "reference_id": reference_id,
+                "lot_wf_id": lot_wf_id,
+            },
+            lookup_filters={
+                "file_path": payload["file_path"],
+                "recipe_id": recipe_id,
+            },
+        )
+
+
+def resolve_file_dimensions(session, payload: dict) -> tuple:
+    product_id = resolve_dimension_id(
         session,
         ProductName,
         values={"name": payload["product_name"], "is_active": True},
         update_fields={"is_active": True},
         lookup_filters={"name": payload["product_name"]},
     )
-    site = upsert_and_get_id(
+    site_id = resolve_dimension_id(
         session,
         SpasSite,
         values={"name": payload["site_name"], "is_active": True},
         update_fields={"is_active": True},
         lookup_filters={"name": payload["site_name"]},
     )
-    node = upsert_and_get_id(
+    node_id = resolve_dimension_id(
         session,
         SpasNode,
         values={"name": payload["node_name"], "is_active": True},
         update_fields={"is_active": True},
         lookup_filters={"name": payload["node_name"]},
     )
-    module = upsert_and_get_id(
+    module_id = resolve_dimension_id(
         session,
         SpasModule,
         values={"name": payload["module_name"], "is_active": True},
         update_fields={"is_active": True},
         lookup_filters={"name": payload["module_name"]},
     )
-    recipe = upsert_and_get_id(
+    recipe_id = resolve_dimension_id(
         session,
         MeasurementRecipe,
         values={
@@ -116,167 +419,613 @@ def process_message(session, payload: dict) -> dict:
         },
     )
 
-    reference = upsert_and_get_id(
+    reference_id = resolve_dimension_id(
         session,
         SpasReference,
         values={
-            "product_id": product.id,
-            "site_id": site.id,
-            "node_id": node.id,
-            "module_id": module.id,
+            "product_id": product_id,
+            "site_id": site_id,
+            "node_id": node_id,
+            "module_id": module_id,
         },
         update_fields={},
         lookup_filters={
-            "product_id": product.id,
-            "site_id": site.id,
-            "node_id": node.id,
-            "module_id": module.id,
+            "product_id": product_id,
+            "site_id": site_id,
+            "node_id": node_id,
+            "module_id": module_id,
         },
     )
 
     lot_name = payload.get("lot_name")
     wf_number = payload.get("wf_number")
-    lot_wf = None
+    lot_wf_id = None
     if lot_name is not None and wf_number is not None:
-        lot_wf = upsert_and_get_id(
+        lot_wf_id = resolve_dimension_id(
             session,
             LotWf,
             values={"lot_name": lot_name, "wf_number": wf_number},
             update_fields={},
             lookup_filters={"lot_name": lot_name, "wf_number": wf_number},
         )
+    return product_id, site_id, node_id, module_id, recipe_id, reference_id, lot_wf_id
 
-    desired_lot_wf_id = lot_wf.id if lot_wf else None
-    measurement_file = upsert_and_get_id(
-        session,
-        MeasurementFile,
-        values={
-            "file_path": payload["file_path"],
-            "recipe_id": recipe.id,
-            "file_name": payload["file_name"],
-            "reference_id": reference.id,
-            "lot_wf_id": desired_lot_wf_id,
-        },
-        update_fields={
-            "file_name": payload["file_name"],
-            "reference_id": reference.id,
-            "lot_wf_id": desired_lot_wf_id,
-        },
-        lookup_filters={
-            "file_path": payload["file_path"],
-            "recipe_id": recipe.id,
-        },
-    )
 
-    measurements = payload.get("measurements", [])
-    inserted = 0
-    metric_type_cache = {}
-    measurement_item_cache = {}
-    current_rows = []
-    history_rows = []
-    for measurement in measurements:
-        metric_name = measurement["metric_name"]
-        metric_unit = measurement.get("metric_unit")
-        metric_type = metric_type_cache.get(metric_name)
-        if metric_type is None or (
-            metric_unit is not None and getattr(metric_type, "unit", None) != metric_unit
-        ):
-            metric_type = upsert_and_get_id(
-                session,
-                MetricType,
-                values={"name": metric_name, "unit": metric_unit, "is_active": True},
-                update_fields={"unit": metric_unit, "is_active": True},
-                lookup_filters={"name": metric_name},
-            )
-            metric_type_cache[metric_name] = metric_type
+def session_local(value: datetime) -> datetime:
+    # PostgreSQL's now() is timestamptz while DateTime columns read back naive in the session
+    # time zone, and drivers differ in which offset they attach to the former.
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(SESSION_TIME_ZONE).replace(tzinfo=None)
+
 
-        item_key = (measurement["class_name"], measurement["measure_item"], metric_type.id)
-        measurement_item = measurement_item_cache.get(item_key)
-        if measurement_item is None:
-            measurement_item = upsert_and_get_id(
+def is_duplicate_ingest(session, payload: dict, digest: str, window_seconds: float) -> bool:
+    if window_seconds <= 0:
+        return False
+    row = session.execute(
+        select(MeasurementFile.content_digest, MeasurementFile.updated_at, func.now())
+        .join(MeasurementRecipe, MeasurementRecipe.id == MeasurementFile.recipe_id)
+        .where(
+            MeasurementFile.file_path == payload["file_path"],
+            MeasurementRecipe.name == payload["recipe_name"],
+            MeasurementRecipe.version == payload["recipe_version"],
+        )
+    ).first()
+    if row is None or row[0] != digest:
+        return False
+    elapsed = session_local(row[2]) - session_local(row[1])
+    return elapsed.total_seconds() <= window_seconds
+
+
+def process_message(
+    session,
+    payload: dict,
+    measurement_file=None,
+    digest: str | None = None,
+    shaped: tuple[list[tuple], list[dict]] | None = None,
+) -> dict:
+    with collect_timings() as timings:
+        if measurement_file is None:
+            measurement_file = resolve_measurement_file(session, payload)
+
+        with timed_stage("shape"):
+            specs, current_rows = shaped or shape_rows(payload)
+        with timed_stage("resolve_items"):
+            item_ids = resolve_items(session, specs)
+            attach_ids(specs, current_rows, measurement_file.id, item_ids)
+        writer = RawDataWriter(session)
+        changed_rows = current_rows
+        if writer.change_only:
+            with timed_stage("change_detect"):
+                changed_rows = writer.changed_rows(measurement_file.id, current_rows)
+
+        measurement_file.updated_at = func.now()
+        if digest is not None:
+            measurement_file.content_digest = digest
+        if changed_rows:
+            with timed_stage("write_history"):
+                writer.write_history(changed_rows)
+            with timed_stage("write_current"):
+                writer.write_current(changed_rows)
+
+    result = {
+        "file_path": payload.get("file_path"),
+        "file_id": measurement_file.id,
+        "measurement_count": len(current_rows),
+        "inserted_count": len(changed_rows),
+        "stage_ms": stage_ms(timings),
+    }
+    if writer.change_only:
+        result["changed_count"] = len(changed_rows)
+        result["unchanged_count"] = len(current_rows) - len(changed_rows)
+    return result
+
+
+def process_chunk(
+    session,
+    message_id: str,
+    chunk: dict,
+    payload: dict,
+    digest: str | None = None,
+    shaped: tuple[list[tuple], list[dict]] | None = None,
+) -> dict:
+    chunk_index = chunk["index"]
+    if session.get(MeasurementIngestChunk, (message_id, chunk_index)) is not None:
+        return {
+            "file_path": payload.get("file_path"),
+            "measurement_count": 0,
+            "inserted_count": 0,
+            "duplicate": True,
+        }
+
+    ingest = session.get(MeasurementIngest, message_id)
+    measurement_file = session.get(MeasurementFile, ingest.file_id) if ingest else None
+    result = process_message(session, payload, measurement_file=measurement_file, shaped=shaped)
+
+    with timed_stage("track_chunk"):
+        if ingest is None:
+            upsert_and_get_id(
                 session,
-                MeasurementItem,
+                MeasurementIngest,
                 values={
-                    "class_name": measurement["class_name"],
-                    "measure_item": measurement["measure_item"],
-                    "metric_type_id": metric_type.id,
-                    "is_active": True,
-                },
-                update_fields={"is_active": True},
-                lookup_filters={
-                    "class_name": measurement["class_name"],
-                    "measure_item": measurement["measure_item"],
-                    "metric_type_id": metric_type.id,
+                    "message_id": message_id,
+                    "file_id": result["file_id"],
+                    "chunk_count": chunk["count"],
                 },
+                update_fields={},
+                lookup_filters={"message_id": message_id},
             )
-            measurement_item_cache[item_key] = measurement_item
+        ingest = session.execute(
+            select(MeasurementIngest).filter_by(message_id=message_id).with_for_update()
+        ).scalar_one()
+        session.add(
+            MeasurementIngestChunk(
+                message_id=message_id,
+                chunk_index=chunk_index,
+                row_count=result["measurement_count"],
+            )
+        )
+        session.flush()
+        received = session.execute(
+            select(func.count())
+            .select_from(MeasurementIngestChunk)
+            .filter_by(message_id=message_id)
+        ).scalar_one()
+        if received >= ingest.chunk_count:
+            ingest.completed_at = func.now()
+            if digest is not None:
+                session.execute(
+                    update(MeasurementFile)
+                    .where(MeasurementFile.id == ingest.file_id)
+                    .values(content_digest=digest)
+                )
+    result["chunk_index"] = chunk_index
+    result["chunk_count"] = ingest.chunk_count
+    return result
 
-        raw_values = {
+
+def handle_message(
+    session,
+    message: dict,
+    idempotency_window: float = 0,
+    shaped: tuple[list[tuple], list[dict]] | None = None,
+) -> dict:
+    payload = message.get("payload", {})
+    digest = message.get("digest")
+    with timed_stage("duplicate_check"):
+        duplicate = digest is not None and is_duplicate_ingest(
+            session, payload, digest, idempotency_window
+        )
+    if duplicate:
+        return {
+            "file_path": payload.get("file_path"),
+            "measurement_count": 0,
+            "inserted_count": 0,
+            "duplicate": True,
+        }
+    chunk = message.get("chunk")
+    if chunk is not None:
+        return process_chunk(session, message["id"], chunk, payload, digest, shaped)
+    return process_message(session, payload, digest=digest, shaped=shaped)
+
+
+def file_key(payload: dict) -> tuple:
+    return (
+        payload.get("file_path"),
+        payload.get("recipe_name"),
+        payload.get("recipe_version"),
+    )
+
+
+def coalesce_messages(session, messages: list[dict], idempotency_window: float = 0) -> list[dict]:
+    results = []
+    revisions = []
+    for message in messages:
+        payload = message.get("payload", {})
+        digest = message.get("digest")
+        if revisions:
+            duplicate = idempotency_window > 0 and digest is not None and digest == revisions[-1][1]
+        else:
+            duplicate = digest is not None and is_duplicate_ingest(
+                session, payload, digest, idempotency_window
+            )
+        if duplicate:
+            results.append(
+                {
+                    "file_path": payload.get("file_path"),
+                    "measurement_count": 0,
+                    "inserted_count": 0,
+                    "duplicate": True,
+                }
+            )
+            continue
+        revisions.append((payload, digest, shape_rows(payload)))
+        results.append(None)
+    if not revisions:
+        return results
+
+    measurement_file = resolve_measurement_file(session, revisions[-1][0])
+    with timed_stage("resolve_items"):
+        specs = [spec for _, _, (revision_specs, _) in revisions for spec in revision_specs]
+        item_ids = resolve_items(session, specs)
+        for _, _, (revision_specs, rows) in revisions:
+            attach_ids(revision_specs, rows, measurement_file.id, item_ids)
+
+    writer = RawDataWriter(session)
+    current = None
+    if writer.change_only:
+        current = writer.current_values(
+            measurement_file.id, [row for _, _, (_, rows) in revisions for row in rows]
+        )
+    history_batches = []
+    latest = {}
+    revision_results = []
+    for payload, digest, (_, rows) in revisions:
+        changed_rows = rows
+        if writer.change_only:
+            changed_rows = writer.changed_rows(measurement_file.id, rows, current)
+        history_batches.append(changed_rows)
+        for row in changed_rows:
+            latest[(row["item_id"], row["x_index"], row["y_index"])] = row
+        if digest is not None:
+            measurement_file.content_digest = digest
+        result = {
+            "file_path": payload.get("file_path"),
             "file_id": measurement_file.id,
-            "item_id": measurement_item.id,
-            "measurable": measurement.get("measurable", True),
-            "x_index": measurement["x_index"],
-            "y_index": measurement["y_index"],
-            "x_0": measurement["x_0"],
-            "x_1": measurement["x_1"],
-            "y_0": measurement["y_0"],
-            "y_1": measurement["y_1"],
-            "value": measurement["value"],
+            "measurement_count": len(rows),
+            "inserted_count": len(changed_rows),
+            "coalesced_count": len(revisions),
         }
-        current_rows.append(raw_values)
-        history_rows.append(raw_values)
-        inserted += 1
+        if writer.change_only:
+            result["changed_count"] = len(changed_rows)
+            result["unchanged_count"] = len(rows) - len(changed_rows)
+        revision_results.append(result)
 
     measurement_file.updated_at = func.now()
-    if history_rows:
-        if session.bind.dialect.name == "mysql":
-            session.execute(mysql_insert(MeasurementRawDataHistory).values(history_rows))
-            current_stmt = mysql_insert(MeasurementRawDataCurrent).values(current_rows)
-            current_stmt = current_stmt.on_duplicate_key_update(
-                measurable=current_stmt.inserted.measurable,
-                x_0=current_stmt.inserted.x_0,
-                x_1=current_stmt.inserted.x_1,
-                y_0=current_stmt.inserted.y_0,
-                y_1=current_stmt.inserted.y_1,
-                value=current_stmt.inserted.value,
-                updated_at=func.now(),
-            )
-            session.execute(current_stmt)
+    if latest:
+        with timed_stage("write_history"):
+            writer.write_history_batches(history_batches)
+        with timed_stage("write_current"):
+            writer.write_current(list(latest.values()))
+    pending = iter(revision_results)
+    return [result if result is not None else next(pending) for result in results]
+
+
+def handle_messages(session, messages: list[dict], idempotency_window: float = 0) -> list[dict]:
+    groups: dict[tuple, list[int]] = {}
+    for index, message in enumerate(messages):
+        groups.setdefault(file_key(message.get("payload", {})), []).append(index)
+    results: list[dict | None] = [None] * len(messages)
+    for indexes in groups.values():
+        group = [messages[index] for index in indexes]
+        # Chunks are parts of one file, not revisions, so only whole-file messages coalesce.
+        if len(group) > 1 and all(message.get("chunk") is None for message in group):
+            group_results = coalesce_messages(session, group, idempotency_window)
         else:
-            session.execute(insert(MeasurementRawDataHistory), history_rows)
-            for row in current_rows:
-                existing = session.execute(
-                    select(MeasurementRawDataCurrent).filter_by(
-                        file_id=row["file_id"],
-                        item_id=row["item_id"],
-                        x_index=row["x_index"],
-                        y_index=row["y_index"],
-                    )
-                ).scalar_one_or_none()
-                if existing:
-                    for key, value in row.items():
-                        setattr(existing, key, value)
-                    existing.updated_at = func.now()
+            group_results = [
+                handle_message(session, message, idempotency_window) for message in group
+            ]
+        for index, result in zip(indexes, group_results):
+            results[index] = result
+    return results
+
+
+def is_retryable(error: BaseException) -> bool:
+    # Errors outside PROCESSING_ERRORS are bugs rather than transient faults.
+    return isinstance(error, PROCESSING_ERRORS) and not isinstance(error, NON_RETRYABLE_ERRORS)
+
+
+def current_worker_id() -> str:
+    return os.getenv("WORKER_ID") or f"pid:{os.getpid()}"
+
+
+def prepare_message(
+    body: bytes, content_type: str | None, content_encoding: str | None
+) -> tuple[dict, tuple[list[tuple], list[dict]]]:
+    message = decode_message(body, content_type, content_encoding)
+    return message, shape_rows(message.get("payload", {}))
+
+
+def published_at(headers: dict | None) -> float | None:
+    value = (headers or {}).get(PUBLISHED_AT_HEADER)
+    return int(value) / 1000 if value is not None else None
+
+
+def log_processed(
+    message: dict,
+    result: dict,
+    duration_ms: int,
+    batch_size: int,
+    worker_id: str,
+    headers: dict | None = None,
+) -> None:
+    status = "duplicate" if result.get("duplicate") else "processed"
+    messages_processed.labels(status=status).inc()
+    latency_ms = None
+    sent_at = published_at(headers)
+    if sent_at is not None:
+        # Clamped because the API and worker hosts' clocks can disagree slightly.
+        latency = max(0.0, time.time() - sent_at)
+        end_to_end_latency.observe(latency)
+        latency_ms = int(latency * 1000)
+    logger.info(
+        "Worker processed message",
+        extra={
+            "event": "duplicate_skipped" if result.get("duplicate") else "processed",
+            "measurement_count": result["measurement_count"],
+            "inserted_count": result["inserted_count"],
+            "changed_count": result.get("changed_count"),
+            "coalesced_count": result.get("coalesced_count"),
+            "unchanged_count": result.get("unchanged_count"),
+            "duration_ms": duration_ms,
+            "latency_ms": latency_ms,
+            "stage_ms": result.get("stage_ms"),
+            "chunk_index": result.get("chunk_index"),
+            "batch_size": batch_size,
+            "message_id": message.get("id"),
+            "worker_id": worker_id,
+        },
+    )
+
+
+class BatchConsumer:
+    def __init__(self, connection, channel, settings, session_factory=SessionLocal) -> None:
+        self.connection = connection
+        self.channel = channel
+        self.session_factory = session_factory
+        self.batch_size = max(1, settings.worker_batch_size)
+        self.batch_timeout = settings.worker_batch_timeout_ms / 1000
+        self.idempotency_window = settings.idempotency_window_seconds
+        self.coalesce = settings.worker_coalesce_files
+        self.worker_id = current_worker_id()
+        self.retry = RetryRouter(channel, RetryPolicy.from_settings(settings))
+        self.profiler = MessageProfiler.from_settings(settings, self.worker_id)
+        self.pending: list[tuple[int, dict, pika.BasicProperties, bytes]] = []
+        self._timer = None
+
+    def on_message(self, ch, method, properties, body) -> None:
+        try:
+            message = decode_message(body, properties.content_type, properties.content_encoding)
+        except MessageDecodeError as exc:
+            logger.exception(
+                "Failed to process message: %s",
+                exc,
+                extra={"event": "error"},
+            )
+            self.retry.reject(method.delivery_tag, properties, body, exc, retryable=False)
+            return
+        logger.info(
+            "Worker received message",
+            extra={
+                "event": "received",
+                "message_id": message.get("id"),
+                "worker_id": self.worker_id,
+            },
+        )
+        self.pending.append((method.delivery_tag, message, properties, body))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.connection.call_later(self.batch_timeout, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self.flush()
+
+    def process_single(
+        self, delivery_tag: int, message: dict, properties: pika.BasicProperties, body: bytes
+    ) -> None:
+        session = self.session_factory()
+        try:
+            started_at = time.perf_counter()
+            with self.profiler.profile(message.get("id")), collect_timings() as timings:
+                result = handle_message(session, message, self.idempotency_window)
+                with timed_stage("commit"):
+                    session.commit()
+            result["stage_ms"] = stage_ms(timings)
+            duration_ms = int((time.perf_counter() - started_at) * 1000)
+            headers = getattr(properties, "headers", None)
+            log_processed(message, result, duration_ms, 1, self.worker_id, headers)
+            self.channel.basic_ack(delivery_tag=delivery_tag)
+        except Exception as exc:
+            session.rollback()
+            logger.exception(
+                "Failed to process message: %s",
+                exc,
+                extra={"event": "error", "message_id": message.get("id")},
+            )
+            self.retry.reject(delivery_tag, properties, body, exc, is_retryable(exc))
+        finally:
+            session.close()
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self.connection.remove_timeout(self._timer)
+            self._timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        worker_batch_size.observe(len(batch))
+        if len(batch) == 1:
+            self.process_single(*batch[0])
+            return
+
+        session = self.session_factory()
+        started_at = time.perf_counter()
+        try:
+            messages = [message for _, message, _, _ in batch]
+            with self.profiler.profile(), collect_timings() as timings:
+                if self.coalesce:
+                    results = handle_messages(session, messages, self.idempotency_window)
                 else:
-                    session.add(MeasurementRawDataCurrent(**row))
+                    results = [
+                        handle_message(session, message, self.idempotency_window)
+                        for message in messages
+                    ]
+                with timed_stage("commit"):
+                    session.commit()
+        except Exception:
+            session.rollback()
+            session.close()
+            logger.warning(
+                "Batch failed, retrying messages one by one",
+                exc_info=True,
+                extra={"event": "batch_fallback", "batch_size": len(batch)},
+            )
+            for delivery in batch:
+                self.process_single(*delivery)
+            return
+        session.close()
+        duration_ms = int((time.perf_counter() - started_at) * 1000)
+        batch_stage_ms = stage_ms(timings)
+        for (_, message, properties, _), result in zip(batch, results):
+            result["stage_ms"] = batch_stage_ms
+            headers = getattr(properties, "headers", None)
+            log_processed(message, result, duration_ms, len(batch), self.worker_id, headers)
+        self.channel.basic_ack(delivery_tag=batch[-1][0], multiple=True)
 
-    return {
-        "file_path": payload.get("file_path"),
-        "measurement_count": len(measurements),
-        "inserted_count": inserted,
-    }
+    def stop(self) -> None:
+        self.flush()
+
+
+class PipelineConsumer:
+    def __init__(
+        self, connection, channel, settings, prefetch_count: int, session_factory=SessionLocal
+    ) -> None:
+        self.connection = connection
+        self.channel = channel
+        self.session_factory = session_factory
+        self.idempotency_window = settings.idempotency_window_seconds
+        self.worker_id = current_worker_id()
+        self.retry = RetryRouter(channel, RetryPolicy.from_settings(settings))
+        self.profiler = MessageProfiler.from_settings(settings, self.worker_id)
+        # Sized to the prefetch window so the connection thread never blocks on put().
+        self.decode_queue: queue.Queue = queue.Queue(maxsize=prefetch_count)
+        self.write_queue: queue.Queue = queue.Queue(maxsize=prefetch_count)
+        self.decoders = [
+            threading.Thread(target=self._decode_loop, name=f"decode-{n}", daemon=True)
+            for n in range(max(1, settings.worker_decode_threads))
+        ]
+        self.writers = [
+            threading.Thread(target=self._write_loop, name=f"db-writer-{n}", daemon=True)
+            for n in range(max(1, settings.worker_db_writers))
+        ]
+        for thread in self.decoders + self.writers:
+            thread.start()
+
+    def _update_depth(self) -> None:
+        pipeline_queue_depth.labels(stage="decode").set(self.decode_queue.qsize())
+        pipeline_queue_depth.labels(stage="write").set(self.write_queue.qsize())
+
+    def _ack(self, delivery_tag: int) -> None:
+        self.connection.add_callback_threadsafe(
+            functools.partial(self.channel.basic_ack, delivery_tag=delivery_tag)
+        )
+
+    def _reject(
+        self, delivery_tag: int, properties, body: bytes, error: BaseException, retryable: bool
+    ) -> None:
+        self.connection.add_callback_threadsafe(
+            functools.partial(self.retry.reject, delivery_tag, properties, body, error, retryable)
+        )
+
+    def on_message(self, ch, method, properties, body) -> None:
+        self.decode_queue.put((method.delivery_tag, properties, body, time.perf_counter()))
+        self._update_depth()
+
+    def _decode_loop(self) -> None:
+        while True:
+            item = self.decode_queue.get()
+            if item is None:
+                return
+            delivery_tag, properties, body, enqueued_at = item
+            started_at = time.perf_counter()
+            pipeline_queue_wait.labels(stage="decode").observe(started_at - enqueued_at)
+            try:
+                message, shaped = prepare_message(
+                    body, properties.content_type, properties.content_encoding
+                )
+            except Exception as exc:
+                # Decoding is deterministic, so a retry cannot fix any failure here; an uncaught
+                # error would also kill this thread and strand the message unacked.
+                logger.exception(
+                    "Failed to process message: %s",
+                    exc,
+                    extra={"event": "error"},
+                )
+                self._reject(delivery_tag, properties, body, exc, False)
+                continue
+            finally:
+                pipeline_stage_duration.labels(stage="decode").observe(
+                    time.perf_counter() - started_at
+                )
+            logger.info(
+                "Worker received message",
+                extra={
+                    "event": "received",
+                    "message_id": message.get("id"),
+                    "worker_id": self.worker_id,
+                },
+            )
+            self.write_queue.put(
+                (delivery_tag, properties, body, message, shaped, time.perf_counter())
+            )
+            self._update_depth()
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                return
+            delivery_tag, properties, body, message, shaped, enqueued_at = item
+            started_at = time.perf_counter()
+            pipeline_queue_wait.labels(stage="write").observe(started_at - enqueued_at)
+            self._update_depth()
+            session = self.session_factory()
+            try:
+                with self.profiler.profile(message.get("id")), collect_timings() as timings:
+                    result = handle_message(session, message, self.idempotency_window, shaped)
+                    with timed_stage("commit"):
+                        session.commit()
+                result["stage_ms"] = stage_ms(timings)
+            except Exception as exc:
+                session.rollback()
+                logger.exception(
+                    "Failed to process message: %s",
+                    exc,
+                    extra={"event": "error", "message_id": message.get("id")},
+                )
+                self._reject(delivery_tag, properties, body, exc, is_retryable(exc))
+                continue
+            finally:
+                session.close()
+                pipeline_stage_duration.labels(stage="write").observe(
+                    time.perf_counter() - started_at
+                )
+            duration_ms = int((time.perf_counter() - started_at) * 1000)
+            headers = getattr(properties, "headers", None)
+            log_processed(message, result, duration_ms, 1, self.worker_id, headers)
+            self._ack(delivery_tag)
+
+    def stop(self) -> None:
+        for _ in self.decoders:
+            self.decode_queue.put(None)
+        for thread in self.decoders:
+            thread.join()
+        for _ in self.writers:
+            self.write_queue.put(None)
+        for thread in self.writers:
+            thread.join()
+        self.connection.process_data_events(time_limit=0)
 
 
 def main() -> None:
     settings = get_settings()
-    credentials = pika.PlainCredentials(settings.rabbitmq_user, settings.rabbitmq_password)
-    parameters = pika.ConnectionParameters(
-        host=settings.rabbitmq_host,
-        port=settings.rabbitmq_port,
-        credentials=credentials,
-    )
+    parameters = build_connection_parameters(settings)
 
     logger.info("Worker starting", extra={"event": "worker_start"})
+    if settings.worker_metrics_port:
+        start_metrics_server(settings.worker_metrics_port)
 
     try:
         connection = pika.BlockingConnection(parameters)
@@ -287,66 +1036,57 @@ def main() -> None:
 
     channel = connection.channel()
     channel.queue_declare(queue=settings.rabbitmq_queue_name, durable=True)
-    channel.basic_qos(prefetch_count=1)
+    declare_retry_topology(channel, RetryPolicy.from_settings(settings))
+    if settings.worker_mode == "pipeline":
+        prefetch_count = max(
+            settings.worker_prefetch_count,
+            settings.worker_decode_threads + settings.worker_db_writers,
+        )
+    else:
+        prefetch_count = max(settings.worker_prefetch_count, settings.worker_batch_size)
+    channel.basic_qos(prefetch_count=prefetch_count)
 
     try:
         session = SessionLocal()
         session.execute(text("SELECT 1"))
-        session.close()
         logger.info("DB connected", extra={"event": "db_connected"})
+        if settings.dimension_cache_warm:
+            cached_count = get_dimension_cache(settings).warm(session)
+            logger.info(
+                "Dimension cache warmed",
+                extra={"event": "dimension_cache_warmed", "cached_count": cached_count},
+            )
+        session.close()
     except Exception as exc:
         logger.exception("DB connection failed: %s", exc, extra={"event": "db_error"})
         connection.close()
         raise
 
-    def callback(ch, method, properties, body):
-        session = SessionLocal()
-        try:
-            message = json.loads(body)
-            payload = message.get("payload", {})
-            worker_id = WORKER_ID or f"pid:{os.getpid()}"
-            logger.info(
-                "Worker received message",
-                extra={
-                    "event": "received",
-                    "message_id": message.get("id"),
-                    "worker_id": worker_id,
-                },
-            )
-            started_at = time.perf_counter()
-            result = process_message(session, payload)
-            session.commit()
-            duration_ms = int((time.perf_counter() - started_at) * 1000)
-            logger.info(
-                "Worker processed message",
-                extra={
-                    "event": "processed",
-                    "measurement_count": result["measurement_count"],
-                    "inserted_count": result["inserted_count"],
-                    "duration_ms": duration_ms,
-                    "message_id": message.get("id"),
-                    "worker_id": worker_id,
-                },
-            )
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-        except (json.JSONDecodeError, SQLAlchemyError, KeyError) as exc:
-            session.rollback()
-            logger.exception(
-                "Failed to process message: %s",
-                exc,
-                extra={"event": "error"},
-            )
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-        finally:
-            session.close()
+    if settings.worker_mode == "pipeline":
+        consumer = PipelineConsumer(connection, channel, settings, prefetch_count)
+    else:
+        consumer = BatchConsumer(connection, channel, settings)
+    channel.basic_consume(
+        queue=settings.rabbitmq_queue_name, on_message_callback=consumer.on_message
+    )
+    stop_requested = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.set())
 
-    channel.basic_consume(queue=settings.rabbitmq_queue_name, on_message_callback=callback)
+    def check_stop() -> None:
+        if stop_requested.is_set():
+            channel.stop_consuming()
+        else:
+            connection.call_later(STOP_POLL_INTERVAL, check_stop)
+
+    connection.call_later(STOP_POLL_INTERVAL, check_stop)
     logger.info("Worker started. Waiting for messages...")
     try:
         channel.start_consuming()
     except KeyboardInterrupt:
-        logger.info("Worker stopping...")
         channel.stop_consuming()
+    logger.info("Worker stopping...", extra={"event": "worker_stop"})
+    try:
+        consumer.stop()
     finally:
         connection.close()
 
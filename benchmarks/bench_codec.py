@@ -0,0 +1,129 @@
+import argparse
+import random
+import time
+
+from app.queue.codec import (
+    JSON_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPE,
+    MessageCodec,
+    decode_message,
+    msgpack,
+    zstandard,
+)
+
+ITEM_COUNT = 20
+
+
+def build_payload(size: int, columnar: bool) -> dict:
+    rng = random.Random(size)
+    items = [
+        {
+            "metric_name": "THK",
+            "metric_unit": "nm",
+            "class_name": f"CLASS_{n % 4}",
+            "measure_item": f"ITEM_{n}",
+        }
+        for n in range(ITEM_COUNT)
+    ]
+    codes = [n % ITEM_COUNT for n in range(size)]
+    x_index = [n % 300 for n in range(size)]
+    y_index = [n // 300 for n in range(size)]
+    values = [rng.uniform(0, 100) for _ in range(size)]
+    common = {
+        "product_name": "P1",
+        "site_name": "HC",
+        "node_name": "2NM",
+        "module_name": "PC",
+        "recipe_name": "RCP",
+        "recipe_version": "1.0",
+        "file_path": "/data/measurements/bench.csv",
+        "file_name": "bench.csv",
+    }
+    if columnar:
+        return {
+            **common,
+            "measurements": None,
+            "columns": {
+                "items": items,
+                "item_code": codes,
+                "measurable": [True] * size,
+                "x_index": x_index,
+                "y_index": y_index,
+                "x_0": [x * 0.5 for x in x_index],
+                "x_1": [x * 0.5 + 0.5 for x in x_index],
+                "y_0": [y * 0.5 for y in y_index],
+                "y_1": [y * 0.5 + 0.5 for y in y_index],
+                "value": values,
+            },
+        }
+    return {
+        **common,
+        "measurements": [
+            {
+                **items[codes[n]],
+                "measurable": True,
+                "x_index": x_index[n],
+                "y_index": y_index[n],
+                "x_0": x_index[n] * 0.5,
+                "x_1": x_index[n] * 0.5 + 0.5,
+                "y_0": y_index[n] * 0.5,
+                "y_1": y_index[n] * 0.5 + 0.5,
+                "value": values[n],
+            }
+            for n in range(size)
+        ],
+    }
+
+
+def available_codecs() -> list[tuple[str, MessageCodec]]:
+    codecs = [("json", MessageCodec(JSON_CONTENT_TYPE))]
+    codecs.append(("json+gzip", MessageCodec(JSON_CONTENT_TYPE, compression="gzip")))
+    if zstandard is not None:
+        codecs.append(("json+zstd", MessageCodec(JSON_CONTENT_TYPE, compression="zstd")))
+    if msgpack is not None:
+        codecs.append(("msgpack", MessageCodec(MSGPACK_CONTENT_TYPE)))
+        codecs.append(("msgpack+gzip", MessageCodec(MSGPACK_CONTENT_TYPE, compression="gzip")))
+        if zstandard is not None:
+            codecs.append(
+                ("msgpack+zstd", MessageCodec(MSGPACK_CONTENT_TYPE, compression="zstd"))
+            )
+    return codecs
+
+
+def measure(codec: MessageCodec, message: dict, repeat: int) -> tuple[int, float, float]:
+    encode_times = []
+    decode_times = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        body, content_type, content_encoding = codec.encode(message)
+        encode_times.append(time.perf_counter() - started_at)
+        started_at = time.perf_counter()
+        decode_message(body, content_type, content_encoding)
+        decode_times.append(time.perf_counter() - started_at)
+    return len(body), min(encode_times) * 1000, min(decode_times) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare queue message codecs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'layout':<9} {'points':>7} {'codec':<13} {'bytes':>11} "
+        f"{'encode ms':>10} {'decode ms':>10}"
+    )
+    for columnar in (False, True):
+        layout = "columnar" if columnar else "points"
+        for size in args.sizes:
+            message = {"id": "bench", "payload": build_payload(size, columnar)}
+            for name, codec in available_codecs():
+                size_bytes, encode_ms, decode_ms = measure(codec, message, args.repeat)
+                print(
+                    f"{layout:<9} {size:>7} {name:<13} {size_bytes:>11} "
+                    f"{encode_ms:>10.2f} {decode_ms:>10.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
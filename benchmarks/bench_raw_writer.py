@@ -0,0 +1,117 @@
+import argparse
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import Base, MeasurementRawDataCurrent, MeasurementRawDataHistory
+from app.worker.raw_writer import RawDataWriter
+from app.worker.worker import (
+    build_columnar_rows,
+    item_spec,
+    resolve_items,
+    resolve_measurement_file,
+)
+from benchmarks.bench_codec import build_payload
+
+
+def single_statement_write(session, rows: list[dict]) -> None:
+    if session.bind.dialect.name == "mysql":
+        session.execute(mysql_insert(MeasurementRawDataHistory).values(rows))
+        current_stmt = mysql_insert(MeasurementRawDataCurrent).values(rows)
+        current_stmt = current_stmt.on_duplicate_key_update(
+            measurable=current_stmt.inserted.measurable,
+            x_0=current_stmt.inserted.x_0,
+            x_1=current_stmt.inserted.x_1,
+            y_0=current_stmt.inserted.y_0,
+            y_1=current_stmt.inserted.y_1,
+            value=current_stmt.inserted.value,
+            updated_at=func.now(),
+        )
+        session.execute(current_stmt)
+    else:
+        session.execute(insert(MeasurementRawDataHistory).values(rows))
+        RawDataWriter(session).write_current(rows)
+
+
+def chunked_write(session, rows: list[dict], chunk_rows: int) -> None:
+    writer = RawDataWriter(session, chunk_rows=chunk_rows)
+    writer.write_history(rows)
+    writer.write_current(rows)
+
+
+def prepare_rows(session, size: int) -> list[dict]:
+    payload = build_payload(size, columnar=True)
+    measurement_file = resolve_measurement_file(session, payload)
+    columns = payload["columns"]
+    item_ids = resolve_items(session, map(item_spec, columns["items"]))
+    session.commit()
+    return build_columnar_rows(columns, measurement_file.id, item_ids)
+
+
+def run_once(session_factory, rows: list[dict], write, trace: bool) -> float:
+    session = session_factory()
+    try:
+        if trace:
+            tracemalloc.start()
+        started_at = time.perf_counter()
+        write(session, rows)
+        if trace:
+            return tracemalloc.get_traced_memory()[1]
+        return time.perf_counter() - started_at
+    finally:
+        if trace:
+            tracemalloc.stop()
+        session.rollback()
+        session.close()
+
+
+def measure(session_factory, rows: list[dict], write, repeat: int) -> tuple[float, float] | str:
+    try:
+        timings = [run_once(session_factory, rows, write, trace=False) for _ in range(repeat)]
+        peak = run_once(session_factory, rows, write, trace=True)
+    except SQLAlchemyError as exc:
+        return f"failed: {type(getattr(exc, 'orig', None) or exc).__name__}"
+    return min(timings), peak / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare raw row write strategies.")
+    parser.add_argument("--database-url", default="sqlite+pysqlite:///:memory:")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--chunk-rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url, future=True)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    with session_factory() as session:
+        rows_by_size = {size: prepare_rows(session, size) for size in args.sizes}
+
+    strategies = [
+        ("single", single_statement_write),
+        (
+            f"chunked/{args.chunk_rows}",
+            lambda session, rows: chunked_write(session, rows, args.chunk_rows),
+        ),
+    ]
+    print(f"{'rows':>7} {'strategy':<14} {'ms':>10} {'rows/sec':>11} {'peak MiB':>9}")
+    for size, rows in rows_by_size.items():
+        for name, write in strategies:
+            result = measure(session_factory, rows, write, args.repeat)
+            if isinstance(result, str):
+                print(f"{size:>7} {name:<14} {result}")
+                continue
+            seconds, peak_mib = result
+            print(
+                f"{size:>7} {name:<14} {seconds * 1000:>10.1f} "
+                f"{size / seconds:>11.0f} {peak_mib:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
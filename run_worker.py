@@ -1,15 +1,42 @@
 import argparse
+import glob
 import multiprocessing
-
 import os
+import shutil
+import tempfile
+
+from prometheus_client import multiprocess
 
+from app.config import get_settings
+from app.metrics import start_metrics_server
+from app.worker import async_worker
+from app.worker.supervisor import WorkerSupervisor
 from app.worker.worker import main
 
+ENGINES = {
+    "sync": main,
+    "async": async_worker.main,
+}
 
-def run_worker(worker_id: str | None = None) -> None:
+
+def run_worker(worker_id: str | None = None, engine: str = "sync") -> None:
     if worker_id:
         os.environ["WORKER_ID"] = worker_id
-    main()
+        # Supervised workers only write metric files; the supervisor serves the aggregate.
+        os.environ["WORKER_METRICS_PORT"] = "0"
+    ENGINES[engine]()
+
+
+def prepare_multiprocess_dir() -> str | None:
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, "*.db")):
+            os.remove(stale)
+        return None
+    path = tempfile.mkdtemp(prefix="worker-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
 
 
 if __name__ == "__main__":
@@ -17,24 +44,61 @@ if __name__ == "__main__":
     parser.add_argument(
         "--workers",
         type=int,
-        default=1,
-        help="Number of worker processes to run (default: 1)",
+        default=None,
+        help="Run a fixed number of worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--min-workers",
+        type=int,
+        default=None,
+        help="Autoscale from queue depth, never below this many workers (default: WORKER_MIN)",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=None,
+        help="Autoscale from queue depth, never above this many workers (default: WORKER_MAX)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=sorted(ENGINES),
+        default="sync",
+        help="Worker engine: pika threads (sync) or asyncio with concurrent messages (async)",
     )
     args = parser.parse_args()
 
-    if args.workers <= 1:
-        main()
+    settings = get_settings()
+    if args.workers is not None:
+        min_workers = max_workers = max(1, args.workers)
+    elif args.min_workers is None and args.max_workers is None:
+        min_workers = max_workers = 1
+    else:
+        min_workers = args.min_workers if args.min_workers is not None else settings.worker_min
+        max_workers = args.max_workers if args.max_workers is not None else settings.worker_max
+
+    if max_workers <= 1:
+        run_worker(engine=args.engine)
+    elif not settings.worker_metrics_port:
+        supervisor = WorkerSupervisor(
+            run_worker, min_workers, max_workers, settings, args=(args.engine,)
+        )
+        supervisor.run()
     else:
-        processes = []
+        created_dir = prepare_multiprocess_dir()
+        start_metrics_server(settings.worker_metrics_port)
+        # prometheus_client picks multiprocess mode at import time, so workers must be
+        # spawned fresh rather than forked from this already-imported process.
+        supervisor = WorkerSupervisor(
+            run_worker,
+            min_workers,
+            max_workers,
+            settings,
+            args=(args.engine,),
+            process_factory=multiprocessing.get_context("spawn").Process,
+            on_exit=multiprocess.mark_process_dead,
+        )
         try:
-            for idx in range(args.workers):
-                worker_id = f"worker-{idx + 1}"
-                process = multiprocessing.Process(target=run_worker, args=(worker_id,))
-                process.start()
-                processes.append(process)
-            for process in processes:
-                process.join()
-        except KeyboardInterrupt:
-            for process in processes:
-                if process.is_alive():
-                    process.terminate()
+            supervisor.run()
+        finally:
+            if created_dir:
+                shutil.rmtree(created_dir, ignore_errors=True)
@@ -3,6 +3,8 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+import app.idempotency as idempotency
+import app.worker.dimension_cache as dimension_cache
 from app.db.models import Base
 from app.main import app
 
@@ -31,3 +33,17 @@ def db_session(engine):
 @pytest.fixture()
 def client():
     return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_idempotency_cache():
+    idempotency._idempotency_cache = None
+    yield
+    idempotency._idempotency_cache = None
+
+
+@pytest.fixture(autouse=True)
+def reset_dimension_cache():
+    dimension_cache._dimension_cache = None
+    yield
+    dimension_cache._dimension_cache = None
@@ -1,19 +1,20 @@
-import app.api.routes as routes
+import asyncio
+import json
 
+import pytest
 
-def test_ingest_queues_message(client, monkeypatch):
-    class DummyClient:
-        def __enter__(self):
-            return self
+import app.api.routes as routes
+from app.queue.buffer import PublishBufferFull
 
-        def __exit__(self, exc_type, exc, tb):
-            return False
 
-        def publish(self, payload):
+def test_ingest_queues_message(client, monkeypatch):
+    class DummyPool:
+        def publish(self, payload, message_id=None, digest=None):
             assert payload["product_name"] == "P1"
+            assert digest
             return "msg-123"
 
-    monkeypatch.setattr(routes, "RabbitMQClient", DummyClient)
+    monkeypatch.setattr(routes, "get_publisher_pool", lambda: DummyPool())
 
     response = client.post(
         "/ingest",
@@ -51,6 +52,59 @@ def test_ingest_queues_message(client, monkeypatch):
     assert response.json() == {"status": "queued", "id": "msg-123"}
 
 
+def test_ingest_queue_unavailable(client, monkeypatch):
+    class FailingPool:
+        def publish(self, payload, message_id=None, digest=None):
+            raise TimeoutError("No publisher channel available")
+
+    monkeypatch.setattr(routes, "get_publisher_pool", lambda: FailingPool())
+
+    response = client.post(
+        "/ingest",
+        json={
+            "product_name": "P1",
+            "site_name": "HC",
+            "node_name": "2NM",
+            "module_name": "PC",
+            "recipe_name": "RCP",
+            "recipe_version": "1.0",
+            "file_path": "/data/measurements/measure1.csv",
+            "file_name": "measure1.csv",
+            "measurements": [],
+        },
+    )
+
+    assert response.status_code == 503
+
+
+def test_ingest_buffer_full_returns_429(client, monkeypatch):
+    class FullBuffer:
+        retry_after = 2
+
+        async def submit(self, payload, digest=None):
+            raise PublishBufferFull("Ingest buffer full")
+
+    monkeypatch.setattr(routes, "get_publish_buffer", lambda: FullBuffer())
+
+    response = client.post(
+        "/ingest",
+        json={
+            "product_name": "P1",
+            "site_name": "HC",
+            "node_name": "2NM",
+            "module_name": "PC",
+            "recipe_name": "RCP",
+            "recipe_version": "1.0",
+            "file_path": "/data/measurements/measure1.csv",
+            "file_name": "measure1.csv",
+            "measurements": [],
+        },
+    )
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+
+
 def test_ingest_validation_error(client):
     response = client.post("/ingest", json={"product_name": "P1"})
     assert response.status_code == 422
@@ -79,3 +133,210 @@ def test_ready_not_ok(client, monkeypatch):
         "status": "not_ready",
         "details": {"db": False, "rabbitmq": True},
     }
+
+
+def batch_entry(file_name):
+    return {
+        "product_name": "P1",
+        "site_name": "HC",
+        "node_name": "2NM",
+        "module_name": "PC",
+        "recipe_name": "RCP",
+        "recipe_version": "1.0",
+        "file_path": f"/data/measurements/{file_name}",
+        "file_name": file_name,
+        "measurements": [],
+    }
+
+
+class BatchPool:
+    def __init__(self):
+        self.batches = []
+
+    def publish_batch(self, items):
+        self.batches.append(items)
+        return [message_id for _, message_id, _ in items]
+
+
+def test_ingest_batch_publishes_valid_items(client, monkeypatch):
+    pool = BatchPool()
+    monkeypatch.setattr(routes, "get_publisher_pool", lambda: pool)
+
+    response = client.post(
+        "/ingest/batch",
+        json=[batch_entry("a.csv"), {"product_name": "P1"}, batch_entry("b.csv")],
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["queued"] == 2
+    assert body["rejected"] == 1
+    assert [item["status"] for item in body["items"]] == ["queued", "rejected", "queued"]
+    assert body["items"][1]["id"] is None
+    assert body["items"][1]["error"]
+    assert len(pool.batches) == 1
+    published_ids = [message_id for _, message_id, _ in pool.batches[0]]
+    assert published_ids == [body["items"][0]["id"], body["items"][2]["id"]]
+
+
+def test_ingest_batch_accepts_ndjson(client, monkeypatch):
+    pool = BatchPool()
+    monkeypatch.setattr(routes, "get_publisher_pool", lambda: pool)
+    lines = [json.dumps(batch_entry("a.csv")), "not json", json.dumps(batch_entry("b.csv"))]
+
+    response = client.post(
+        "/ingest/batch",
+        content="\n".join(lines) + "\n",
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["queued"] == 2
+    assert body["items"][1]["status"] == "rejected"
+    assert [payload["file_name"] for payload, _, _ in pool.batches[0]] == ["a.csv", "b.csv"]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_lines_reassemble_across_chunks():
+    class StreamingRequest:
+        async def stream(self):
+            for chunk in (b'{"a"', b":1", b'}\n{"b":2}\n', b'{"c"', b":3}"):
+                yield chunk
+
+    lines = [line async for line in routes._iter_ndjson_lines(StreamingRequest())]
+
+    assert lines == [b'{"a":1}', b'{"b":2}', b'{"c":3}']
+
+
+def test_ingest_digests_payloads_off_the_event_loop(client, monkeypatch):
+    on_loop = []
+    original_digest = routes.payload_digest
+
+    def recording_digest(payload, idempotency_key=None):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return original_digest(payload, idempotency_key)
+
+    class Pool(BatchPool):
+        def publish(self, payload, message_id=None, digest=None):
+            return "msg-1"
+
+    monkeypatch.setattr(routes, "payload_digest", recording_digest)
+    monkeypatch.setattr(routes, "get_publisher_pool", lambda: Pool())
+
+    client.post("/ingest", json=batch_entry("single.csv"))
+    client.post("/ingest/batch", json=[batch_entry("a.csv"), batch_entry("b.csv")])
+    client.post(
+        "/ingest/batch",
+        content="\n".join(json.dumps(batch_entry(name)) for name in ("c.csv", "d.csv")),
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert on_loop == [False] * 5
+
+
+def test_ingest_batch_rejects_oversized_batch(client, monkeypatch):
+    monkeypatch.setenv("INGEST_BATCH_MAX_ITEMS", "1")
+    monkeypatch.setattr(routes, "get_publisher_pool", lambda: BatchPool())
+
+    response = client.post("/ingest/batch", json=[batch_entry("a.csv"), batch_entry("b.csv")])
+
+    assert response.status_code == 413
+
+
+def columnar_entry(**overrides):
+    columns = {
+        "items": [
+            {"metric_name": "THK", "metric_unit": "nm", "class_name": "C", "measure_item": "I"}
+        ],
+        "item_code": [0, 0],
+        "x_index": [0, 1],
+        "y_index": [0, 0],
+        "x_0": [0.1, 0.2],
+        "x_1": [0.3, 0.4],
+        "y_0": [0.2, 0.3],
+        "y_1": [0.4, 0.5],
+        "value": [1.23, 2.34],
+    }
+    columns.update(overrides)
+    entry = batch_entry("wafer.csv")
+    del entry["measurements"]
+    entry["columns"] = columns
+    return entry
+
+
+def test_ingest_accepts_columnar_payload(client, monkeypatch):
+    published = []
+
+    class DummyPool:
+        def publish(self, payload, message_id=None, digest=None):
+            published.append(payload)
+            return "msg-123"
+
+    monkeypatch.setattr(routes, "get_publisher_pool", lambda: DummyPool())
+
+    response = client.post("/ingest", json=columnar_entry())
+
+    assert response.status_code == 200
+    assert published[0]["measurements"] is None
+    assert published[0]["columns"]["value"] == [1.23, 2.34]
+
+
+def test_ingest_rejects_invalid_columnar_payload(client):
+    assert client.post("/ingest", json=columnar_entry(value=[1.0])).status_code == 422
+    assert client.post("/ingest", json=columnar_entry(item_code=[0, 1])).status_code == 422
+
+    both = columnar_entry()
+    both["measurements"] = []
+    assert client.post("/ingest", json=both).status_code == 422
+
+
+def test_ingest_short_circuits_duplicates(client, monkeypatch):
+    published = []
+
+    class DummyPool:
+        def publish(self, payload, message_id=None, digest=None):
+            published.append(digest)
+            return f"msg-{len(published)}"
+
+    monkeypatch.setattr(routes, "get_publisher_pool", lambda: DummyPool())
+
+    first = client.post("/ingest", json=batch_entry("a.csv"))
+    second = client.post("/ingest", json=batch_entry("a.csv"))
+    keyed = client.post(
+        "/ingest", json=batch_entry("b.csv"), headers={"Idempotency-Key": "retry-1"}
+    )
+    keyed_retry = client.post(
+        "/ingest", json=batch_entry("c.csv"), headers={"Idempotency-Key": "retry-1"}
+    )
+
+    assert first.json() == {"status": "queued", "id": "msg-1"}
+    assert second.json() == {"status": "duplicate", "id": "msg-1"}
+    assert keyed.json() == {"status": "queued", "id": "msg-2"}
+    assert keyed_retry.json() == {"status": "duplicate", "id": "msg-2"}
+    assert len(published) == 2
+
+
+def test_ingest_batch_reports_duplicates(client, monkeypatch):
+    pool = BatchPool()
+    monkeypatch.setattr(routes, "get_publisher_pool", lambda: pool)
+
+    response = client.post(
+        "/ingest/batch", json=[batch_entry("a.csv"), batch_entry("a.csv")]
+    )
+
+    body = response.json()
+    assert body["queued"] == 1
+    assert body["duplicates"] == 1
+    assert body["rejected"] == 0
+    assert body["items"][1] == {
+        "index": 1,
+        "status": "duplicate",
+        "id": body["items"][0]["id"],
+        "error": None,
+    }
+    assert len(pool.batches[0]) == 1
@@ -0,0 +1,102 @@
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+
+from app.config import get_settings
+from app.idempotency import IdempotencyCache
+from app.queue.buffer import PublishBuffer, PublishBufferFull
+
+
+class DummyClient:
+    def __init__(self, published):
+        self.published = published
+
+    def publish(self, payload, message_id, digest=None):
+        self.published.append((payload, message_id))
+        return message_id
+
+
+class DummyPool:
+    def __init__(self):
+        self.published = []
+        self.acquired = 0
+
+    @contextmanager
+    def acquire(self):
+        self.acquired += 1
+        yield DummyClient(self.published)
+
+
+@pytest.mark.asyncio
+async def test_buffer_drains_to_publisher(monkeypatch):
+    monkeypatch.setenv("INGEST_BUFFER_SIZE", "10")
+    pool = DummyPool()
+    buffer = PublishBuffer(pool, get_settings())
+
+    ids = [await buffer.submit({"n": n}) for n in range(3)]
+    buffer.start()
+    await buffer.stop()
+
+    assert [message_id for _, message_id in pool.published] == ids
+    assert [payload["n"] for payload, _ in pool.published] == [0, 1, 2]
+    assert pool.acquired == 1
+
+
+@pytest.mark.asyncio
+async def test_buffer_rejects_when_full(monkeypatch):
+    monkeypatch.setenv("INGEST_BUFFER_SIZE", "1")
+    monkeypatch.setenv("INGEST_BUFFER_ENQUEUE_TIMEOUT", "0.01")
+    buffer = PublishBuffer(DummyPool(), get_settings())
+
+    await buffer.submit({"n": 0})
+    with pytest.raises(PublishBufferFull):
+        await buffer.submit({"n": 1})
+    assert buffer.depth == 1
+
+
+@pytest.mark.asyncio
+async def test_buffer_retries_failed_publish(monkeypatch):
+    monkeypatch.setenv("INGEST_BUFFER_PUBLISH_RETRIES", "2")
+    pool = DummyPool()
+    failures = {"left": 1}
+    original_acquire = pool.acquire
+
+    @contextmanager
+    def flaky_acquire():
+        if failures["left"]:
+            failures["left"] -= 1
+            raise ConnectionError("broker down")
+        with original_acquire() as client:
+            yield client
+
+    pool.acquire = flaky_acquire
+    buffer = PublishBuffer(pool, get_settings())
+    buffer.start()
+    message_id = await buffer.submit({"n": 0})
+    await asyncio.wait_for(buffer.stop(), timeout=5)
+
+    assert pool.published == [({"n": 0}, message_id)]
+
+
+@pytest.mark.asyncio
+async def test_buffer_forgets_digest_of_dropped_payload(monkeypatch):
+    monkeypatch.setenv("INGEST_BUFFER_PUBLISH_RETRIES", "0")
+    pool = DummyPool()
+
+    @contextmanager
+    def failing_acquire():
+        raise ConnectionError("broker down")
+        yield
+
+    pool.acquire = failing_acquire
+    cache = IdempotencyCache(max_size=10, window_seconds=60)
+    buffer = PublishBuffer(pool, get_settings(), cache)
+    message_id = await buffer.submit({"n": 0}, "digest-0")
+    cache.put("digest-0", message_id)
+    cache.put("digest-1", "other")
+    buffer.start()
+    await asyncio.wait_for(buffer.stop(), timeout=5)
+
+    assert cache.get("digest-0") is None
+    assert cache.get("digest-1") == "other"
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from app.queue.codec import (
+    JSON_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPE,
+    MessageCodec,
+    MessageDecodeError,
+    decode_message,
+)
+
+
+def columnar_message(size=4):
+    return {
+        "id": "msg-1",
+        "payload": {
+            "file_path": "/data/measurements/measure1.csv",
+            "measurements": None,
+            "columns": {
+                "items": [
+                    {
+                        "metric_name": "THK",
+                        "metric_unit": "nm",
+                        "class_name": "CLASS_A",
+                        "measure_item": "ITEM_1",
+                    }
+                ],
+                "item_code": [0] * size,
+                "measurable": [True, False] * (size // 2),
+                "x_index": list(range(size)),
+                "y_index": [0] * size,
+                "x_0": [0.1 * n for n in range(size)],
+                "x_1": [0.2 * n for n in range(size)],
+                "y_0": [0.3 * n for n in range(size)],
+                "y_1": [0.4 * n for n in range(size)],
+                "value": [1.5 * n for n in range(size)],
+            },
+        },
+    }
+
+
+def test_json_codec_is_default_and_uncompressed():
+    body, content_type, content_encoding = MessageCodec().encode({"id": "1", "payload": {}})
+
+    assert content_type == JSON_CONTENT_TYPE
+    assert content_encoding is None
+    assert json.loads(body) == {"id": "1", "payload": {}}
+
+
+def test_legacy_json_message_still_decodes():
+    body = json.dumps({"id": "1", "payload": {"a": 1}})
+
+    assert decode_message(body, "application/json", None) == {"id": "1", "payload": {"a": 1}}
+    assert decode_message(body) == {"id": "1", "payload": {"a": 1}}
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_msgpack_codec_round_trips_packed_columns(compression):
+    pytest.importorskip("msgpack")
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    codec = MessageCodec(MSGPACK_CONTENT_TYPE, compression=compression)
+    message = columnar_message()
+
+    body, content_type, content_encoding = codec.encode(message)
+
+    assert content_type == MSGPACK_CONTENT_TYPE
+    assert content_encoding == compression
+    assert decode_message(body, content_type, content_encoding) == message
+
+
+def test_compression_applies_only_above_threshold():
+    codec = MessageCodec(JSON_CONTENT_TYPE, compression="gzip", compression_min_bytes=1024)
+
+    _, _, small_encoding = codec.encode({"id": "1", "payload": {}})
+    body, _, large_encoding = codec.encode(columnar_message(size=200))
+
+    assert small_encoding is None
+    assert large_encoding == "gzip"
+    assert decode_message(body, JSON_CONTENT_TYPE, "gzip") == columnar_message(size=200)
+
+
+def test_decode_errors_are_wrapped():
+    with pytest.raises(MessageDecodeError):
+        decode_message(b"{not json", JSON_CONTENT_TYPE, None)
+    with pytest.raises(MessageDecodeError):
+        decode_message(b"plain", JSON_CONTENT_TYPE, "gzip")
+    with pytest.raises(MessageDecodeError):
+        decode_message(b"{}", JSON_CONTENT_TYPE, "br")
+    with pytest.raises(MessageDecodeError):
+        decode_message(b"[1, 2]", JSON_CONTENT_TYPE, None)
@@ -0,0 +1,71 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.models import MeasurementRecipe, MetricType, ProductName
+from app.worker.dimension_cache import DimensionCache, dimension_key
+
+
+def product_key(name):
+    return dimension_key(ProductName, {"name": name}, {"is_active": True})
+
+
+def test_cache_evicts_least_recently_used():
+    cache = DimensionCache(max_size=2)
+    cache.put(product_key("A"), 1)
+    cache.put(product_key("B"), 2)
+    assert cache.get(product_key("A")) == 1
+
+    cache.put(product_key("C"), 3)
+
+    assert cache.get(product_key("B")) is None
+    assert cache.get(product_key("A")) == 1
+    assert cache.get(product_key("C")) == 3
+
+
+def test_cache_expires_entries_after_ttl(monkeypatch):
+    clock = {"now": 100.0}
+    monkeypatch.setattr("app.worker.dimension_cache.time.monotonic", lambda: clock["now"])
+    cache = DimensionCache(max_size=10, ttl_seconds=5)
+    cache.put(product_key("A"), 1)
+
+    clock["now"] = 104.0
+    assert cache.get(product_key("A")) == 1
+    clock["now"] = 110.0
+    assert cache.get(product_key("A")) is None
+
+
+def test_staged_ids_are_published_only_on_commit(engine):
+    cache = DimensionCache(max_size=10)
+
+    with Session(engine) as session:
+        session.execute(select(ProductName))
+        cache.stage(session, product_key("A"), 1)
+        assert cache.get(product_key("A"), session) == 1
+        assert cache.get(product_key("A")) is None
+        session.rollback()
+        assert cache.get(product_key("A"), session) is None
+
+        cache.stage(session, product_key("B"), 2)
+        session.commit()
+
+    assert cache.get(product_key("A")) is None
+    assert cache.get(product_key("B")) == 2
+
+
+def test_warm_loads_active_dimensions(db_session):
+    db_session.add_all(
+        [
+            ProductName(name="P1", is_active=True),
+            ProductName(name="P2", is_active=False),
+            MetricType(name="THK", unit="nm", is_active=True),
+            MeasurementRecipe(name="RCP", version="1.0"),
+        ]
+    )
+    db_session.flush()
+    cache = DimensionCache(max_size=10)
+
+    assert cache.warm(db_session) == 3
+    assert cache.get(product_key("P1")) is not None
+    assert cache.get(product_key("P2")) is None
+    metric_key = dimension_key(MetricType, {"name": "THK"}, {"unit": "nm", "is_active": True})
+    assert cache.get(metric_key) is not None
@@ -0,0 +1,67 @@
+import logging
+
+import app.api.routes as routes
+from app.config import get_settings
+from app.health import HealthProber
+
+
+def test_prober_caches_status_and_logs_changes(caplog):
+    calls = {"db": 0}
+    state = {"rabbitmq": True}
+
+    def check_db():
+        calls["db"] += 1
+        return True
+
+    prober = HealthProber(
+        {"db": check_db, "rabbitmq": lambda: state["rabbitmq"]}, get_settings()
+    )
+    with caplog.at_level(logging.INFO, logger="app.health"):
+        prober.refresh()
+        prober.refresh()
+        state["rabbitmq"] = False
+        prober.refresh()
+
+    status, age = prober.snapshot()
+    assert status == {"db": True, "rabbitmq": False}
+    assert age is not None and not prober.is_stale(age)
+    assert calls["db"] == 3
+    changes = [
+        (record.dependency, record.healthy)
+        for record in caplog.records
+        if getattr(record, "event", None) == "dependency_state_change"
+    ]
+    assert changes == [("db", True), ("rabbitmq", True), ("rabbitmq", False)]
+
+
+def test_prober_treats_check_errors_as_down():
+    def broken():
+        raise RuntimeError("boom")
+
+    prober = HealthProber({"db": broken}, get_settings())
+
+    assert prober.refresh() == {"db": False}
+
+
+def test_ready_served_from_prober_cache(client, monkeypatch):
+    prober = HealthProber({"db": lambda: True, "rabbitmq": lambda: True}, get_settings())
+    prober.refresh()
+    monkeypatch.setattr(routes, "get_health_prober", lambda: prober)
+    monkeypatch.setattr(routes, "check_db", lambda: False)
+
+    response = client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+
+def test_ready_not_ok_when_cache_is_stale(client, monkeypatch):
+    monkeypatch.setenv("HEALTH_PROBE_MAX_AGE", "0")
+    prober = HealthProber({"db": lambda: True, "rabbitmq": lambda: True}, get_settings())
+    prober.refresh()
+    monkeypatch.setattr(routes, "get_health_prober", lambda: prober)
+
+    response = client.get("/ready")
+
+    assert response.status_code == 503
+    assert response.json()["details"]["stale"] is True
@@ -0,0 +1,39 @@
+from app.idempotency import IdempotencyCache, payload_digest
+
+
+def test_payload_digest_is_key_order_independent():
+    first = payload_digest({"a": 1, "b": [1.5, 2.5]})
+    second = payload_digest({"b": [1.5, 2.5], "a": 1})
+
+    assert first == second
+    assert first != payload_digest({"a": 1, "b": [1.5, 2.6]})
+
+
+def test_payload_digest_honors_client_key():
+    assert payload_digest({"a": 1}, "key-1") == payload_digest({"a": 2}, "key-1")
+    assert payload_digest({"a": 1}, "key-1") != payload_digest({"a": 1}, "key-2")
+
+
+def test_cache_evicts_least_recently_used():
+    cache = IdempotencyCache(max_size=2, window_seconds=60)
+    cache.put("a", "msg-a")
+    cache.put("b", "msg-b")
+    assert cache.get("a") == "msg-a"
+
+    cache.put("c", "msg-c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "msg-a"
+    assert cache.get("c") == "msg-c"
+
+
+def test_cache_expires_entries_outside_window(monkeypatch):
+    clock = {"now": 100.0}
+    monkeypatch.setattr("app.idempotency.time.monotonic", lambda: clock["now"])
+    cache = IdempotencyCache(max_size=10, window_seconds=5)
+    cache.put("a", "msg-a")
+
+    clock["now"] = 104.0
+    assert cache.get("a") == "msg-a"
+    clock["now"] = 110.0
+    assert cache.get("a") is None
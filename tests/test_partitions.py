@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+
+from app.db.partitions import (
+    PartitionInfo,
+    create_statement,
+    parse_upper_bound,
+    partition_by_statement,
+    partition_name,
+    plan_partitions,
+    retire_statements,
+)
+
+
+def daily_partitions(first: date, count: int) -> list[PartitionInfo]:
+    days = [first + timedelta(days=offset) for offset in range(count)]
+    partitions = [PartitionInfo(partition_name(day), day + timedelta(days=1)) for day in days]
+    return partitions + [PartitionInfo("pmax", None)]
+
+
+def test_parse_upper_bound():
+    assert parse_upper_bound("'2026-10-18 00:00:00'") == date(2026, 10, 18)
+    assert parse_upper_bound("'2026-10-18'") == date(2026, 10, 18)
+    assert parse_upper_bound("MAXVALUE") is None
+
+
+def test_plan_precreates_future_days_and_retires_expired():
+    partitions = daily_partitions(date(2026, 9, 10), 40)
+
+    plan = plan_partitions(partitions, date(2026, 10, 17), retention_days=31, precreate_days=3)
+
+    assert plan.create == [date(2026, 10, 20)]
+    assert [partition.upper_bound for partition in plan.retire] == [
+        date(2026, 9, 11),
+        date(2026, 9, 12),
+        date(2026, 9, 13),
+        date(2026, 9, 14),
+        date(2026, 9, 15),
+        date(2026, 9, 16),
+    ]
+
+
+def test_plan_on_fresh_table_starts_today_and_keeps_last_partition():
+    fresh = plan_partitions(
+        [PartitionInfo("pmax", None)], date(2026, 10, 17), retention_days=31, precreate_days=1
+    )
+    assert fresh.create == [date(2026, 10, 17), date(2026, 10, 18)]
+
+    stale = plan_partitions(
+        daily_partitions(date(2026, 1, 1), 2), date(2026, 10, 17), 31, precreate_days=0
+    )
+    assert [partition.name for partition in stale.retire] == ["p20260101"]
+
+
+def test_partition_statements():
+    assert create_statement([date(2026, 10, 18)]) == (
+        "ALTER TABLE measurement_raw_data_history REORGANIZE PARTITION pmax INTO (\n"
+        "  PARTITION p20261018 VALUES LESS THAN ('2026-10-19'),\n"
+        "  PARTITION pmax VALUES LESS THAN (MAXVALUE)\n)"
+    )
+    statement = partition_by_statement(date(2026, 10, 16), date(2026, 10, 17), precreate_days=1)
+    assert statement.startswith(
+        "ALTER TABLE measurement_raw_data_history PARTITION BY RANGE COLUMNS (ingested_at)"
+    )
+    assert statement.count("VALUES LESS THAN ('") == 3
+
+    expired = [PartitionInfo("p20260901", date(2026, 9, 2)), PartitionInfo("p20260902", None)]
+    assert retire_statements(expired, "drop") == [
+        "ALTER TABLE measurement_raw_data_history DROP PARTITION p20260901, p20260902"
+    ]
+    archived = retire_statements(expired[:1], "archive")
+    assert archived == [
+        "CREATE TABLE measurement_raw_data_history_p20260901 LIKE measurement_raw_data_history",
+        "ALTER TABLE measurement_raw_data_history_p20260901 REMOVE PARTITIONING",
+        "ALTER TABLE measurement_raw_data_history EXCHANGE PARTITION p20260901 "
+        "WITH TABLE measurement_raw_data_history_p20260901",
+        "ALTER TABLE measurement_raw_data_history DROP PARTITION p20260901",
+    ]
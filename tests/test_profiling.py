@@ -0,0 +1,87 @@
+import pstats
+import tracemalloc
+
+import pytest
+
+from app.worker.profiling import MessageProfiler, collect_timings, stage_ms, timed_stage
+from app.worker.worker import process_message
+from tests.test_worker import chunk_payload
+
+
+def test_timed_stages_accumulate_into_the_outer_collector():
+    with collect_timings() as outer:
+        with timed_stage("write"):
+            pass
+        with collect_timings() as inner:
+            with timed_stage("write"):
+                pass
+            with timed_stage("commit"):
+                pass
+
+    assert inner is outer
+    assert sorted(outer) == ["commit", "write"]
+    assert all(duration >= 0 for duration in stage_ms(outer).values())
+    with timed_stage("outside"):
+        pass
+    assert "outside" not in outer
+
+
+def test_process_message_returns_stage_timings(db_session):
+    result = process_message(db_session, chunk_payload([(0, 1.0), (1, 2.0)]))
+
+    assert {
+        "resolve_dimensions",
+        "upsert_file",
+        "shape",
+        "resolve_items",
+        "write_history",
+        "write_current",
+    } <= set(result["stage_ms"])
+
+
+@pytest.mark.parametrize("mode", ["cprofile", "tracemalloc"])
+def test_profiler_samples_one_in_n_and_dumps(tmp_path, mode):
+    profiler = MessageProfiler(mode, 3, str(tmp_path), "pid:1")
+
+    paths = []
+    for index in range(6):
+        with profiler.profile(f"msg-{index}") as path:
+            sum(range(1000))
+        paths.append(path)
+
+    assert [path is not None for path in paths] == [False, False, True] * 2
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert len(names) == 2
+    assert names[0].startswith("pid_1-")
+    assert names[0].endswith("-msg-2." + ("prof" if mode == "cprofile" else "tracemalloc"))
+    if mode == "cprofile":
+        assert pstats.Stats(paths[2]).total_calls > 0
+    else:
+        assert tracemalloc.Snapshot.load(paths[2]).traces is not None
+        assert not tracemalloc.is_tracing()
+
+
+def test_profiler_off_never_samples(tmp_path):
+    profiler = MessageProfiler("off", 1, str(tmp_path), "w")
+
+    with profiler.profile("msg") as path:
+        pass
+
+    assert path is None
+    assert list(tmp_path.iterdir()) == []
+    with pytest.raises(ValueError):
+        MessageProfiler("perf", 1, str(tmp_path), "w")
+
+
+@pytest.mark.parametrize("mode", ["cprofile", "tracemalloc"])
+def test_profiler_swallows_dump_failures(tmp_path, mode):
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    profiler = MessageProfiler(mode, 1, str(blocker / "profiles"), "w")
+
+    with profiler.profile("msg") as path:
+        sum(range(1000))
+
+    assert path is not None
+    assert not tracemalloc.is_tracing()
+    assert not profiler._profile_lock.locked()
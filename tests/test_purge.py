@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from app.db.models import Base, MeasurementRawDataHistory, MeasurementRawDataSnapshot
+from app.db.purge import HistoryPurger, PurgeCheckpoint
+
+CUTOFF = datetime(2026, 9, 16)
+
+
+@pytest.fixture()
+def history_engine(tmp_path):
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'history.db'}", future=True)
+    Base.metadata.create_all(engine)
+    rows = [
+        {
+            "file_id": 1,
+            "item_id": 1,
+            "measurable": True,
+            "x_index": index,
+            "y_index": 0,
+            "x_0": 0.1,
+            "x_1": 0.3,
+            "y_0": 0.2,
+            "y_1": 0.4,
+            "value": float(index),
+            "ingested_at": CUTOFF + timedelta(hours=index - 25),
+        }
+        for index in range(30)
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(MeasurementRawDataHistory), rows)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def purge_settings(tmp_path, **overrides):
+    values = {
+        "history_retention_days": 31,
+        "history_purge_chunk_rows": 10,
+        "history_purge_target_chunk_seconds": 10.0,
+        "history_purge_sleep_ratio": 1.0,
+        "history_purge_max_replica_lag": 5.0,
+        "history_purge_max_lock_waits": 0,
+        "history_purge_archive_dir": "",
+        "history_purge_archive_format": "npz",
+        "history_purge_checkpoint_path": str(tmp_path / "purge.json"),
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def remaining_values(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(MeasurementRawDataHistory.value)).scalars().all()
+
+
+def test_purge_deletes_expired_rows_in_chunks(history_engine, tmp_path):
+    sleeps = []
+    purger = HistoryPurger(history_engine, purge_settings(tmp_path), sleep=sleeps.append)
+
+    state = purger.run(cutoff=CUTOFF)
+
+    assert state["deleted"] == 25
+    assert sorted(remaining_values(history_engine)) == [25.0, 26.0, 27.0, 28.0, 29.0]
+    assert len(sleeps) >= 2
+    assert purger.chunk_rows > 10
+    assert not (tmp_path / "purge.json").exists()
+
+
+def test_purge_dry_run_counts_without_deleting(history_engine, tmp_path):
+    purger = HistoryPurger(history_engine, purge_settings(tmp_path), sleep=lambda seconds: None)
+
+    state = purger.run(cutoff=CUTOFF, dry_run=True)
+
+    assert state["deleted"] == 25
+    assert len(remaining_values(history_engine)) == 30
+
+
+def test_purge_resumes_from_checkpoint(history_engine, tmp_path):
+    settings = purge_settings(tmp_path)
+    PurgeCheckpoint(settings.history_purge_checkpoint_path).save(
+        {"cutoff": CUTOFF.isoformat(), "last_id": 20, "deleted": 20, "archived": 0}
+    )
+    purger = HistoryPurger(history_engine, settings, sleep=lambda seconds: None)
+
+    state = purger.run()
+
+    assert state["deleted"] == 25
+    assert len(remaining_values(history_engine)) == 25
+
+
+def test_purge_backs_off_while_replica_lags(history_engine, tmp_path):
+    lags = iter([30.0, 12.0, 1.0])
+    sleeps = []
+    purger = HistoryPurger(
+        history_engine,
+        purge_settings(tmp_path, history_purge_chunk_rows=100),
+        sleep=sleeps.append,
+    )
+    purger.replica_lag = lambda: next(lags)
+
+    purger.run(cutoff=CUTOFF)
+
+    assert sleeps[1:] == [10.0, 20.0]
+
+
+def test_purge_archives_chunks_before_delete(history_engine, tmp_path):
+    numpy = pytest.importorskip("numpy")
+    archive_dir = tmp_path / "archive"
+    archive_dir.mkdir()
+    settings = purge_settings(tmp_path, history_purge_archive_dir=str(archive_dir))
+
+    state = HistoryPurger(history_engine, settings, sleep=lambda seconds: None).run(CUTOFF)
+
+    assert state["archived"] == 25
+    archived = [numpy.load(path) for path in sorted(archive_dir.glob("*.npz"))]
+    assert sum(len(archive["id"]) for archive in archived) == 25
+    assert archived[0]["value"][0] == 0.0
+
+
+def test_purge_snapshot_table_uses_its_own_checkpoint(tmp_path):
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'snapshot.db'}", future=True)
+    Base.metadata.create_all(engine)
+    snapshots = [
+        {
+            "file_id": 1,
+            "point_count": 1,
+            "encoding": "zlib",
+            "payload": b"\x00",
+            "ingested_at": CUTOFF + timedelta(days=offset),
+        }
+        for offset in (-2, -1, 1)
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(MeasurementRawDataSnapshot), snapshots)
+    settings = purge_settings(tmp_path)
+    purger = HistoryPurger(
+        engine, settings, sleep=lambda seconds: None, model=MeasurementRawDataSnapshot
+    )
+
+    state = purger.run(cutoff=CUTOFF)
+    engine.dispose()
+
+    assert state["deleted"] == 2
+    assert purger.checkpoint.path == str(tmp_path / "purge.measurement_raw_data_snapshot.json")
+    with pytest.raises(ValueError):
+        HistoryPurger(
+            engine,
+            purge_settings(tmp_path, history_purge_archive_dir=str(tmp_path)),
+            model=MeasurementRawDataSnapshot,
+        )
@@ -1,4 +1,7 @@
+import pytest
+
 from app.queue import rabbitmq
+from app.queue.chunking import build_messages
 
 
 def test_publish_persists_message(monkeypatch):
@@ -41,3 +44,176 @@ def test_publish_persists_message(monkeypatch):
     assert published["routing_key"] == client.queue_name
     assert published["properties"].delivery_mode == 2
     assert published["properties"].content_type == "application/json"
+    assert isinstance(published["properties"].headers[rabbitmq.PUBLISHED_AT_HEADER], int)
+    assert published["properties"].encode()
+
+
+class PoolChannel:
+    def __init__(self):
+        self.is_open = True
+        self.confirming = False
+        self.published = []
+
+    def queue_declare(self, queue, durable):
+        self.queue = queue
+
+    def confirm_delivery(self):
+        self.confirming = True
+
+    def tx_select(self):
+        self.transactional = True
+        self.committed = []
+
+    def tx_commit(self):
+        self.committed.extend(self.published)
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append(body)
+
+
+class PoolConnection:
+    created = []
+
+    def __init__(self, parameters):
+        self.is_open = True
+        self.channels = []
+        PoolConnection.created.append(self)
+
+    @property
+    def _channel(self):
+        return self.channels[0]
+
+    def channel(self):
+        self.channels.append(PoolChannel())
+        return self.channels[-1]
+
+    def process_data_events(self, time_limit=None):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def make_pool(monkeypatch, size=2):
+    PoolConnection.created = []
+    monkeypatch.setattr(rabbitmq.pika, "BlockingConnection", PoolConnection)
+    monkeypatch.setenv("RABBITMQ_PUBLISHER_POOL_SIZE", str(size))
+    monkeypatch.setenv("RABBITMQ_PUBLISHER_ACQUIRE_TIMEOUT", "0.01")
+    return rabbitmq.PublisherPool()
+
+
+def test_publisher_pool_reuses_connection(monkeypatch):
+    pool = make_pool(monkeypatch)
+
+    first = pool.publish({"key": 1})
+    second = pool.publish({"key": 2})
+
+    assert first != second
+    assert len(PoolConnection.created) == 1
+    channel = PoolConnection.created[0]._channel
+    assert channel.confirming is True
+    assert len(channel.published) == 2
+
+
+def test_publisher_pool_reconnects_closed_connection(monkeypatch):
+    pool = make_pool(monkeypatch, size=1)
+
+    pool.publish({"key": 1})
+    PoolConnection.created[0].is_open = False
+    pool.publish({"key": 2})
+
+    assert len(PoolConnection.created) == 2
+    assert len(PoolConnection.created[1]._channel.published) == 1
+
+
+def test_publisher_pool_times_out_when_exhausted(monkeypatch):
+    pool = make_pool(monkeypatch, size=1)
+
+    with pool.acquire():
+        with pytest.raises(TimeoutError):
+            with pool.acquire():
+                pass
+
+    assert rabbitmq.publisher_channels_in_use._value.get() == 0
+    assert rabbitmq.publisher_channels_idle._value.get() == 1
+
+
+def test_publisher_pool_close_reaches_checked_out_clients(monkeypatch):
+    pool = make_pool(monkeypatch, size=2)
+
+    with pool.acquire():
+        with pool.acquire():
+            pass
+        pool.close()
+        assert [connection.is_open for connection in PoolConnection.created] == [True, False]
+
+    assert [connection.is_open for connection in PoolConnection.created] == [False, False]
+    with pytest.raises(RuntimeError):
+        with pool.acquire():
+            pass
+
+
+def test_publisher_pool_publishes_batch_in_one_transaction(monkeypatch):
+    pool = make_pool(monkeypatch, size=1)
+
+    ids = pool.publish_batch([({"key": 1}, "id-1", None), ({"key": 2}, "id-2", "digest-2")])
+
+    assert ids == ["id-1", "id-2"]
+    confirm_channel, tx_channel = PoolConnection.created[0].channels
+    assert tx_channel.transactional is True
+    assert len(tx_channel.committed) == 2
+    assert confirm_channel.published == []
+
+
+def test_build_messages_splits_large_payloads():
+    payload = {"file_path": "/f.csv", "measurements": [{"n": n} for n in range(5)]}
+
+    messages = build_messages(payload, "file-1", max_points=2)
+
+    assert [message["chunk"] for message in messages] == [
+        {"index": 0, "count": 3},
+        {"index": 1, "count": 3},
+        {"index": 2, "count": 3},
+    ]
+    assert {message["id"] for message in messages} == {"file-1"}
+    assert [len(message["payload"]["measurements"]) for message in messages] == [2, 2, 1]
+    assert messages[2]["payload"]["file_path"] == "/f.csv"
+    assert build_messages(payload, "file-1", max_points=0) == [
+        {"id": "file-1", "payload": payload}
+    ]
+
+
+def test_build_messages_slices_columnar_arrays():
+    columns = {
+        "items": [{"metric_name": "THK"}],
+        "item_code": [0, 0, 0],
+        "measurable": None,
+        "x_index": [0, 1, 2],
+        "y_index": [0, 0, 0],
+        "x_0": [0.0, 1.0, 2.0],
+        "x_1": [0.5, 1.5, 2.5],
+        "y_0": [0.0, 0.0, 0.0],
+        "y_1": [0.5, 0.5, 0.5],
+        "value": [1.0, 2.0, 3.0],
+    }
+
+    messages = build_messages({"columns": columns}, "file-1", max_points=2)
+
+    second = messages[1]["payload"]["columns"]
+    assert second["items"] == columns["items"]
+    assert second["x_index"] == [2]
+    assert second["value"] == [3.0]
+    assert second["measurable"] is None
+
+
+def test_publish_sends_chunks_in_one_transaction(monkeypatch):
+    monkeypatch.setenv("QUEUE_CHUNK_MAX_POINTS", "2")
+    pool = make_pool(monkeypatch, size=1)
+
+    message_id = pool.publish({"measurements": [{"n": n} for n in range(3)]})
+
+    confirm_channel, tx_channel = PoolConnection.created[0].channels
+    assert confirm_channel.published == []
+    assert len(tx_channel.committed) == 2
+    assert all(message_id.encode() in body for body in tx_channel.committed)
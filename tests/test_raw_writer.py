@@ -0,0 +1,183 @@
+import io
+from types import SimpleNamespace
+
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import OperationalError
+
+from app.db.models import MeasurementRawDataCurrent, MeasurementRawDataHistory
+from app.worker import raw_writer
+from app.worker.raw_writer import HISTORY_COLUMNS, RawDataWriter, write_history_tsv
+from app.worker.worker import resolve_items, resolve_measurement_file
+
+
+def make_rows(db_session, count):
+    payload = {
+        "product_name": "P1",
+        "site_name": "HC",
+        "node_name": "2NM",
+        "module_name": "PC",
+        "recipe_name": "RCP",
+        "recipe_version": "1.0",
+        "file_path": "/data/measurements/writer.csv",
+        "file_name": "writer.csv",
+    }
+    measurement_file = resolve_measurement_file(db_session, payload)
+    spec = ("THK", "nm", "CLASS_A", "ITEM_1")
+    item_id = resolve_items(db_session, [spec])[spec]
+    return [
+        {
+            "file_id": measurement_file.id,
+            "item_id": item_id,
+            "measurable": True,
+            "x_index": index,
+            "y_index": 0,
+            "x_0": 0.1,
+            "x_1": 0.3,
+            "y_0": 0.2,
+            "y_1": 0.4,
+            "value": float(index),
+        }
+        for index in range(count)
+    ]
+
+
+def test_write_history_in_chunks(db_session, engine):
+    rows = make_rows(db_session, 25)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if "measurement_raw_data_history" in statement:
+            statements.append(executemany)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        writer = RawDataWriter(db_session, chunk_rows=10)
+        assert writer.write_history(rows) == 25
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    assert statements == [True, True, True]
+    count = db_session.execute(select(func.count()).select_from(MeasurementRawDataHistory))
+    assert count.scalar_one() == 25
+    assert writer.stats["measurement_raw_data_history"][0] == 25
+    assert writer.rows_per_sec("measurement_raw_data_history") > 0
+
+
+def test_write_current_updates_existing_rows(db_session):
+    rows = make_rows(db_session, 3)
+    writer = RawDataWriter(db_session, chunk_rows=2)
+    writer.write_current(rows)
+
+    writer.write_current([{**row, "value": 9.5} for row in rows[:2]])
+
+    values = db_session.execute(
+        select(MeasurementRawDataCurrent.value).order_by(MeasurementRawDataCurrent.x_index)
+    ).scalars()
+    assert list(values) == [9.5, 9.5, 2.0]
+
+
+def test_write_current_collapses_repeated_points(db_session, engine):
+    rows = make_rows(db_session, 2)
+    parameters_seen = []
+
+    def record_parameters(conn, cursor, statement, parameters, context, executemany):
+        if "measurement_raw_data_current" in statement:
+            parameters_seen.append(len(parameters) if executemany else 1)
+
+    event.listen(engine, "before_cursor_execute", record_parameters)
+    try:
+        written = RawDataWriter(db_session).write_current(rows + [{**rows[0], "value": 7.5}])
+    finally:
+        event.remove(engine, "before_cursor_execute", record_parameters)
+
+    assert written == 2
+    assert sum(parameters_seen) == 2
+    values = db_session.execute(
+        select(MeasurementRawDataCurrent.value).order_by(MeasurementRawDataCurrent.x_index)
+    ).scalars()
+    assert list(values) == [7.5, 1.0]
+
+
+def test_write_history_tsv_escapes_values():
+    stream = io.StringIO()
+    row = {column: index for index, column in enumerate(HISTORY_COLUMNS)}
+    row.update({"measurable": False, "value": 0.1, "x_0": None})
+
+    write_history_tsv([row], stream)
+
+    assert stream.getvalue() == "0\t1\t0\t3\t4\t\\N\t6\t7\t8\t0.1\n"
+
+
+def test_load_data_falls_back_to_insert(db_session, monkeypatch):
+    rows = make_rows(db_session, 5)
+    settings = SimpleNamespace(
+        raw_write_chunk_rows=100,
+        raw_history_load_data=True,
+        raw_history_load_data_min_rows=1,
+        raw_history_load_data_dir="",
+        raw_history_store="rows",
+        raw_history_snapshot_encoding="zlib",
+        raw_change_only=False,
+        raw_change_tolerance=0.0,
+    )
+    monkeypatch.setattr(raw_writer, "_load_data_disabled", False)
+    writer = RawDataWriter(db_session, settings=settings)
+    writer.dialect = "mysql"
+    attempts = []
+    original_load = writer._load_history
+
+    def load_history(load_rows):
+        attempts.append(len(load_rows))
+        return original_load(load_rows)
+
+    monkeypatch.setattr(writer, "_load_history", load_history)
+
+    assert writer.write_history(rows) == 5
+
+    assert attempts == [5]
+    count = db_session.execute(select(func.count()).select_from(MeasurementRawDataHistory))
+    assert count.scalar_one() == 5
+
+
+def test_load_data_disabled_by_server_error(db_session, monkeypatch):
+    settings = SimpleNamespace(
+        raw_write_chunk_rows=100,
+        raw_history_load_data=True,
+        raw_history_load_data_min_rows=1,
+        raw_history_load_data_dir="",
+        raw_history_store="rows",
+        raw_history_snapshot_encoding="zlib",
+        raw_change_only=False,
+        raw_change_tolerance=0.0,
+    )
+    monkeypatch.setattr(raw_writer, "_load_data_disabled", False)
+    writer = RawDataWriter(db_session, settings=settings)
+    writer.dialect = "mysql"
+    assert writer.use_load_data(10)
+
+    def refuse(stmt, params=None):
+        error = Exception(3948, "Loading local data is disabled")
+        raise OperationalError("LOAD DATA", params, error)
+
+    monkeypatch.setattr(db_session, "execute", refuse)
+
+    assert writer._load_history([]) is False
+    assert writer.use_load_data(10) is False
+
+
+def test_write_current_uses_set_based_upsert(db_session, engine):
+    rows = make_rows(db_session, 30)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if "measurement_raw_data_current" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        RawDataWriter(db_session, chunk_rows=10).write_current(rows)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    assert len(statements) == 3
+    assert all("ON CONFLICT" in statement for statement in statements)
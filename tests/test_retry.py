@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+from sqlalchemy.exc import OperationalError
+
+from app.queue.retry import ATTEMPT_HEADER, RetryPolicy, RetryRouter, declare_retry_topology
+
+
+class RetryChannel:
+    def __init__(self):
+        self.declared = {}
+        self.published = []
+        self.acks = []
+
+    def queue_declare(self, queue, durable, arguments=None):
+        self.declared[queue] = arguments
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((routing_key, body, properties))
+
+    def basic_ack(self, delivery_tag):
+        self.acks.append(delivery_tag)
+
+
+def make_properties(headers=None):
+    return SimpleNamespace(
+        content_type="application/json", content_encoding=None, headers=headers
+    )
+
+
+def test_retry_topology_uses_one_ttl_queue_per_attempt():
+    channel = RetryChannel()
+    declare_retry_topology(channel, RetryPolicy("ingest", 4, 1000, 3000))
+
+    assert channel.declared == {
+        "ingest.retry.1": {
+            "x-message-ttl": 1000,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": "ingest",
+        },
+        "ingest.retry.2": {
+            "x-message-ttl": 2000,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": "ingest",
+        },
+        "ingest.retry.3": {
+            "x-message-ttl": 3000,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": "ingest",
+        },
+        "ingest.parking": None,
+    }
+
+
+def test_retry_router_counts_attempts_then_parks():
+    channel = RetryChannel()
+    router = RetryRouter(channel, RetryPolicy("ingest", 3, 1000, 60000))
+    error = OperationalError("SELECT 1", {}, Exception("gone away"))
+
+    assert router.reject(1, make_properties(), b"{}", error, retryable=True) == "retry"
+    retry_headers = channel.published[-1][2].headers
+    assert channel.published[-1][0] == "ingest.retry.1"
+    assert retry_headers == {ATTEMPT_HEADER: 1}
+
+    router.reject(2, make_properties(retry_headers), b"{}", error, retryable=True)
+    assert channel.published[-1][0] == "ingest.retry.2"
+
+    outcome = router.reject(3, make_properties({ATTEMPT_HEADER: 2}), b"{}", error, True)
+    routing_key, body, properties = channel.published[-1]
+    assert outcome == "parked"
+    assert routing_key == "ingest.parking"
+    assert body == b"{}"
+    assert properties.delivery_mode == 2
+    assert properties.headers[ATTEMPT_HEADER] == 3
+    assert properties.headers["x-retry-error-type"] == "OperationalError"
+    assert channel.acks == [1, 2, 3]
+
+
+def test_retry_router_parks_non_retryable_errors_immediately():
+    channel = RetryChannel()
+    router = RetryRouter(channel, RetryPolicy("ingest", 5, 1000, 60000))
+
+    outcome = router.reject(7, make_properties(), b"{", KeyError("file_path"), retryable=False)
+
+    assert outcome == "parked"
+    assert channel.published[0][0] == "ingest.parking"
+    assert channel.published[0][2].headers[ATTEMPT_HEADER] == 1
+    assert channel.acks == [7]
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.snapshots import SnapshotDecodeError, SnapshotReader, pack_snapshot, unpack_columns
+from app.worker.raw_writer import RawDataWriter
+from tests.test_raw_writer import make_rows
+
+
+def snapshot_settings(encoding="zlib"):
+    return SimpleNamespace(
+        raw_write_chunk_rows=100,
+        raw_history_load_data=False,
+        raw_history_load_data_min_rows=1,
+        raw_history_load_data_dir="",
+        raw_history_store="snapshot",
+        raw_history_snapshot_encoding=encoding,
+        raw_change_only=False,
+        raw_change_tolerance=0.0,
+    )
+
+
+def grid_rows(count):
+    return [
+        {
+            "file_id": 7,
+            "item_id": 3 - index % 2,
+            "measurable": index % 3 != 0,
+            "x_index": index,
+            "y_index": -index,
+            "x_0": index * 0.5,
+            "x_1": index * 0.5 + 0.25,
+            "y_0": -1.0,
+            "y_1": 1.0,
+            "value": index / 7,
+        }
+        for index in range(count)
+    ]
+
+
+@pytest.mark.parametrize("encoding", ["zlib", "zstd"])
+def test_pack_round_trip_sorts_by_key(encoding):
+    if encoding == "zstd":
+        pytest.importorskip("zstandard")
+    rows = grid_rows(50)
+
+    columns = unpack_columns(pack_snapshot(rows, encoding), encoding)
+
+    expected = sorted(rows, key=lambda row: (row["item_id"], row["y_index"], row["x_index"]))
+    assert columns["item_id"] == [row["item_id"] for row in expected]
+    assert columns["x_index"] == [row["x_index"] for row in expected]
+    assert columns["measurable"] == [row["measurable"] for row in expected]
+    assert columns["value"] == [row["value"] for row in expected]
+
+
+def test_packed_snapshot_is_smaller_than_row_storage():
+    payload = pack_snapshot(grid_rows(5000))
+
+    # Ten 8-byte columns per point is the floor for the row-per-point layout, before indexes.
+    assert len(payload) < 5000 * 80 / 2
+
+
+def test_unpack_rejects_corrupt_payloads():
+    with pytest.raises(SnapshotDecodeError):
+        unpack_columns(b"not a snapshot")
+    with pytest.raises(SnapshotDecodeError):
+        unpack_columns(pack_snapshot(grid_rows(3))[:-4])
+
+
+def test_reader_returns_rows_and_arrays(db_session):
+    numpy = pytest.importorskip("numpy")
+    rows = make_rows(db_session, 12)
+    writer = RawDataWriter(db_session, settings=snapshot_settings())
+
+    assert writer.write_history(rows) == 12
+    assert writer.write_history(rows[:4]) == 4
+
+    reader = SnapshotReader(db_session)
+    snapshots = reader.snapshots(rows[0]["file_id"])
+    assert [snapshot.point_count for snapshot in snapshots] == [12, 4]
+    assert reader.rows(snapshots[1].id) == rows[:4]
+    arrays = reader.arrays(snapshots[0].id)
+    assert arrays["value"].dtype == numpy.float64
+    assert arrays["value"].tolist() == [row["value"] for row in rows]
+    assert arrays["measurable"].all()
+    with pytest.raises(LookupError):
+        reader.rows(snapshots[1].id + 100)
+
+
+def test_writer_rejects_unknown_history_store(db_session):
+    settings = snapshot_settings()
+    settings.raw_history_store = "columns"
+
+    with pytest.raises(ValueError):
+        RawDataWriter(db_session, settings=settings)
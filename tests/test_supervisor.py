@@ -0,0 +1,155 @@
+from types import SimpleNamespace
+
+from app.worker.supervisor import ScalingPolicy, WorkerSupervisor
+
+
+def scaling_settings(**overrides):
+    values = {
+        "worker_scale_up_backlog": 100,
+        "worker_scale_down_backlog": 10,
+        "worker_scale_up_polls": 2,
+        "worker_scale_down_polls": 3,
+        "worker_scale_cooldown": 30.0,
+        "worker_poll_interval": 5.0,
+        "worker_respawn_backoff_max": 8.0,
+        "worker_drain_timeout": 10.0,
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+class FakeProcess:
+    started = []
+
+    def __init__(self, target, args, name):
+        self.name = name
+        self.pid = 1000 + len(FakeProcess.started)
+        self.alive = False
+        self.exitcode = None
+        self.terminated = False
+        self.killed = False
+
+    def start(self):
+        self.alive = True
+        FakeProcess.started.append(self)
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+    def terminate(self):
+        self.terminated = True
+
+    def kill(self):
+        self.killed = True
+        self.alive = False
+
+    def exit(self, code):
+        self.alive = False
+        self.exitcode = code
+
+
+def make_supervisor(depths, min_workers=1, max_workers=4, on_exit=None, **overrides):
+    FakeProcess.started = []
+    observed = iter(depths)
+    return WorkerSupervisor(
+        target=None,
+        min_workers=min_workers,
+        max_workers=max_workers,
+        settings=scaling_settings(**overrides),
+        probe=lambda: (next(observed), 1),
+        process_factory=FakeProcess,
+        on_exit=on_exit,
+    )
+
+
+def test_scaling_policy_requires_consecutive_polls():
+    policy = ScalingPolicy(scaling_settings(), min_workers=1, max_workers=4)
+
+    assert policy.decide(1, 500, now=0) == 1
+    assert policy.decide(1, 50, now=5) == 1
+    assert policy.decide(1, 500, now=10) == 1
+    assert policy.decide(1, 250, now=15) == 3
+
+
+def test_scaling_policy_cooldown_and_bounds():
+    policy = ScalingPolicy(scaling_settings(), min_workers=1, max_workers=4)
+
+    policy.decide(1, 10000, now=0)
+    assert policy.decide(1, 10000, now=5) == 4
+    policy.decide(4, 0, now=10)
+    policy.decide(4, 0, now=15)
+    assert policy.decide(4, 0, now=20) == 4
+    assert policy.decide(4, 0, now=40) == 3
+    assert policy.decide(0, 0, now=41) == 1
+
+
+def test_supervisor_scales_up_and_drains_on_scale_down():
+    supervisor = make_supervisor([1000, 1000, 0, 0, 0], worker_scale_cooldown=0)
+    supervisor.scale_to(1, now=0)
+
+    supervisor.tick(now=5)
+    supervisor.tick(now=10)
+    assert sorted(supervisor.slots) == ["worker-1", "worker-2", "worker-3", "worker-4"]
+
+    for now in (15, 20, 25):
+        supervisor.tick(now=now)
+    assert supervisor.active_count == 3
+    drained = supervisor.draining[0].process
+    assert drained.name == "worker-4"
+    assert drained.terminated
+
+    drained.exit(0)
+    supervisor.reap(now=26)
+    assert supervisor.draining == []
+
+
+def test_supervisor_kills_workers_past_drain_timeout():
+    supervisor = make_supervisor([])
+    supervisor.scale_to(2, now=0)
+    supervisor.scale_to(1, now=1)
+    stuck = supervisor.draining[0].process
+
+    supervisor.reap(now=5)
+    assert not stuck.killed
+    supervisor.reap(now=12)
+    assert stuck.killed
+
+
+def test_supervisor_respawns_with_backoff():
+    supervisor = make_supervisor([])
+    supervisor.scale_to(1, now=0)
+    slot = supervisor.slots["worker-1"]
+
+    slot.process.exit(1)
+    supervisor.reap(now=1)
+    assert slot.process is None
+    assert slot.restart_at == 2
+
+    supervisor.reap(now=2)
+    assert slot.process is FakeProcess.started[-1]
+    slot.process.exit(1)
+    supervisor.reap(now=3)
+    assert slot.restart_at == 5
+
+    supervisor.reap(now=5)
+    slot.process.exit(1)
+    supervisor.reap(now=100)
+    assert slot.failures == 1
+    assert slot.restart_at == 101
+
+
+def test_supervisor_reports_exited_worker_pids():
+    exited = []
+    supervisor = make_supervisor([], on_exit=exited.append)
+    supervisor.scale_to(2, now=0)
+    first, second = FakeProcess.started
+
+    first.exit(1)
+    supervisor.scale_to(1, now=1)
+    second.exit(0)
+    supervisor.reap(now=2)
+
+    assert sorted(exited) == [first.pid, second.pid]
@@ -1,14 +1,27 @@
-from sqlalchemy import select
+import json
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
 
 from app.db.models import (
+    Base,
     MeasurementFile,
+    MeasurementIngest,
     MeasurementItem,
     MeasurementRawDataCurrent,
     MeasurementRawDataHistory,
+    MeasurementRawDataSnapshot,
     MetricType,
+    ProductName,
 )
+from app.queue.rabbitmq import PUBLISHED_AT_HEADER
 from app.worker import worker
-from app.worker.worker import process_message
+from app.worker.worker import handle_message, process_chunk, process_message
 
 
 def test_process_message_inserts_raw_data(db_session):
@@ -257,16 +270,16 @@ def test_process_message_updates_metric_type(db_session):
 
 def test_process_message_dedupes_measurement_items(db_session, monkeypatch):
     counts = {"metric_type": 0, "measurement_item": 0}
-    original_upsert = worker.upsert_and_get_id
+    original_upsert = worker.bulk_upsert
 
-    def wrapped_upsert(session, model, values, update_fields, lookup_filters):
+    def wrapped_upsert(session, model, rows, key_columns, update_columns):
         if model is MetricType:
-            counts["metric_type"] += 1
+            counts["metric_type"] += len(rows)
         if model is MeasurementItem:
-            counts["measurement_item"] += 1
-        return original_upsert(session, model, values, update_fields, lookup_filters)
+            counts["measurement_item"] += len(rows)
+        return original_upsert(session, model, rows, key_columns, update_columns)
 
-    monkeypatch.setattr(worker, "upsert_and_get_id", wrapped_upsert)
+    monkeypatch.setattr(worker, "bulk_upsert", wrapped_upsert)
 
     payload = {
         "product_name": "P1",
@@ -314,3 +327,629 @@ def test_process_message_dedupes_measurement_items(db_session, monkeypatch):
 
     assert counts["metric_type"] == 1
     assert counts["measurement_item"] == 1
+
+
+def test_process_message_columnar_payload(db_session):
+    payload = {
+        "product_name": "P1",
+        "site_name": "HC",
+        "node_name": "2NM",
+        "module_name": "PC",
+        "recipe_name": "RCP",
+        "recipe_version": "1.0",
+        "file_path": "/data/measurements/measure1.csv",
+        "file_name": "measure1.csv",
+        "measurements": None,
+        "columns": {
+            "items": [
+                {
+                    "metric_name": "THK",
+                    "metric_unit": "nm",
+                    "class_name": "CLASS_A",
+                    "measure_item": "ITEM_1",
+                },
+                {
+                    "metric_name": "CD",
+                    "metric_unit": "nm",
+                    "class_name": "CLASS_A",
+                    "measure_item": "ITEM_2",
+                },
+            ],
+            "item_code": [0, 0, 1],
+            "measurable": [True, False, True],
+            "x_index": [0, 1, 0],
+            "y_index": [0, 0, 0],
+            "x_0": [0.1, 0.2, 0.1],
+            "x_1": [0.3, 0.4, 0.3],
+            "y_0": [0.2, 0.3, 0.2],
+            "y_1": [0.4, 0.5, 0.4],
+            "value": [1.23, 2.34, 3.45],
+        },
+    }
+
+    result = process_message(db_session, payload)
+    db_session.commit()
+
+    assert result["measurement_count"] == 3
+    items = {
+        item.id: item.measure_item
+        for item in db_session.execute(select(MeasurementItem)).scalars()
+    }
+    current = db_session.execute(select(MeasurementRawDataCurrent)).scalars().all()
+    history = db_session.execute(select(MeasurementRawDataHistory)).scalars().all()
+    assert len(history) == 3
+    by_value = {row.value: row for row in current}
+    assert items[by_value[1.23].item_id] == "ITEM_1"
+    assert items[by_value[3.45].item_id] == "ITEM_2"
+    assert by_value[2.34].measurable is False
+    assert by_value[2.34].x_index == 1
+
+
+def chunk_payload(points):
+    return {
+        "product_name": "P1",
+        "site_name": "HC",
+        "node_name": "2NM",
+        "module_name": "PC",
+        "recipe_name": "RCP",
+        "recipe_version": "1.0",
+        "file_path": "/data/measurements/measure1.csv",
+        "file_name": "measure1.csv",
+        "measurements": [
+            {
+                "metric_name": "THK",
+                "metric_unit": "nm",
+                "class_name": "CLASS_A",
+                "measure_item": "ITEM_1",
+                "measurable": True,
+                "x_index": x_index,
+                "y_index": 0,
+                "x_0": 0.1,
+                "x_1": 0.3,
+                "y_0": 0.2,
+                "y_1": 0.4,
+                "value": value,
+            }
+            for x_index, value in points
+        ],
+    }
+
+
+def test_process_chunk_tracks_completion(db_session, monkeypatch):
+    product_upserts = []
+    original_upsert = worker.upsert_and_get_id
+
+    def wrapped_upsert(session, model, values, update_fields, lookup_filters):
+        if model is ProductName:
+            product_upserts.append(values)
+        return original_upsert(session, model, values, update_fields, lookup_filters)
+
+    monkeypatch.setattr(worker, "upsert_and_get_id", wrapped_upsert)
+
+    process_chunk(db_session, "file-1", {"index": 0, "count": 2}, chunk_payload([(0, 1.0)]))
+    db_session.commit()
+
+    ingest = db_session.get(MeasurementIngest, "file-1")
+    assert ingest.chunk_count == 2
+    assert ingest.completed_at is None
+
+    result = process_chunk(
+        db_session, "file-1", {"index": 1, "count": 2}, chunk_payload([(1, 2.0), (2, 3.0)])
+    )
+    db_session.commit()
+
+    assert result["inserted_count"] == 2
+    db_session.refresh(ingest)
+    assert ingest.completed_at is not None
+    assert len(product_upserts) == 1
+    current = db_session.execute(select(MeasurementRawDataCurrent)).scalars().all()
+    assert sorted(row.value for row in current) == [1.0, 2.0, 3.0]
+    assert {row.file_id for row in current} == {ingest.file_id}
+
+
+def test_process_chunk_skips_redelivered_chunk(db_session):
+    chunk = {"index": 0, "count": 2}
+    process_chunk(db_session, "file-1", chunk, chunk_payload([(0, 1.0)]))
+    db_session.commit()
+
+    result = process_chunk(db_session, "file-1", chunk, chunk_payload([(0, 1.0)]))
+    db_session.commit()
+
+    assert result["duplicate"] is True
+    history = db_session.execute(select(MeasurementRawDataHistory)).scalars().all()
+    assert len(history) == 1
+
+
+def test_handle_message_skips_duplicate_digest(db_session):
+    message = {"id": "msg-1", "digest": "d" * 64, "payload": chunk_payload([(0, 1.0)])}
+
+    first = handle_message(db_session, message, idempotency_window=3600)
+    db_session.commit()
+    second = handle_message(db_session, {**message, "id": "msg-2"}, idempotency_window=3600)
+    db_session.commit()
+    changed = handle_message(
+        db_session,
+        {"id": "msg-3", "digest": "e" * 64, "payload": chunk_payload([(0, 2.0)])},
+        idempotency_window=3600,
+    )
+    db_session.commit()
+
+    assert first["inserted_count"] == 1
+    assert second["duplicate"] is True
+    assert changed["inserted_count"] == 1
+    history = db_session.execute(select(MeasurementRawDataHistory)).scalars().all()
+    assert len(history) == 2
+    file_row = db_session.execute(select(MeasurementFile)).scalar_one()
+    assert file_row.content_digest == "e" * 64
+
+
+def test_is_duplicate_ingest_handles_timezone_aware_now():
+    updated_at = datetime(2026, 1, 1, 9, 0, 0)
+    now = datetime(2026, 1, 1, 0, 0, 30, tzinfo=timezone.utc)
+    session = SimpleNamespace(
+        execute=lambda stmt: SimpleNamespace(first=lambda: ("d" * 64, updated_at, now))
+    )
+
+    assert worker.is_duplicate_ingest(session, chunk_payload([]), "d" * 64, 60) is True
+    assert worker.is_duplicate_ingest(session, chunk_payload([]), "d" * 64, 10) is False
+
+
+def test_handle_message_ignores_digest_outside_window(db_session):
+    message = {"id": "msg-1", "digest": "d" * 64, "payload": chunk_payload([(0, 1.0)])}
+
+    handle_message(db_session, message, idempotency_window=3600)
+    db_session.commit()
+    result = handle_message(db_session, message, idempotency_window=0)
+    db_session.commit()
+
+    assert "duplicate" not in result
+
+
+class BatchChannel:
+    def __init__(self):
+        self.acks = []
+        self.published = []
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acks.append((delivery_tag, multiple))
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((routing_key, properties.headers))
+
+
+class BatchConnection:
+    def __init__(self):
+        self.timers = []
+
+    def call_later(self, delay, callback):
+        self.timers.append(callback)
+        return callback
+
+    def remove_timeout(self, timer):
+        self.timers.remove(timer)
+
+
+def batch_message(index):
+    payload = {
+        "product_name": "P1",
+        "site_name": "HC",
+        "node_name": "2NM",
+        "module_name": "PC",
+        "recipe_name": "RCP",
+        "recipe_version": "1.0",
+        "file_path": f"/data/measurements/batch{index}.csv",
+        "file_name": f"batch{index}.csv",
+        "measurements": [
+            {
+                "metric_name": "THK",
+                "metric_unit": "nm",
+                "class_name": "CLASS_A",
+                "measure_item": "ITEM_1",
+                "measurable": True,
+                "x_index": 0,
+                "y_index": 0,
+                "x_0": 0.1,
+                "x_1": 0.3,
+                "y_0": 0.2,
+                "y_1": 0.4,
+                "value": float(index),
+            }
+        ],
+    }
+    return json.dumps({"id": f"msg-{index}", "payload": payload}).encode("utf-8")
+
+
+@pytest.fixture()
+def consumer_session(tmp_path):
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker.db'}", future=True)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    session = factory()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+CONSUMER_SETTINGS = {
+    "idempotency_window_seconds": 0,
+    "rabbitmq_queue_name": "ingest",
+    "worker_retry_max_attempts": 3,
+    "worker_retry_base_delay_ms": 1000,
+    "worker_retry_max_delay_ms": 60000,
+    "worker_profile_mode": "off",
+    "worker_profile_sample_every": 1,
+    "worker_profile_dir": "",
+}
+
+
+def make_consumer(session, batch_size):
+    settings = SimpleNamespace(
+        worker_batch_size=batch_size,
+        worker_batch_timeout_ms=50,
+        worker_coalesce_files=True,
+        **CONSUMER_SETTINGS,
+    )
+    factory = sessionmaker(bind=session.get_bind(), autocommit=False, autoflush=False)
+    channel = BatchChannel()
+    connection = BatchConnection()
+    return worker.BatchConsumer(connection, channel, settings, factory), channel, connection
+
+
+def deliver(consumer, channel, tag, body):
+    method = SimpleNamespace(delivery_tag=tag)
+    properties = SimpleNamespace(content_type="application/json", content_encoding=None)
+    consumer.on_message(channel, method, properties, body)
+
+
+def test_batch_consumer_commits_batch_and_acks_multiple(consumer_session):
+    consumer, channel, connection = make_consumer(consumer_session, batch_size=3)
+
+    deliver(consumer, channel, 1, batch_message(1))
+    deliver(consumer, channel, 2, batch_message(2))
+    assert channel.acks == []
+    assert len(connection.timers) == 1
+
+    deliver(consumer, channel, 3, batch_message(3))
+    assert channel.acks == [(3, True)]
+    assert connection.timers == []
+    assert len(consumer_session.execute(select(MeasurementFile)).scalars().all()) == 3
+
+
+def test_batch_consumer_flushes_partial_batch_on_timer(consumer_session):
+    consumer, channel, connection = make_consumer(consumer_session, batch_size=10)
+
+    deliver(consumer, channel, 1, batch_message(1))
+    deliver(consumer, channel, 2, batch_message(2))
+    connection.timers[0]()
+
+    assert channel.acks == [(2, True)]
+    assert consumer.pending == []
+
+
+def test_batch_consumer_falls_back_to_single_messages(consumer_session):
+    consumer, channel, _ = make_consumer(consumer_session, batch_size=2)
+    broken = json.dumps({"id": "broken", "payload": {"file_path": "/x.csv"}}).encode("utf-8")
+
+    deliver(consumer, channel, 1, batch_message(1))
+    deliver(consumer, channel, 2, broken)
+
+    assert channel.acks == [(1, False), (2, False)]
+    assert [queue for queue, _ in channel.published] == ["ingest.parking"]
+    file_paths = consumer_session.execute(select(MeasurementFile.file_path)).scalars().all()
+    assert file_paths == ["/data/measurements/batch1.csv"]
+
+
+def test_batch_consumer_parks_poison_messages(consumer_session, monkeypatch):
+    consumer, channel, _ = make_consumer(consumer_session, batch_size=2)
+    original_handle = worker.handle_message
+
+    def flaky_handle(session, message, *args):
+        if message["payload"]["file_name"] == "batch2.csv":
+            raise RuntimeError("writer bug")
+        return original_handle(session, message, *args)
+
+    monkeypatch.setattr(worker, "handle_message", flaky_handle)
+
+    deliver(consumer, channel, 1, b"[1, 2]")
+    deliver(consumer, channel, 2, batch_message(2))
+    deliver(consumer, channel, 3, batch_message(3))
+
+    assert channel.acks == [(1, False), (2, False), (3, False)]
+    assert [queue for queue, _ in channel.published] == ["ingest.parking", "ingest.parking"]
+    file_paths = consumer_session.execute(select(MeasurementFile.file_path)).scalars().all()
+    assert file_paths == ["/data/measurements/batch3.csv"]
+
+
+def test_process_message_reuses_cached_dimensions(db_session, monkeypatch):
+    calls = []
+    original_upsert = worker.upsert_and_get_id
+
+    def wrapped_upsert(session, model, values, update_fields, lookup_filters):
+        calls.append(model)
+        return original_upsert(session, model, values, update_fields, lookup_filters)
+
+    monkeypatch.setattr(worker, "upsert_and_get_id", wrapped_upsert)
+    payload = chunk_payload([(0, 1.0)])
+
+    process_message(db_session, payload)
+    db_session.commit()
+    first_calls = len(calls)
+    process_message(db_session, {**payload, "file_path": "/data/measurements/other.csv"})
+    db_session.commit()
+
+    assert first_calls > 1
+    assert calls[first_calls:] == [MeasurementFile]
+
+
+def test_process_message_resolves_items_in_bulk(db_session, engine):
+    payload = chunk_payload([(0, 1.0)])
+    payload["measurements"] = [
+        {**payload["measurements"][0], "measure_item": f"ITEM_{index}", "x_index": index}
+        for index in range(50)
+    ]
+    db_session.add(MetricType(name="THK", unit="nm", is_active=True))
+    db_session.flush()
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if "measurement_items" in statement or "metric_types" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        process_message(db_session, payload)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    assert 0 < len(statements) <= 6
+    item_count = db_session.execute(select(func.count()).select_from(MeasurementItem))
+    assert item_count.scalar_one() == 50
+    current = db_session.execute(select(MeasurementRawDataCurrent.item_id)).scalars().all()
+    assert len(set(current)) == 50
+
+
+def test_process_message_keeps_reported_metric_unit(db_session):
+    payload = chunk_payload([(0, 1.0), (1, 2.0)])
+    payload["measurements"][1] = {
+        **payload["measurements"][1],
+        "metric_unit": None,
+        "measure_item": "ITEM_2",
+    }
+
+    process_message(db_session, payload)
+
+    unit = db_session.execute(select(MetricType.unit).where(MetricType.name == "THK"))
+    assert unit.scalar_one() == "nm"
+
+
+def test_upsert_and_get_id_returns_existing_row_on_conflict(db_session):
+    first = worker.upsert_and_get_id(
+        db_session,
+        ProductName,
+        values={"name": "P1", "is_active": False},
+        update_fields={},
+        lookup_filters={"name": "P1"},
+    )
+    again = worker.upsert_and_get_id(
+        db_session,
+        ProductName,
+        values={"name": "P1", "is_active": True},
+        update_fields={},
+        lookup_filters={"name": "P1"},
+    )
+    reactivated = worker.upsert_and_get_id(
+        db_session,
+        ProductName,
+        values={"name": "P1", "is_active": True},
+        update_fields={"is_active": True},
+        lookup_filters={"name": "P1"},
+    )
+
+    assert first.id == again.id == reactivated.id
+    assert reactivated.is_active is True
+
+
+def test_resolve_dimension_ids_matches_mysql_collation_folded_rows(db_session, monkeypatch):
+    metric_type = MetricType(name="THK", unit="nm", is_active=True)
+    db_session.add(metric_type)
+    db_session.flush()
+
+    def folded_condition(columns, keys):
+        # Mimics a case- and trailing-space-insensitive MySQL collation on SQLite.
+        return func.lower(func.rtrim(columns[0])).in_([worker.match_key(key)[0] for key in keys])
+
+    monkeypatch.setattr(worker, "bulk_upsert", lambda *args: None)
+    monkeypatch.setattr(worker, "key_condition", folded_condition)
+    monkeypatch.setattr(worker, "dialect_name", lambda session: "mysql")
+
+    ids = worker.resolve_dimension_ids(
+        db_session,
+        MetricType,
+        [{"name": "thk ", "unit": "nm", "is_active": True}],
+        key_columns=("name",),
+        update_columns=("unit", "is_active"),
+    )
+
+    assert ids == {("thk ",): metric_type.id}
+
+
+def test_resolve_items_keeps_case_variants_apart(db_session):
+    upper = ("THK", "nm", "C", "ITEM")
+    lower = ("thk", "um", "C", "item")
+
+    ids = worker.resolve_items(db_session, [upper, lower])
+
+    assert ids[upper] != ids[lower]
+    rows = db_session.execute(
+        select(MeasurementItem.measure_item, MetricType.name, MetricType.unit).join(
+            MetricType, MeasurementItem.metric_type_id == MetricType.id
+        )
+    ).all()
+    assert sorted(rows) == [("ITEM", "THK", "nm"), ("item", "thk", "um")]
+
+
+class ThreadsafeConnection(BatchConnection):
+    def add_callback_threadsafe(self, callback):
+        callback()
+
+    def process_data_events(self, time_limit=None):
+        pass
+
+
+def test_pipeline_consumer_acks_through_connection_callbacks(consumer_session):
+    settings = SimpleNamespace(worker_decode_threads=2, worker_db_writers=1, **CONSUMER_SETTINGS)
+    factory = sessionmaker(bind=consumer_session.get_bind(), autocommit=False, autoflush=False)
+    channel = BatchChannel()
+    consumer = worker.PipelineConsumer(
+        ThreadsafeConnection(), channel, settings, prefetch_count=8, session_factory=factory
+    )
+
+    deliver(consumer, channel, 1, batch_message(1))
+    deliver(consumer, channel, 2, b"not json")
+    deliver(consumer, channel, 3, batch_message(3))
+    consumer.stop()
+
+    assert sorted(channel.acks) == [(1, False), (2, False), (3, False)]
+    assert channel.published[0][1]["x-retry-error-type"] == "MessageDecodeError"
+    file_paths = consumer_session.execute(select(MeasurementFile.file_path)).scalars().all()
+    assert sorted(file_paths) == [
+        "/data/measurements/batch1.csv",
+        "/data/measurements/batch3.csv",
+    ]
+
+
+def test_pipeline_consumer_survives_unexpected_errors(consumer_session, monkeypatch):
+    settings = SimpleNamespace(worker_decode_threads=1, worker_db_writers=1, **CONSUMER_SETTINGS)
+    factory = sessionmaker(bind=consumer_session.get_bind(), autocommit=False, autoflush=False)
+    channel = BatchChannel()
+    original_prepare = worker.prepare_message
+    original_handle = worker.handle_message
+
+    def flaky_prepare(body, content_type, content_encoding):
+        if body == b"boom":
+            raise RuntimeError("decoder bug")
+        return original_prepare(body, content_type, content_encoding)
+
+    def flaky_handle(session, message, *args):
+        if message["payload"]["file_name"] == "batch2.csv":
+            raise RuntimeError("writer bug")
+        return original_handle(session, message, *args)
+
+    monkeypatch.setattr(worker, "prepare_message", flaky_prepare)
+    monkeypatch.setattr(worker, "handle_message", flaky_handle)
+    consumer = worker.PipelineConsumer(
+        ThreadsafeConnection(), channel, settings, prefetch_count=8, session_factory=factory
+    )
+
+    deliver(consumer, channel, 1, b"boom")
+    deliver(consumer, channel, 2, batch_message(2))
+    deliver(consumer, channel, 3, batch_message(3))
+    consumer.stop()
+
+    assert sorted(channel.acks) == [(1, False), (2, False), (3, False)]
+    assert [queue for queue, _ in channel.published] == ["ingest.parking", "ingest.parking"]
+    file_paths = consumer_session.execute(select(MeasurementFile.file_path)).scalars().all()
+    assert file_paths == ["/data/measurements/batch3.csv"]
+
+
+def test_process_message_change_only_skips_unchanged_points(db_session, monkeypatch):
+    monkeypatch.setenv("RAW_CHANGE_ONLY", "true")
+    monkeypatch.setenv("RAW_CHANGE_TOLERANCE", "0.001")
+
+    first = process_message(db_session, chunk_payload([(0, 1.0), (1, 2.0), (2, 3.0)]))
+    db_session.commit()
+    again = process_message(db_session, chunk_payload([(0, 1.0), (1, 2.0004), (2, 3.5), (3, 4.0)]))
+    db_session.commit()
+
+    assert (first["changed_count"], first["unchanged_count"]) == (3, 0)
+    assert (again["changed_count"], again["unchanged_count"]) == (2, 2)
+    assert again["inserted_count"] == 2
+    history = db_session.execute(
+        select(MeasurementRawDataHistory.x_index, MeasurementRawDataHistory.value)
+    ).all()
+    assert sorted(history) == [(0, 1.0), (1, 2.0), (2, 3.0), (2, 3.5), (3, 4.0)]
+    current = db_session.execute(
+        select(MeasurementRawDataCurrent.x_index, MeasurementRawDataCurrent.value)
+    ).all()
+    assert sorted(current) == [(0, 1.0), (1, 2.0), (2, 3.5), (3, 4.0)]
+
+
+def test_handle_messages_coalesces_revisions_of_the_same_file(db_session, engine):
+    other = chunk_payload([(0, 9.0)])
+    other["file_path"] = "/data/measurements/other.csv"
+    messages = [
+        {"id": "rev-1", "payload": chunk_payload([(0, 1.0), (1, 1.0)])},
+        {"id": "other", "payload": other},
+        {"id": "rev-2", "payload": chunk_payload([(0, 2.0)])},
+        {"id": "rev-3", "payload": chunk_payload([(0, 3.0)])},
+    ]
+    current_writes = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO measurement_raw_data_current"):
+            current_writes.append(len(parameters) if executemany else 1)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        results = worker.handle_messages(db_session, messages)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    db_session.commit()
+
+    assert [result["coalesced_count"] for result in results[:1] + results[2:]] == [3, 3, 3]
+    assert "coalesced_count" not in results[1]
+    assert sorted(current_writes) == [1, 2]
+    history = db_session.execute(
+        select(MeasurementRawDataHistory.x_index, MeasurementRawDataHistory.value)
+        .join(MeasurementFile, MeasurementFile.id == MeasurementRawDataHistory.file_id)
+        .where(MeasurementFile.file_path == "/data/measurements/measure1.csv")
+        .order_by(MeasurementRawDataHistory.id)
+    ).all()
+    assert history == [(0, 1.0), (1, 1.0), (0, 2.0), (0, 3.0)]
+    current = db_session.execute(
+        select(MeasurementRawDataCurrent.x_index, MeasurementRawDataCurrent.value)
+        .join(MeasurementFile, MeasurementFile.id == MeasurementRawDataCurrent.file_id)
+        .where(MeasurementFile.file_path == "/data/measurements/measure1.csv")
+    ).all()
+    assert sorted(current) == [(0, 3.0), (1, 1.0)]
+
+
+def test_handle_messages_writes_one_snapshot_per_revision(db_session, monkeypatch):
+    monkeypatch.setenv("RAW_HISTORY_STORE", "snapshot")
+    messages = [
+        {"id": "rev-1", "payload": chunk_payload([(0, 1.0), (1, 1.0)])},
+        {"id": "rev-2", "payload": chunk_payload([(0, 2.0)])},
+    ]
+
+    worker.handle_messages(db_session, messages)
+    db_session.commit()
+
+    snapshots = db_session.execute(
+        select(MeasurementRawDataSnapshot.point_count).order_by(MeasurementRawDataSnapshot.id)
+    ).all()
+    assert snapshots == [(2,), (1,)]
+    history = db_session.execute(select(func.count()).select_from(MeasurementRawDataHistory))
+    assert history.scalar_one() == 0
+
+
+def test_log_processed_records_outcome_and_end_to_end_latency():
+    def sample(name, labels=None):
+        return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+    processed = sample("worker_messages_processed_total", {"status": "processed"})
+    duplicates = sample("worker_messages_processed_total", {"status": "duplicate"})
+    latencies = sample("worker_end_to_end_latency_seconds_count")
+    latency_sum = sample("worker_end_to_end_latency_seconds_sum")
+    message = {"id": "m1"}
+    result = {"measurement_count": 1, "inserted_count": 1}
+    headers = {PUBLISHED_AT_HEADER: int((time.time() - 2) * 1000)}
+
+    worker.log_processed(message, result, 5, 1, "w1", headers)
+    worker.log_processed(message, {**result, "duplicate": True}, 5, 1, "w1")
+
+    assert sample("worker_messages_processed_total", {"status": "processed"}) == processed + 1
+    assert sample("worker_messages_processed_total", {"status": "duplicate"}) == duplicates + 1
+    assert sample("worker_end_to_end_latency_seconds_count") == latencies + 1
+    assert sample("worker_end_to_end_latency_seconds_sum") - latency_sum >= 2